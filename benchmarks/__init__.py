@@ -0,0 +1,6 @@
+"""输入引擎和界面更新路径的基准测试
+
+不依赖任何图形界面, 可以在无显示器的Linux上运行:
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run --quick --compare results.json
+"""
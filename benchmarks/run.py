@@ -0,0 +1,419 @@
+"""运行全部基准测试并输出可比较的JSON结果
+
+每个基准产生一组扁平的数值指标, 结果文件按 "基准名.指标名" 汇总,
+--compare 会逐项列出与另一份结果的比值, 便于发现两次提交之间的退化。
+"""
+import argparse
+import gc
+import json
+import platform
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+from keyboard_engine.backends import NullBackend
+from keyboard_engine.delay_profiles import HumanTiming
+from keyboard_engine.engine import TypingEngine
+from keyboard_engine.keystroke_plan import compile_plan
+from keyboard_engine.large_document import DocumentView, LineIndex
+from keyboard_engine.multi_session import run_sessions
+from keyboard_engine.record_log import RecordLog
+from keyboard_engine.telemetry import RunTelemetry
+from keyboard_engine.text_stats import TextStats
+from keyboard_engine.ui_budget import LOW_OVERHEAD_FRAME_INTERVAL
+from keyboard_engine.ui_channel import FRAME_INTERVAL, UIEventChannel
+
+SAMPLE_LINE = 'The quick brown fox 敏捷的棕色狐狸 jumps over the lazy dog.\n'
+
+
+def sample_text(size):
+    """生成约 size 个字符的多行文本"""
+    return (SAMPLE_LINE * (size // len(SAMPLE_LINE) + 1))[:size]
+
+
+def best_of(func, repeat=3):
+    """多次运行取最短耗时, 减少调度噪声"""
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_throughput(quick):
+    """空后端上的引擎吞吐量, 分别测逐字、带事件通道和突发模式"""
+    chars = 20000 if quick else 200000
+    text = sample_text(chars)
+    results = {}
+    for name, burst_chunk, with_channel in (('per_char', 0, False),
+                                            ('per_char_channel', 0, True),
+                                            ('burst_32', 32, False)):
+        plan = compile_plan(text, 'Enter', 0.0, burst_chunk)
+
+        def run():
+            channel = UIEventChannel() if with_channel else None
+            TypingEngine(NullBackend()).run(plan, 1, 0.0, channel)
+        results[f'{name}_chars_per_sec'] = chars / best_of(run)
+    return results
+
+
+def bench_timing(quick):
+    """不同间隔下的节拍精度: 逐次间隔的抖动和总漂移"""
+    results = {}
+    budget = 0.3 if quick else 2.0
+    for interval in (0.01, 0.05, 0.1, 0.5, 1.0):
+        ticks = min(200, max(2 if quick else 3, int(budget / interval)))
+        plan = compile_plan('x' * ticks, 'Enter', interval)
+        telemetry = RunTelemetry()
+        stats = TypingEngine(NullBackend()).run(plan, 1, 0.0, telemetry=telemetry)
+        key = f'interval_{interval:g}'
+        results[f'{key}_ticks'] = ticks
+        results[f'{key}_drift_ms'] = stats['drift'] * 1000
+        results[f'{key}_jitter_p50_ms'] = telemetry.jitter.quantile(0.5) * 1000
+        results[f'{key}_jitter_p99_ms'] = telemetry.jitter.quantile(0.99) * 1000
+        results[f'{key}_late_ticks'] = stats['late_ticks']
+    return results
+
+
+def bench_stop_latency(quick):
+    """在1秒间隔和倒计时中途请求停止, 到工作线程不再发送按键的延迟"""
+    results = {}
+    plan = compile_plan('x' * 10, 'Enter', 1.0)
+    for name, delay in (('interval', 0.0), ('countdown', 5.0)):
+        latencies = []
+        for _ in range(2 if quick else 5):
+            engine = TypingEngine(NullBackend())
+            worker = threading.Thread(target=engine.run, args=(plan, 1, delay))
+            worker.start()
+            time.sleep(0.2)
+            engine.stop()
+            worker.join()
+            latencies.append(engine.stop_latency)
+        results[f'{name}_max_ms'] = max(latencies) * 1000
+        results[f'{name}_mean_ms'] = sum(latencies) / len(latencies) * 1000
+    return results
+
+
+def bench_ui_updates(quick):
+    """每个字符投递进度和记录的代价, 以及界面线程按帧取出的代价"""
+    count = 100000 if quick else 1000000
+    results = {}
+
+    def post_progress():
+        channel = UIEventChannel()
+        for _ in range(count):
+            channel.post_progress()
+    results['post_progress_ns'] = best_of(post_progress) / count * 1e9
+
+    def post_record():
+        channel = UIEventChannel()
+        for _ in range(count):
+            channel.post_record('输入: x')
+    results['post_record_ns'] = best_of(post_record) / count * 1e9
+
+    # 每帧积压约1000个事件时, 只计取出本身的耗时
+    frames = count // 1000
+    channel = UIEventChannel()
+    spent = 0.0
+    for _ in range(frames):
+        for _ in range(1000):
+            channel.post_progress()
+        channel.post_record('第N次执行完成')
+        start = time.perf_counter()
+        channel.drain()
+        spent += time.perf_counter() - start
+    results['drain_1000_events_us'] = spent / frames * 1e6
+    return results
+
+
+def pump_cpu(plan, frame_interval, labels):
+    """工作线程输入期间, 界面线程按帧取出事件所消耗的CPU秒数和经过的秒数
+
+    labels 为真时每帧还格式化遥测和通道统计标签, 与完整刷新的界面一致。
+    """
+    channel = UIEventChannel()
+    telemetry = RunTelemetry()
+    engine = TypingEngine(NullBackend())
+    worker = threading.Thread(target=engine.run_reporting, args=(plan, 1, 0.0, channel),
+                              kwargs={'telemetry': telemetry})
+    cpu_start = time.thread_time()
+    wall_start = time.perf_counter()
+    worker.start()
+    progress = 0
+    while True:
+        update = channel.drain()
+        if update is not None:
+            progress += update.progress
+            if labels:
+                telemetry.summary(progress, plan.total_steps)
+                channel.stats_text()
+            if update.finished:
+                break
+        time.sleep(frame_interval)
+    worker.join()
+    return time.thread_time() - cpu_start, time.perf_counter() - wall_start
+
+
+def bench_ui_budget(quick):
+    """完整刷新与低开销模式下界面线程在一次长时间运行中的CPU占用"""
+    seconds = 1.0 if quick else 5.0
+    interval = 0.001
+    plan = compile_plan('x' * int(seconds / interval), 'Enter', interval)
+    results = {}
+    for name, frame_interval, labels in (('full', FRAME_INTERVAL, True),
+                                         ('low_overhead', LOW_OVERHEAD_FRAME_INTERVAL, False)):
+        cpu, wall = pump_cpu(plan, frame_interval, labels)
+        results[f'{name}_ui_cpu_ms'] = cpu * 1000
+        results[f'{name}_ui_cpu_share'] = cpu / wall
+    return results
+
+
+def bench_delay_profiles(quick):
+    """生成整次运行的类人等待时间: numpy 向量化与纯 Python 实现对比"""
+    chars = 100000 if quick else 1000000
+    plan = compile_plan(sample_text(chars), 'Enter', 0.05)
+    results = {}
+    for name, use_numpy in (('numpy', True), ('python', False)):
+        timing = HumanTiming('自然', 60, seed=1, use_numpy=use_numpy)
+        if use_numpy and timing.numpy is None:
+            continue
+        results[f'{name}_schedule_ms'] = best_of(lambda: timing.schedule(plan).row(0)) * 1000
+    return results
+
+
+def bench_multi_session(quick):
+    """空后端上多个会话的汇总吞吐量: 单进程依次执行与进程池并行对比"""
+    import os
+    chars = 20000 if quick else 200000
+    plan = compile_plan(sample_text(chars), 'Enter', 0.0)
+    sessions = max(2, min(4, os.cpu_count() or 1))
+    results = {'sessions': sessions}
+    for name, processes in (('one_process', 1), ('pool', sessions)):
+        summary = run_sessions(plan, sessions, 'null', processes)
+        results[f'{name}_chars_per_sec'] = summary['total']['achieved_rate']
+    return results
+
+
+def bench_async_streams(quick):
+    """许多同时进行的定时输入流: 每个流一个线程与同一个事件循环中的协程对比
+
+    比较总耗时相对目标时长的偏差、各流的平均漂移和整个过程的CPU耗时。
+    """
+    import asyncio
+    from keyboard_engine.async_engine import AsyncTypingEngine
+
+    streams = 50 if quick else 200
+    plan = compile_plan('x' * (10 if quick else 50), 'Enter', 0.02)
+    results = {'streams': streams, 'target_s': plan.total_steps * 0.02}
+
+    def threaded():
+        engines = [TypingEngine(NullBackend()) for _ in range(streams)]
+        threads = [threading.Thread(target=engine.run, args=(plan,)) for engine in engines]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return [engine._scheduler.stats() for engine in engines]
+
+    async def coroutines():
+        engines = [AsyncTypingEngine(NullBackend()) for _ in range(streams)]
+        return await asyncio.gather(*(engine.run(plan) for engine in engines))
+
+    for name, run in (('threads', threaded), ('asyncio', lambda: asyncio.run(coroutines()))):
+        cpu = time.process_time()
+        start = time.perf_counter()
+        stats = run()
+        results[f'{name}_elapsed_s'] = time.perf_counter() - start
+        results[f'{name}_cpu_s'] = time.process_time() - cpu
+        results[f'{name}_mean_drift_ms'] = sum(s['drift'] for s in stats) / len(stats) * 1000
+    return results
+
+
+def bench_text_stats(quick):
+    """对全文重新计数与按增量更新的统计代价"""
+    sizes = (1024, 100 * 1024, 1024 * 1024) if quick else \
+        (1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024)
+    results = {}
+    for size in sizes:
+        text = sample_text(size)
+        stats = TextStats()
+        label = f'{size // 1024}kb'
+        results[f'full_recount_{label}_ms'] = best_of(lambda: stats.reset(text)) * 1000
+
+        def incremental():
+            for _ in range(1000):
+                stats.insert('a')
+                stats.label()
+        results[f'incremental_edit_{label}_us'] = best_of(incremental) / 1000 * 1e6
+    return results
+
+
+def bench_large_document(quick):
+    """大文档预览: 建立行首索引一次的代价, 以及滚动、跳转和查找时每次渲染的代价"""
+    sizes = (1024 * 1024,) if quick else (1024 * 1024, 10 * 1024 * 1024)
+    results = {}
+    for size in sizes:
+        text = sample_text(size) + 'needle'
+        label = f'{size // 1024}kb'
+        results[f'index_{label}_ms'] = best_of(lambda: LineIndex(text)) * 1000
+        view = DocumentView(LineIndex(text), rows=40)
+
+        def scroll():
+            for _ in range(100):
+                view.page(1)
+                view.render()
+        results[f'scroll_render_{label}_us'] = best_of(scroll) / 100 * 1e6
+
+        def goto():
+            view.goto(view.index.line_count // 2)
+            view.render()
+        results[f'goto_render_{label}_us'] = best_of(goto) * 1e6
+
+        def find():
+            view.match = None
+            view.scroll_to(0)
+            view.find('needle')
+            view.render()
+        results[f'find_last_line_{label}_ms'] = best_of(find) * 1000
+    return results
+
+
+def bench_records_memory(quick):
+    """长时间运行时记录占用的内存: 无界列表与环形缓冲区对比"""
+    count = 100000 if quick else 1000000
+    results = {}
+    for name, factory in (('list', list), ('ring_buffer', RecordLog)):
+        gc.collect()
+        tracemalloc.start()
+        records = factory()
+        for i in range(count):
+            records.append(f'[12:00:00] 第{i + 1}次执行完成')
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[f'{name}_{count}_records_kb'] = current / 1024
+        results[f'{name}_peak_kb'] = peak / 1024
+        del records
+    return results
+
+
+# 界面脚本启动时导入的引擎模块, 以及全部引擎模块
+STARTUP_MODULES = ('keyboard_engine.startup', 'keyboard_engine.backends',
+                   'keyboard_engine.keystroke_plan', 'keyboard_engine.record_log',
+                   'keyboard_engine.text_stats', 'keyboard_engine.ui_channel',
+                   'keyboard_engine.worker')
+ALL_MODULES = STARTUP_MODULES + ('keyboard_engine.macro', 'keyboard_engine.telemetry',
+                                 'keyboard_engine.templating', 'keyboard_engine.text_source')
+
+
+def import_time(modules, repeat):
+    """在新的解释器中导入模块的耗时 (秒), 取多次中的最小值"""
+    code = ('import time; start = time.perf_counter(); '
+            + ''.join(f'import {name}; ' for name in modules)
+            + 'print(time.perf_counter() - start)')
+    best = None
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', code])
+        elapsed = float(output)
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+def bench_startup(quick):
+    """冷启动代价: 界面脚本启动时导入的引擎模块与全部模块的导入耗时, 以及创建记录缓冲"""
+    repeat = 3 if quick else 10
+    results = {
+        'startup_imports_ms': import_time(STARTUP_MODULES, repeat) * 1000,
+        'all_imports_ms': import_time(ALL_MODULES, repeat) * 1000,
+    }
+
+    def create_log():
+        RecordLog(spill=True).close()
+    results['record_log_create_us'] = best_of(create_log) * 1e6
+    return results
+
+
+BENCHMARKS = {
+    'throughput': bench_throughput,
+    'timing': bench_timing,
+    'stop_latency': bench_stop_latency,
+    'ui_updates': bench_ui_updates,
+    'ui_budget': bench_ui_budget,
+    'delay_profiles': bench_delay_profiles,
+    'multi_session': bench_multi_session,
+    'async_streams': bench_async_streams,
+    'text_stats': bench_text_stats,
+    'large_document': bench_large_document,
+    'records_memory': bench_records_memory,
+    'startup': bench_startup,
+}
+
+
+def git_commit():
+    """当前提交的哈希, 不在git仓库中时返回None"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """逐项打印当前结果与基准结果的比值"""
+    old = baseline['results']
+    for bench, metrics in current['results'].items():
+        for metric, value in metrics.items():
+            before = old.get(bench, {}).get(metric)
+            if not before:
+                continue
+            print(f"{bench}.{metric}: {before:.4g} -> {value:.4g} ({value / before:.2f}x)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run',
+                                     description='输入引擎基准测试')
+    parser.add_argument('names', nargs='*',
+                        help=f"只运行指定的基准 (默认全部): {', '.join(BENCHMARKS)}")
+    parser.add_argument('--quick', action='store_true', help='缩小规模, 快速检查')
+    parser.add_argument('-o', '--output', default='-',
+                        help="结果JSON的输出路径, '-' 表示标准输出 (默认)")
+    parser.add_argument('--compare', default=None, help='与之前保存的结果JSON逐项对比')
+    args = parser.parse_args(argv)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error(f'未知的基准: {name}')
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'quick': args.quick,
+        },
+        'results': {},
+    }
+    for name in args.names or BENCHMARKS:
+        print(f"运行 {name} ...", file=sys.stderr)
+        report['results'][name] = BENCHMARKS[name](args.quick)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(text)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,266 @@
+# 最先导入, 启动计时从这里开始
+from keyboard_engine import startup
 import tkinter as tk
-from tkinter import scrolledtext, messagebox, filedialog, ttk
-from pynput.keyboard import Controller, Key
-import time
+from tkinter import scrolledtext, ttk, font as tkfont
 import threading
+import time
 import sys
 import os
 
+from keyboard_engine.backends import create_backend
+from keyboard_engine.clipboard import ClipboardError, ClipboardProvider, UIThreadClipboard
+from keyboard_engine.keystroke_plan import (DEFAULT_BURST_CHUNK, DEFAULT_PASTE_CHUNK,
+                                            compile_paste_plan, compile_plan)
+from keyboard_engine.record_log import RecordLog
+from keyboard_engine.resume_journal import ResumeJournal
+from keyboard_engine.text_stats import TextStats, STATS_DEBOUNCE
+from keyboard_engine.ui_budget import UIBudget
+from keyboard_engine.ui_channel import UIEventChannel
+from keyboard_engine.worker import EngineWorker, Job
+
+# 对话框在第一次弹出时才导入; 宏、数据模板、文件输入和遥测模块也在第一次使用时导入
+messagebox = startup.lazy_import('tkinter.messagebox')
+filedialog = startup.lazy_import('tkinter.filedialog')
+startup.timer.mark('imports')
+
+# 键盘后端选项: 界面显示名 -> 后端名称
+BACKEND_OPTIONS = {
+    "系统键盘": "pynput",
+    "空跑(测引擎开销)": "null",
+    "输出到文件": "file",
+}
+
+class TkClipboard(ClipboardProvider):
+    """Tk的剪贴板, 只能在界面线程调用"""
+    
+    def __init__(self, widget):
+        self.widget = widget
+    
+    def get_text(self):
+        try:
+            return self.widget.clipboard_get()
+        except tk.TclError:
+            # 剪贴板为空或不是文本
+            return None
+    
+    def set_text(self, text):
+        try:
+            self.widget.clipboard_clear()
+            self.widget.clipboard_append(text)
+            self.widget.update_idletasks()
+        except tk.TclError as e:
+            raise ClipboardError(str(e)) from None
+
+class VirtualRecordView:
+    """只渲染可见行的记录视图
+    
+    文本框里只放当前窗口内的几条记录, 滚动条的位置和比例按记录总数计算,
+    因此无论积累了多少记录, 每次刷新的代价都只与窗口高度有关。
+    """
+    
+    def __init__(self, parent, log, **text_options):
+        self.log = log
+        self.top = 0
+        self.follow = True
+        self.frame = ttk.Frame(parent)
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.rowconfigure(0, weight=1)
+        self.text = tk.Text(self.frame, wrap=tk.NONE, state=tk.DISABLED, **text_options)
+        self.text.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.linespace = tkfont.Font(font=self.text.cget('font')).metrics('linespace')
+        
+        self.text.bind('<Configure>', lambda e: self.render())
+        self.text.bind('<MouseWheel>', lambda e: self.scroll(-1 if e.delta > 0 else 1, 'units'))
+        self.text.bind('<Button-4>', lambda e: self.scroll(-1, 'units'))
+        self.text.bind('<Button-5>', lambda e: self.scroll(1, 'units'))
+    
+    def grid(self, **kwargs):
+        self.frame.grid(**kwargs)
+    
+    def rows(self):
+        """窗口能容纳的行数"""
+        text = self.text
+        inset = 2 * sum(int(str(text.cget(option)))
+                        for option in ('pady', 'borderwidth', 'highlightthickness'))
+        return max(1, (text.winfo_height() - inset) // self.linespace)
+    
+    def yview(self, action, *args):
+        """滚动条的回调: moveto 或 scroll"""
+        if action == 'moveto':
+            first = self.log.first_index
+            self.top = first + int(float(args[0]) * (self.log.total - first))
+            self.follow = False
+            self.render()
+        else:
+            self.scroll(int(args[0]), args[1])
+    
+    def scroll(self, amount, what):
+        """按行或按页滚动"""
+        self.top += amount * (self.rows() if what == 'pages' else 1)
+        self.follow = False
+        self.render()
+        return 'break'
+    
+    def render(self):
+        """把当前窗口的记录写入文本框并同步滚动条"""
+        log = self.log
+        rows = self.rows()
+        first = log.first_index
+        last_top = max(first, log.total - rows)
+        if self.follow or self.top >= last_top:
+            self.top = last_top
+            self.follow = True
+        self.top = max(self.top, first)
+        
+        self.text.config(state=tk.NORMAL)
+        self.text.delete('1.0', 'end')
+        self.text.insert('1.0', '\n'.join(log.window(self.top, rows)))
+        self.text.config(state=tk.DISABLED)
+        
+        available = log.total - first
+        if available:
+            self.scrollbar.set((self.top - first) / available,
+                               min(1.0, (self.top - first + rows) / available))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+class DocumentPreview:
+    """大文档的只读预览
+    
+    文本框里只放窗口内可见的几十行, 滚动条的位置按总行数计算, 滚动、跳转和查找的
+    代价都只与窗口高度有关。窗口的状态保存在 large_document.DocumentView 中。
+    """
+    
+    def __init__(self, parent, on_close, caption_font, match_color, gutter_color,
+                 **text_options):
+        self.view = None
+        self.frame = ttk.Frame(parent)
+        self.frame.columnconfigure(0, weight=1)
+        self.frame.rowconfigure(1, weight=1)
+        
+        toolbar = ttk.Frame(self.frame)
+        toolbar.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 5))
+        ttk.Label(toolbar, text="跳转到行", font=caption_font).pack(side=tk.LEFT)
+        self.goto_var = tk.StringVar()
+        goto_entry = ttk.Entry(toolbar, textvariable=self.goto_var, width=8)
+        goto_entry.pack(side=tk.LEFT, padx=5)
+        goto_entry.bind('<Return>', lambda e: self.goto())
+        ttk.Label(toolbar, text="查找", font=caption_font).pack(side=tk.LEFT, padx=(10, 0))
+        self.find_var = tk.StringVar()
+        find_entry = ttk.Entry(toolbar, textvariable=self.find_var, width=20)
+        find_entry.pack(side=tk.LEFT, padx=5)
+        find_entry.bind('<Return>', lambda e: self.find())
+        find_entry.bind('<Shift-Return>', lambda e: self.find(backward=True))
+        ttk.Button(toolbar, text="上一个", width=6,
+                   command=lambda: self.find(backward=True)).pack(side=tk.LEFT)
+        ttk.Button(toolbar, text="下一个", width=6,
+                   command=self.find).pack(side=tk.LEFT, padx=5)
+        self.status = ttk.Label(toolbar, text="", font=caption_font)
+        self.status.pack(side=tk.LEFT, padx=10)
+        ttk.Button(toolbar, text="关闭大文档", command=on_close).pack(side=tk.RIGHT)
+        
+        self.text = tk.Text(self.frame, wrap=tk.NONE, state=tk.DISABLED, cursor='arrow',
+                            **text_options)
+        self.text.grid(row=1, column=0, sticky="nsew")
+        self.text.tag_configure('gutter', foreground=gutter_color)
+        self.text.tag_configure('match', background=match_color)
+        self.scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.yview)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+        # 每行最多显示 MAX_COLUMNS 个字符, 水平方向直接由文本框滚动
+        xscroll = ttk.Scrollbar(self.frame, orient=tk.HORIZONTAL, command=self.text.xview)
+        xscroll.grid(row=2, column=0, sticky="ew")
+        self.text.config(xscrollcommand=xscroll.set)
+        self.linespace = tkfont.Font(font=self.text.cget('font')).metrics('linespace')
+        
+        self.text.bind('<Configure>', lambda e: self.render())
+        self.text.bind('<MouseWheel>', lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.text.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.text.bind('<Button-5>', lambda e: self.scroll(3))
+        self.text.bind('<Button-1>', lambda e: self.text.focus_set())
+        self.text.bind('<Up>', lambda e: self.scroll(-1))
+        self.text.bind('<Down>', lambda e: self.scroll(1))
+        self.text.bind('<Prior>', lambda e: self.scroll(-1, 'pages'))
+        self.text.bind('<Next>', lambda e: self.scroll(1, 'pages'))
+    
+    def show(self, view):
+        """显示一个新的文档"""
+        self.view = view
+        self.goto_var.set('')
+        self.status.config(text='')
+        self.render()
+    
+    def rows(self):
+        """窗口能容纳的行数"""
+        text = self.text
+        inset = 2 * sum(int(str(text.cget(option)))
+                        for option in ('pady', 'borderwidth', 'highlightthickness'))
+        return max(1, (text.winfo_height() - inset) // self.linespace)
+    
+    def yview(self, action, *args):
+        """滚动条的回调: moveto 或 scroll"""
+        if action == 'moveto':
+            self.view.moveto(args[0])
+            self.render()
+        else:
+            self.scroll(int(args[0]), args[1])
+    
+    def scroll(self, amount, what='units'):
+        """按行或按页滚动"""
+        if what == 'pages':
+            self.view.page(amount)
+        else:
+            self.view.scroll(amount)
+        self.render()
+        return 'break'
+    
+    def goto(self):
+        try:
+            number = int(self.goto_var.get())
+        except ValueError:
+            self.status.config(text='请输入行号')
+            return
+        self.status.config(text=f'第{self.view.goto(number)}行')
+        self.render()
+    
+    def find(self, backward=False):
+        """查找下一处或上一处, 结果所在的行显示在窗口中并高亮"""
+        needle = self.find_var.get()
+        line = self.view.find(needle, backward)
+        if line is None:
+            self.status.config(text=f'没有找到「{needle}」' if needle else '')
+            return
+        status = f'第{line}行'
+        if self.view.wrapped:
+            status += ' (已从末尾继续)' if backward else ' (已从开头继续)'
+        self.status.config(text=status)
+        self.render()
+    
+    def render(self):
+        """把窗口内的行写入文本框并同步滚动条"""
+        view = self.view
+        if view is None:
+            return
+        view.rows = self.rows()
+        view.scroll(0)
+        text = self.text
+        left = text.xview()[0]
+        text.config(state=tk.NORMAL)
+        text.delete('1.0', 'end')
+        lines = view.render()
+        text.insert('1.0', '\n'.join(lines))
+        gutter = view.gutter_width()
+        for row in range(1, len(lines) + 1):
+            text.tag_add('gutter', f'{row}.0', f'{row}.{gutter}')
+        mark = view.highlight()
+        if mark is not None:
+            row, start, end = mark
+            text.tag_add('match', f'{row + 1}.{start}', f'{row + 1}.{end}')
+        text.config(state=tk.DISABLED)
+        text.xview_moveto(left)
+        self.scrollbar.set(*view.fraction())
+
 class TechKeyboardSimulator:
     def __init__(self, window):
         self.window = window
@@ -42,17 +297,45 @@ class TechKeyboardSimulator:
         self.window.option_add('*TCombobox*Listbox.font', self.fonts["body"])
         
         # 初始化变量
-        self.records = []
+        # 内存中只保留最近的记录, 全部记录溢写到临时文件供保存
+        self.records = RecordLog(spill=True)
         self.stop_event = threading.Event()
-        self.input_thread = None
+        # 常驻的输入线程, 任务排队依次执行; 系统键盘等后端只创建一次
+        # 勾选「协程引擎」后改为在界面线程推进的事件循环中执行 (见 _create_worker)
+        self.loop_pump = None
+        self.worker = self._create_worker(False)
+        # 粘贴模式下工作线程经界面线程读写剪贴板
+        self.clipboard = UIThreadClipboard(TkClipboard(self.window), wake=self._wake_clipboard)
+        self.window.bind('<<ClipboardRequest>>', lambda e: self.clipboard.service())
+        self.active_jobs = []
+        self.progress_job = None
+        self.queue_rows = []
         self.execution_count = 0
         self.title_blink_id = None
+        self.channel_pump_id = None
+        self.file_source = None
+        self.data_source = None
+        self.telemetry = None
+        self.stats = TextStats()
+        self.stats_refresh_id = None
+        # 运行期间 (低开销模式) 或最小化时暂停非必要的界面刷新
+        self.ui_budget = UIBudget()
+        self.macro_cache = None
+        # 运行进度写入续打日志, 关闭或崩溃后可以从最后落盘的位置继续
+        self.journal = ResumeJournal()
+        self.records_view = None
+        self.queue_list = None
+        # 大文档模式: 超长文本不放进输入框, 由只读的分窗预览显示
+        self.large_document = None
+        self.document_preview = None
         
-        # 构建UI
+        # 构建UI; 参数和记录面板推迟到第一帧之后, 界面变量先行创建
+        self._create_variables()
         self._setup_tech_styles()
         self._create_tech_interface()
         self._setup_keyboard_shortcuts()
         self._setup_title_animation()
+        self._track_window_state()
         
     def _setup_tech_styles(self):
         """配置简约科技风格的ttk样式"""
@@ -108,6 +391,17 @@ class TechKeyboardSimulator:
                        background=self.colors["accent_primary"],
                        borderwidth=0)
         
+    def _create_variables(self):
+        """创建参数面板绑定的变量, 面板构建之前也可以读取默认参数"""
+        self.delay_var = tk.DoubleVar(value=3.0)
+        self.interval_var = tk.DoubleVar(value=0.08)
+        self.repetition_var = tk.StringVar(value="1")
+        self.newline_var = tk.StringVar(value="Enter")
+        self.typing_mode_var = tk.StringVar(value="逐字")
+        self.burst_chunk_var = tk.StringVar(value=str(DEFAULT_BURST_CHUNK))
+        self.backend_var = tk.StringVar(value="系统键盘")
+        self.timing_var = tk.StringVar()
+    
     def _create_tech_interface(self):
         """创建简约科技风格的界面"""
         # 主容器
@@ -141,6 +435,7 @@ class TechKeyboardSimulator:
         
         # === 输入内容区域 ===
         input_frame = ttk.LabelFrame(main_container, text="输入内容", style="Tech.TLabelframe")
+        self.input_frame = input_frame
         input_frame.grid(row=1, column=0, sticky="nsew", pady=(0, 15))
         input_frame.columnconfigure(0, weight=1)
         input_frame.rowconfigure(0, weight=1)
@@ -168,94 +463,22 @@ class TechKeyboardSimulator:
                                   fg=self.colors["text_secondary"],
                                   bg=self.colors["secondary_bg"])
         self.text_stats.grid(row=1, column=0, sticky="w", padx=20, pady=(0, 10))
-        self.text_area.bind('<KeyRelease>', self._update_text_stats)
+        self._install_text_proxy()
+        # 粘贴后对全文重新计数一次, 其余编辑按增量统计; 超长的文本改用大文档预览
+        self.text_area.bind('<<Paste>>', self._on_paste)
         
         # === 参数控制区域 ===
-        control_frame = ttk.LabelFrame(main_container, text="参数设置", style="Tech.TLabelframe")
-        control_frame.grid(row=2, column=0, sticky="ew", pady=10)
-        control_frame.columnconfigure(1, weight=3)
-        
-        # 使用网格布局参数控件
-        label_grid_config = {'padx': 12, 'pady': 8, 'sticky': 'w'}
-        control_grid_config = {'padx': 12, 'pady': 8, 'sticky': 'ew'}
-        
-        # 第一行：延迟设置
-        ttk.Label(control_frame, text="开始延迟:", font=self.fonts["body"]).grid(
-            row=0, column=0, **label_grid_config)
-        
-        self.delay_var = tk.DoubleVar(value=3.0)
-        self.delay_scale = ttk.Scale(control_frame, from_=0, to=20, 
-                                   orient=tk.HORIZONTAL, variable=self.delay_var,
-                                   command=self._update_parameter_display)
-        self.delay_scale.grid(row=0, column=1, **control_grid_config)
-        
-        self.delay_label = tk.Label(control_frame, text="3.00秒", 
-                                   font=self.fonts["caption"],
-                                   fg=self.colors["accent_primary"],
-                                   bg=self.colors["primary_bg"])
-        self.delay_label.grid(row=0, column=2, sticky="w", padx=(0, 12))
-        
-        # 第二行：间隔设置
-        ttk.Label(control_frame, text="字符间隔:", font=self.fonts["body"]).grid(
-            row=1, column=0, **label_grid_config)
-        
-        self.interval_var = tk.DoubleVar(value=0.08)
-        self.interval_scale = ttk.Scale(control_frame, from_=0.01, to=1, 
-                                      orient=tk.HORIZONTAL, variable=self.interval_var,
-                                      command=self._update_parameter_display)
-        self.interval_scale.grid(row=1, column=1, **control_grid_config)
-        
-        self.interval_label = tk.Label(control_frame, text="0.08秒", 
-                                      font=self.fonts["caption"],
-                                      fg=self.colors["accent_primary"],
-                                      bg=self.colors["primary_bg"])
-        self.interval_label.grid(row=1, column=2, sticky="w", padx=(0, 12))
-        
-        # 第三行：重复次数
-        ttk.Label(control_frame, text="重复次数:", font=self.fonts["body"]).grid(
-            row=2, column=0, **label_grid_config)
-        
-        self.repetition_var = tk.StringVar(value="1")
-        self.repetition_entry = ttk.Entry(control_frame, 
-                                         textvariable=self.repetition_var,
-                                         font=self.fonts["body"],
-                                         validate="key")
-        self.repetition_entry.configure(validatecommand=(
-            self.window.register(self._validate_integer), '%P'))
-        self.repetition_entry.grid(row=2, column=1, sticky="w", padx=12, pady=8)
-        
-        # 第四行：换行方式
-        ttk.Label(control_frame, text="换行方式:", font=self.fonts["body"]).grid(
-            row=3, column=0, **label_grid_config)
-        
-        self.newline_var = tk.StringVar(value="Enter")
-        newline_options = ["Enter", "Shift+Enter", "Shift+Tab x10", "Home x2"]
-        self.newline_combo = ttk.Combobox(control_frame, 
-                                         textvariable=self.newline_var,
-                                         values=newline_options,
-                                         state="readonly",
-                                         font=self.fonts["body"])
-        self.newline_combo.grid(row=3, column=1, sticky="ew", padx=12, pady=8)
+        # 面板里的控件在第一帧之后由 _create_parameter_panel 构建
+        self.control_frame = ttk.LabelFrame(main_container, text="参数设置", style="Tech.TLabelframe")
+        self.control_frame.grid(row=2, column=0, sticky="ew", pady=10)
+        self.control_frame.columnconfigure(1, weight=3)
         
         # === 输出记录区域 ===
-        records_frame = ttk.LabelFrame(main_container, text="执行记录", style="Tech.TLabelframe")
-        records_frame.grid(row=3, column=0, sticky="nsew", pady=(10, 0))
-        records_frame.columnconfigure(0, weight=1)
-        records_frame.rowconfigure(0, weight=1)
-        
-        self.records_area = scrolledtext.ScrolledText(
-            records_frame,
-            wrap=tk.WORD,
-            state=tk.DISABLED,
-            font=self.fonts["monospace"],
-            bg=self.colors["secondary_bg"],
-            fg=self.colors["text_primary"],
-            relief="solid",
-            borderwidth=1,
-            padx=15,
-            pady=15
-        )
-        self.records_area.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
+        # 记录视图和任务队列在第一帧之后由 _create_records_panel 构建
+        self.records_frame = ttk.LabelFrame(main_container, text="执行记录", style="Tech.TLabelframe")
+        self.records_frame.grid(row=3, column=0, sticky="nsew", pady=(10, 0))
+        self.records_frame.columnconfigure(0, weight=1)
+        self.records_frame.rowconfigure(0, weight=1)
         
         # === 控制按钮区域 ===
         button_frame = ttk.Frame(main_container)
@@ -288,18 +511,62 @@ class TechKeyboardSimulator:
                                     selectcolor=self.colors["secondary_bg"],
                                     activebackground=self.colors["primary_bg"],
                                     activeforeground=self.colors["text_primary"])
-        clear_check.pack(side=tk.LEFT)
+        clear_check.pack(side=tk.LEFT, padx=(0, 15))
+        
+        self.low_overhead_var = tk.BooleanVar()
+        low_overhead_check = tk.Checkbutton(options_frame,
+                                           text='低开销运行',
+                                           variable=self.low_overhead_var,
+                                           command=self._toggle_low_overhead,
+                                           font=self.fonts["caption"],
+                                           fg=self.colors["text_secondary"],
+                                           bg=self.colors["primary_bg"],
+                                           selectcolor=self.colors["secondary_bg"],
+                                           activebackground=self.colors["primary_bg"],
+                                           activeforeground=self.colors["text_primary"])
+        low_overhead_check.pack(side=tk.LEFT, padx=(0, 15))
+        
+        self.async_engine_var = tk.BooleanVar()
+        async_engine_check = tk.Checkbutton(options_frame,
+                                           text='协程引擎',
+                                           variable=self.async_engine_var,
+                                           command=self._toggle_async_engine,
+                                           font=self.fonts["caption"],
+                                           fg=self.colors["text_secondary"],
+                                           bg=self.colors["primary_bg"],
+                                           selectcolor=self.colors["secondary_bg"],
+                                           activebackground=self.colors["primary_bg"],
+                                           activeforeground=self.colors["text_primary"])
+        async_engine_check.pack(side=tk.LEFT)
         
         # 右侧按钮组
         action_frame = ttk.Frame(button_frame)
         action_frame.pack(side=tk.RIGHT)
         
+        self.load_btn = ttk.Button(action_frame,
+                                  text='载入文件',
+                                  command=self.toggle_file_source,
+                                  style="Tech.TButton")
+        self.load_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.data_btn = ttk.Button(action_frame,
+                                  text='载入数据',
+                                  command=self.toggle_data_source,
+                                  style="Tech.TButton")
+        self.data_btn.pack(side=tk.LEFT, padx=5)
+        
         self.start_btn = ttk.Button(action_frame,
                                    text='开始输入 (F5)',
                                    command=self.start_simulation,
                                    style="Primary.TButton")
         self.start_btn.pack(side=tk.LEFT, padx=5)
         
+        self.resume_btn = ttk.Button(action_frame,
+                                    text='继续上次',
+                                    command=self.resume_simulation,
+                                    style="Tech.TButton")
+        self.resume_btn.pack(side=tk.LEFT, padx=5)
+        
         self.stop_btn = ttk.Button(action_frame,
                                   text='停止 (F6)',
                                   command=self.stop_simulation,
@@ -307,12 +574,25 @@ class TechKeyboardSimulator:
                                   state=tk.DISABLED)
         self.stop_btn.pack(side=tk.LEFT, padx=5)
         
+        self.pause_btn = ttk.Button(action_frame,
+                                   text='暂停 (F7)',
+                                   command=self.toggle_pause,
+                                   style="Tech.TButton",
+                                   state=tk.DISABLED)
+        self.pause_btn.pack(side=tk.LEFT, padx=5)
+        
         self.save_btn = ttk.Button(action_frame,
                                   text='保存记录',
                                   command=self.save_records,
                                   style="Tech.TButton")
         self.save_btn.pack(side=tk.LEFT, padx=5)
         
+        self.telemetry_btn = ttk.Button(action_frame,
+                                       text='导出遥测',
+                                       command=self.save_telemetry,
+                                       style="Tech.TButton")
+        self.telemetry_btn.pack(side=tk.LEFT, padx=5)
+        
         # === 进度条区域 ===
         self.progress = ttk.Progressbar(main_container,
                                        orient=tk.HORIZONTAL,
@@ -320,13 +600,190 @@ class TechKeyboardSimulator:
                                        style="Tech.Horizontal.TProgressbar")
         self.progress.grid(row=5, column=0, sticky="ew", pady=(15, 0))
         
+        # 事件通道统计
+        self.channel_stats = tk.Label(main_container,
+                                     text="",
+                                     font=self.fonts["caption"],
+                                     fg=self.colors["text_secondary"],
+                                     bg=self.colors["primary_bg"])
+        self.channel_stats.grid(row=6, column=0, sticky="w", pady=(5, 0))
+        
+        # 运行遥测摘要
+        self.telemetry_stats = tk.Label(main_container,
+                                       text="",
+                                       font=self.fonts["caption"],
+                                       fg=self.colors["text_secondary"],
+                                       bg=self.colors["primary_bg"])
+        self.telemetry_stats.grid(row=7, column=0, sticky="w")
+        
+    def _create_parameter_panel(self):
+        """构建参数设置面板的控件"""
+        # 使用网格布局参数控件
+        label_grid_config = {'padx': 12, 'pady': 8, 'sticky': 'w'}
+        control_grid_config = {'padx': 12, 'pady': 8, 'sticky': 'ew'}
+        
+        # 第一行：延迟设置
+        ttk.Label(self.control_frame, text="开始延迟:", font=self.fonts["body"]).grid(
+            row=0, column=0, **label_grid_config)
+        
+        self.delay_scale = ttk.Scale(self.control_frame, from_=0, to=20, 
+                                   orient=tk.HORIZONTAL, variable=self.delay_var,
+                                   command=self._update_parameter_display)
+        self.delay_scale.grid(row=0, column=1, **control_grid_config)
+        
+        self.delay_label = tk.Label(self.control_frame, text="3.00秒", 
+                                   font=self.fonts["caption"],
+                                   fg=self.colors["accent_primary"],
+                                   bg=self.colors["primary_bg"])
+        self.delay_label.grid(row=0, column=2, sticky="w", padx=(0, 12))
+        
+        # 第二行：间隔设置
+        ttk.Label(self.control_frame, text="字符间隔:", font=self.fonts["body"]).grid(
+            row=1, column=0, **label_grid_config)
+        
+        self.interval_scale = ttk.Scale(self.control_frame, from_=0.01, to=1, 
+                                      orient=tk.HORIZONTAL, variable=self.interval_var,
+                                      command=self._update_parameter_display)
+        self.interval_scale.grid(row=1, column=1, **control_grid_config)
+        
+        self.interval_label = tk.Label(self.control_frame, text="0.08秒", 
+                                      font=self.fonts["caption"],
+                                      fg=self.colors["accent_primary"],
+                                      bg=self.colors["primary_bg"])
+        self.interval_label.grid(row=1, column=2, sticky="w", padx=(0, 12))
+        
+        # 第三行：重复次数
+        ttk.Label(self.control_frame, text="重复次数:", font=self.fonts["body"]).grid(
+            row=2, column=0, **label_grid_config)
+        
+        self.repetition_entry = ttk.Entry(self.control_frame, 
+                                         textvariable=self.repetition_var,
+                                         font=self.fonts["body"],
+                                         validate="key")
+        self.repetition_entry.configure(validatecommand=(
+            self.window.register(self._validate_integer), '%P'))
+        self.repetition_entry.grid(row=2, column=1, sticky="w", padx=12, pady=8)
+        
+        # 第四行：换行方式
+        ttk.Label(self.control_frame, text="换行方式:", font=self.fonts["body"]).grid(
+            row=3, column=0, **label_grid_config)
+        
+        newline_options = ["Enter", "Shift+Enter", "Shift+Tab x10", "Home x2"]
+        self.newline_combo = ttk.Combobox(self.control_frame, 
+                                         textvariable=self.newline_var,
+                                         values=newline_options,
+                                         state="readonly",
+                                         font=self.fonts["body"])
+        self.newline_combo.grid(row=3, column=1, sticky="ew", padx=12, pady=8)
+        
+        # 第五行：输入模式
+        ttk.Label(self.control_frame, text="输入模式:", font=self.fonts["body"]).grid(
+            row=4, column=0, **label_grid_config)
+        
+        mode_frame = ttk.Frame(self.control_frame)
+        mode_frame.grid(row=4, column=1, sticky="w", padx=12, pady=8)
+        
+        self.typing_mode_combo = ttk.Combobox(mode_frame,
+                                              textvariable=self.typing_mode_var,
+                                              values=["逐字", "突发", "宏脚本", "粘贴",
+                                                      "粘贴(逐字)"],
+                                              state="readonly",
+                                              width=10,
+                                              font=self.fonts["body"])
+        self.typing_mode_combo.bind('<<ComboboxSelected>>', self._on_typing_mode)
+        self.typing_mode_combo.pack(side=tk.LEFT)
+        
+        ttk.Label(mode_frame, text="块大小:", font=self.fonts["body"]).pack(side=tk.LEFT, padx=(15, 5))
+        self.burst_chunk_entry = ttk.Entry(mode_frame,
+                                           textvariable=self.burst_chunk_var,
+                                           width=8,
+                                           font=self.fonts["body"],
+                                           validate="key")
+        self.burst_chunk_entry.configure(validatecommand=(
+            self.window.register(self._validate_integer), '%P'))
+        self.burst_chunk_entry.pack(side=tk.LEFT)
+        
+        # 第六行：键盘后端
+        ttk.Label(self.control_frame, text="键盘后端:", font=self.fonts["body"]).grid(
+            row=5, column=0, **label_grid_config)
+        
+        self.backend_combo = ttk.Combobox(self.control_frame,
+                                          textvariable=self.backend_var,
+                                          values=list(BACKEND_OPTIONS),
+                                          state="readonly",
+                                          font=self.fonts["body"])
+        self.backend_combo.grid(row=5, column=1, sticky="ew", padx=12, pady=8)
+        
+        # 第七行：输入节奏
+        from keyboard_engine.delay_profiles import FIXED_INTERVAL, PROFILES
+        self.timing_var.set(FIXED_INTERVAL)
+        ttk.Label(self.control_frame, text="输入节奏:", font=self.fonts["body"]).grid(
+            row=6, column=0, **label_grid_config)
+        
+        self.timing_combo = ttk.Combobox(self.control_frame,
+                                         textvariable=self.timing_var,
+                                         values=[FIXED_INTERVAL] + list(PROFILES),
+                                         state="readonly",
+                                         font=self.fonts["body"])
+        self.timing_combo.grid(row=6, column=1, sticky="ew", padx=12, pady=8)
+        
         # 初始化参数显示
         self._update_parameter_display()
+    
+    def _create_records_panel(self):
+        """构建执行记录视图和任务队列"""
+        self.records_view = VirtualRecordView(
+            self.records_frame,
+            self.records,
+            font=self.fonts["monospace"],
+            bg=self.colors["secondary_bg"],
+            fg=self.colors["text_primary"],
+            relief="solid",
+            borderwidth=1,
+            padx=15,
+            pady=15
+        )
+        self.records_view.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
+        
+        # 任务队列: 正在执行的任务在最上面, 等待中的任务可以调整顺序或取消
+        queue_frame = ttk.Frame(self.records_frame)
+        queue_frame.grid(row=0, column=1, sticky="ns", padx=(0, 10), pady=10)
+        queue_frame.rowconfigure(1, weight=1)
+        ttk.Label(queue_frame, text="任务队列", font=self.fonts["caption"]).grid(
+            row=0, column=0, columnspan=3, sticky="w")
+        self.queue_list = tk.Listbox(queue_frame,
+                                     width=24,
+                                     font=self.fonts["caption"],
+                                     bg=self.colors["secondary_bg"],
+                                     fg=self.colors["text_primary"],
+                                     relief="solid",
+                                     borderwidth=1,
+                                     activestyle="none")
+        self.queue_list.grid(row=1, column=0, columnspan=3, sticky="nsew", pady=5)
+        ttk.Button(queue_frame, text="上移", width=4,
+                   command=lambda: self._move_job(-1)).grid(row=2, column=0)
+        ttk.Button(queue_frame, text="下移", width=4,
+                   command=lambda: self._move_job(1)).grid(row=2, column=1)
+        ttk.Button(queue_frame, text="取消", width=4,
+                   command=self._cancel_job).grid(row=2, column=2)
+        self.records_view.render()
+    
+    def finish_startup(self):
+        """第一帧显示之后调用: 构建延迟的面板并输出启动耗时报告"""
+        startup.timer.mark('first_frame')
+        self.window.after(0, self._create_deferred_panels)
+    
+    def _create_deferred_panels(self):
+        self._create_parameter_panel()
+        self._create_records_panel()
+        startup.timer.mark('panels')
+        startup.timer.report()
         
     def _setup_keyboard_shortcuts(self):
         """设置键盘快捷键"""
         self.window.bind('<F5>', lambda e: self.start_simulation())
         self.window.bind('<F6>', lambda e: self.stop_simulation())
+        self.window.bind('<F7>', lambda e: self.toggle_pause())
         self.window.bind('<Control-s>', lambda e: self.save_records())
         
     def _setup_title_animation(self):
@@ -337,6 +794,9 @@ class TechKeyboardSimulator:
         
     def _animate_title(self):
         """标题闪烁动画"""
+        if self.ui_budget.reduced:
+            self.title_blink_id = None
+            return
         if self.title_label.winfo_exists():
             # 更新标题颜色
             new_color = self.title_colors[self.current_color_index]
@@ -354,18 +814,188 @@ class TechKeyboardSimulator:
             self.window.after_cancel(self.title_blink_id)
             self.title_blink_id = None
     
+    def _track_window_state(self):
+        """窗口最小化时暂停动画并降低刷新频率, 还原后恢复"""
+        self.window.bind('<Unmap>', lambda e: self._on_window_state(e, True))
+        self.window.bind('<Map>', lambda e: self._on_window_state(e, False))
+    
+    def _on_window_state(self, event, minimized):
+        # 子控件的映射事件也会传到窗口上, 只处理窗口本身
+        if event.widget is self.window and self.ui_budget.minimized != minimized:
+            self.ui_budget.minimized = minimized
+            self._apply_ui_budget()
+    
+    def _toggle_low_overhead(self):
+        """切换低开销运行模式, 运行中切换立即生效"""
+        self.ui_budget.low_overhead = self.low_overhead_var.get()
+        self._apply_ui_budget()
+    
+    def _apply_ui_budget(self):
+        """按当前的刷新预算暂停或恢复非必要的界面工作"""
+        if self.ui_budget.reduced:
+            self._stop_title_animation()
+            return
+        if self.title_blink_id is None:
+            self._animate_title()
+        # 补上暂停期间跳过的刷新
+        self._refresh_text_stats()
+        if self.records_view is not None:
+            self.records_view.render()
+        if self.progress_job is not None:
+            self._update_run_labels(self.progress_job)
+    
+    def _on_typing_mode(self, event=None):
+        """切换到粘贴模式或从粘贴模式切回时, 块大小换成对应模式的默认值"""
+        paste = self.typing_mode_var.get() in ("粘贴", "粘贴(逐字)")
+        if paste and self.burst_chunk_var.get() == str(DEFAULT_BURST_CHUNK):
+            self.burst_chunk_var.set(str(DEFAULT_PASTE_CHUNK))
+        elif not paste and self.burst_chunk_var.get() == str(DEFAULT_PASTE_CHUNK):
+            self.burst_chunk_var.set(str(DEFAULT_BURST_CHUNK))
+    
     def _validate_integer(self, value):
         """验证输入是否为有效整数"""
         if value == "" or (value.isdigit() and int(value) > 0):
             return True
         return False
     
+    def _install_text_proxy(self):
+        """用代理命令替换输入框的Tcl命令, 从insert/delete/replace中取得编辑增量"""
+        widget_cmd = str(self.text_area)
+        self.text_cmd = widget_cmd + '_orig'
+        self.window.tk.call('rename', widget_cmd, self.text_cmd)
+        self.window.tk.createcommand(widget_cmd, self._text_proxy)
+    
+    def _text_proxy(self, command, *args):
+        """转发输入框命令, 编辑类命令顺便登记增量并安排统计刷新"""
+        call = self.window.tk.call
+        orig = self.text_cmd
+        try:
+            if command not in ('insert', 'delete', 'replace') or \
+                    str(call(orig, 'cget', '-state')) != tk.NORMAL:
+                return call((orig, command) + args)
+            
+            removed = None
+            if command == 'insert':
+                inserted = args[1::2]
+            elif command == 'delete' and len(args) > 2:
+                # 一次删除多个区间很少见, 直接全文重新计数
+                inserted = ()
+            else:
+                inserted = args[2::2] if command == 'replace' else ()
+                first = args[0]
+                last = args[1] if len(args) > 1 else f'{first} +1c'
+                removed = call(orig, 'get', first, last)
+                # 末尾的换行符不会被删除
+                if removed and self.window.tk.getboolean(call(orig, 'compare', last, '>=', 'end')):
+                    removed = removed[:-1]
+            
+            result = call((orig, command) + args)
+        except tk.TclError:
+            # 与Tk自带绑定中的 catch 配合, 例如没有选区时删除 sel.first
+            return ''
+        
+        if command == 'delete' and removed is None:
+            self.window.after_idle(self._update_text_stats)
+            return result
+        if removed:
+            self.stats.remove(removed)
+        for chars in inserted:
+            self.stats.insert(chars)
+        self._schedule_stats_refresh()
+        return result
+    
+    def _schedule_stats_refresh(self):
+        """编辑停止一段时间后才刷新统计标签, 连续输入时不重复刷新"""
+        if self.stats_refresh_id:
+            self.window.after_cancel(self.stats_refresh_id)
+        self.stats_refresh_id = self.window.after(int(STATS_DEBOUNCE * 1000),
+                                                  self._refresh_text_stats)
+    
+    def _refresh_text_stats(self):
+        """把统计写到标签上, 内容没有变化时不触碰标签"""
+        self.stats_refresh_id = None
+        # 低开销运行时统计照常累加, 只是推迟到运行结束才显示
+        if self.file_source is not None or self.ui_budget.reduced:
+            return
+        label = self.stats.changed_label()
+        if label is not None:
+            self.text_stats.config(text=label)
+    
     def _update_text_stats(self, event=None):
-        """更新文本统计信息"""
-        content = self.text_area.get('1.0', 'end-1c')
-        char_count = len(content)
-        line_count = content.count('\n') + 1
-        self.text_stats.config(text=f"字符数: {char_count} | 行数: {line_count}")
+        """对全文重新计数并立即刷新统计 (载入、粘贴和退出文件模式时使用)"""
+        self.stats.reset(self._input_text())
+        self._refresh_text_stats()
+    
+    def _input_text(self):
+        """输入的全部文本; 大文档模式下为预览中的文档"""
+        if self.large_document is not None:
+            return self.large_document.index.text
+        return self.text_area.get('1.0', 'end-1c')
+    
+    def _set_input_text(self, text):
+        """替换输入的文本, 超长时改用大文档预览"""
+        from keyboard_engine.large_document import LARGE_TEXT_THRESHOLD
+        if len(text) > LARGE_TEXT_THRESHOLD:
+            self._enter_large_mode(text)
+            return
+        if self.large_document is not None:
+            self._exit_large_mode()
+        self.text_area.delete('1.0', 'end')
+        self.text_area.insert('1.0', text)
+        self._update_text_stats()
+    
+    def _on_paste(self, event):
+        """粘贴的文本超过阈值时连同输入框原有的内容一起转为大文档预览"""
+        from keyboard_engine.large_document import LARGE_TEXT_THRESHOLD
+        if self.file_source is None:
+            try:
+                pasted = self.window.clipboard_get()
+            except tk.TclError:
+                pasted = ''
+            if len(pasted) > LARGE_TEXT_THRESHOLD:
+                area = self.text_area
+                try:
+                    first, last = area.index('sel.first'), area.index('sel.last')
+                except tk.TclError:
+                    first = last = area.index('insert')
+                self._enter_large_mode(area.get('1.0', first) + pasted + area.get(last, 'end-1c'))
+                return 'break'
+        self.window.after_idle(self._update_text_stats)
+    
+    def _enter_large_mode(self, text):
+        """用只读的分窗预览代替输入框显示 text; 行首索引只在这里建立一次"""
+        from keyboard_engine.large_document import DocumentView, LineIndex
+        if self.document_preview is None:
+            self.document_preview = DocumentPreview(
+                self.input_frame,
+                self._exit_large_mode,
+                self.fonts["caption"],
+                self.colors["warning"],
+                self.colors["text_secondary"],
+                font=self.fonts["monospace"],
+                bg=self.colors["secondary_bg"],
+                fg=self.colors["text_primary"],
+                relief="solid",
+                borderwidth=1,
+                padx=15,
+                pady=15
+            )
+        self.large_document = DocumentView(LineIndex(text))
+        self.text_area.delete('1.0', 'end')
+        self.text_area.grid_remove()
+        self.document_preview.frame.grid(row=0, column=0, sticky="nsew", padx=10, pady=10)
+        self.document_preview.show(self.large_document)
+        self._update_text_stats()
+        self._add_records([f"[{time.strftime('%H:%M:%S')}] 文本较长 ({len(text)}字符), "
+                           "已改为只读的大文档预览"])
+    
+    def _exit_large_mode(self):
+        """关闭大文档并恢复空白的输入框"""
+        self.large_document = None
+        self.document_preview.frame.grid_remove()
+        self.document_preview.view = None
+        self.text_area.grid()
+        self._update_text_stats()
     
     def _update_parameter_display(self, event=None):
         """更新参数显示"""
@@ -378,8 +1008,8 @@ class TechKeyboardSimulator:
         """切换窗口置顶状态"""
         self.window.attributes("-topmost", self.topmost_var.get())
     
-    def start_simulation(self):
-        """开始模拟输入"""
+    def start_simulation(self, resume=None):
+        """开始模拟输入; resume 为续打日志中的 ResumeState 时从其检查点继续"""
         try:
             repetitions = int(self.repetition_var.get())
             if repetitions < 1:
@@ -388,127 +1018,495 @@ class TechKeyboardSimulator:
             messagebox.showerror("输入错误", "重复次数必须是一个正整数。")
             return
         
-        text_content = self.text_area.get('1.0', 'end-1c').strip()
-        if not text_content:
-            messagebox.showwarning("输入警告", "请输入要模拟的内容。")
+        burst_chunk = 0
+        if self.typing_mode_var.get() in ("突发", "粘贴", "粘贴(逐字)"):
+            try:
+                burst_chunk = int(self.burst_chunk_var.get())
+                if burst_chunk < 1:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("输入错误", "块大小必须是一个正整数。")
+                return
+        
+        interval = self.interval_var.get()
+        newline_mode = self.newline_var.get()
+        resumable = True
+        if self.typing_mode_var.get() == "宏脚本":
+            # 宏脚本: 文件或文本框的内容按宏语法编译, 语法错误在开始前提示
+            from keyboard_engine.macro import MacroCache, compile_macro, default_cache_dir
+            if self.macro_cache is None:
+                # 编译后的宏按内容哈希缓存在磁盘上, 再次运行同一脚本时不再解析
+                self.macro_cache = MacroCache(default_cache_dir())
+            try:
+                if self.file_source is not None:
+                    with open(self.file_source.path, 'r', encoding='utf-8') as f:
+                        script = f.read()
+                else:
+                    script = self._input_text().strip()
+                if not script:
+                    messagebox.showwarning("输入警告", "请输入要模拟的内容。")
+                    return
+                plan = compile_macro(script, interval, newline_mode, cache=self.macro_cache)
+            except (OSError, ValueError) as e:
+                messagebox.showerror("宏脚本错误", str(e))
+                return
+            total_steps = plan.total_steps
+        elif self.typing_mode_var.get() in ("粘贴", "粘贴(逐字)"):
+            # 粘贴模式: 文件或文本框的内容按块经剪贴板粘贴, 换行随文本一起粘贴;
+            # 无法确认目标是否接收了粘贴, 忽略粘贴的目标需手动选「粘贴(逐字)」逐个字符输入
+            try:
+                if self.file_source is not None:
+                    with open(self.file_source.path, 'r', encoding='utf-8') as f:
+                        text_content = f.read()
+                else:
+                    text_content = self._input_text().strip()
+            except OSError as e:
+                messagebox.showerror("读取失败", str(e))
+                return
+            if not text_content:
+                messagebox.showwarning("输入警告", "请输入要模拟的内容。")
+                return
+            paste_plan = compile_paste_plan(text_content, burst_chunk, interval,
+                                            self.typing_mode_var.get() == "粘贴(逐字)")
+            # 进度按块计算: 块数作为权重分摊到每个字符上
+            segment = ((paste_plan, len(paste_plan)),)
+            plan = lambda: segment
+            total_steps = len(paste_plan)
+        elif self.data_source is not None:
+            # 数据模式: 输入框内容作为模板, 每行数据渲染一次, 进度按行数计算
+            template = self._input_text().strip()
+            if not template:
+                messagebox.showwarning("输入警告", "请在输入框中填写模板。")
+                return
+            try:
+                source = self.data_source.with_template(template)
+            except ValueError as e:
+                messagebox.showerror("模板错误", str(e))
+                return
+            plan = lambda: source.segments(newline_mode, interval, burst_chunk)
+            total_steps = source.rows
+            # 含 {timestamp} 的模板每次渲染的文本不同, 续打的位置对不上, 不记录日志
+            resumable = source.reproducible
+        elif self.file_source is not None:
+            # 文件模式: 运行时按块流式读取和编译, 进度按字节偏移计算
+            source = self.file_source
+            plan = lambda: source.segments(newline_mode, interval, burst_chunk)
+            total_steps = source.size
+        else:
+            text_content = self._input_text().strip()
+            if not text_content:
+                messagebox.showwarning("输入警告", "请输入要模拟的内容。")
+                return
+            
+            # 文本和换行方式只编译一次, 所有重复执行共用同一个按键计划
+            plan = compile_plan(text_content, newline_mode, interval, burst_chunk)
+            total_steps = plan.total_steps
+        
+        selection = self._create_backend()
+        if selection is None:
             return
+        backend, backend_key = selection
+        from keyboard_engine.telemetry import RunTelemetry
+        
+        from keyboard_engine.delay_profiles import FIXED_INTERVAL, HumanTiming, wpm_from_interval
+        timing = None
+        if self.timing_var.get() != FIXED_INTERVAL:
+            # 类人节奏: 平均速率与字符间隔一致, 全部等待时间在开始前按随机种子生成
+            timing = HumanTiming(self.timing_var.get(), wpm_from_interval(interval))
+            if resume is not None and resume.timing is not None:
+                # 继续时沿用上次的种子和生成实现, 等待时间与上次相同
+                try:
+                    timing.restore(resume.timing)
+                except ValueError as e:
+                    messagebox.showerror("无法继续", str(e))
+                    return
+        
+        params = {
+            'mode': self.typing_mode_var.get(),
+            'newline_mode': newline_mode,
+            'interval': interval,
+            'chunk': burst_chunk,
+            'repetitions': repetitions,
+            'delay': self.delay_var.get(),
+            'timing': self.timing_var.get(),
+        }
         
-        self.stop_event.clear()
+        # 每个任务使用独立的事件通道, 由界面线程按固定帧率取出;
+        # 参数在这里一次性读出, 工作线程不会读取任何界面变量
+        job = Job(plan, repetitions, self.delay_var.get(), interval,
+                  channel=UIEventChannel(),
+                  telemetry=RunTelemetry(),
+                  backend=backend,
+                  backend_key=backend_key,
+                  label=self._job_label(),
+                  total_units=total_steps,
+                  start=resume.checkpoint if resume is not None else None,
+                  timing=timing,
+                  journal=self._journal_recorder(params, timing) if resumable else None)
+        self.worker.submit(job)
+        self.active_jobs.append(job)
         self._set_ui_state(True)
+        self._refresh_queue()
+        if not self.ui_budget.running:
+            self.ui_budget.begin_run()
+            self._apply_ui_budget()
+        self._start_channel_pump()
+    
+    def _journal_recorder(self, params, timing):
+        """为任务创建续打日志写入器; 文件模式只记录文件, 其余模式记录输入框的文本"""
+        files = {}
+        if self.file_source is not None:
+            files['file'] = self.file_source.path
+        if self.data_source is not None:
+            files['data'] = self.data_source.path
+        text = None if self.file_source is not None else self._input_text().strip()
+        try:
+            return self.journal.recorder(params, text, files, timing)
+        except OSError:
+            return None
+    
+    def resume_simulation(self):
+        """恢复上次没有完成的任务的文本和参数, 从最后落盘的位置继续"""
+        try:
+            state = self.journal.load()
+        except ValueError as e:
+            self.journal.clear()
+            messagebox.showwarning("无法继续", f"{str(e)}\n已丢弃上次的续打日志, 请重新开始。")
+            return
+        if state is None:
+            messagebox.showinfo("继续上次", "没有可以继续的任务。")
+            return
+        
+        if self.file_source is not None:
+            self._exit_file_mode()
+        if self.data_source is not None:
+            self._exit_data_mode()
+        try:
+            if 'data' in state.files:
+                self._enter_data_mode(state.files['data'])
+            if 'file' in state.files:
+                self._enter_file_mode(state.files['file'])
+        except Exception as e:
+            messagebox.showerror("载入失败", f"无法读取上次的输入文件:\n{str(e)}")
+            return
+        if state.text is not None:
+            self._set_input_text(state.text)
         
-        # 计算总进度
-        total_chars = repetitions * len(text_content)
-        self.progress['maximum'] = total_chars
-        self.progress['value'] = 0
+        params = state.params
+        self.typing_mode_var.set(params['mode'])
+        self.newline_var.set(params['newline_mode'])
+        self.interval_var.set(params['interval'])
+        self.delay_var.set(params['delay'])
+        self.repetition_var.set(str(params['repetitions']))
+        if params['chunk']:
+            self.burst_chunk_var.set(str(params['chunk']))
+        self.timing_var.set(params['timing'])
+        self._update_parameter_display()
+        
+        repetition, offset = state.checkpoint
+        # 之前已经完成的执行次数计入总数
+        self.execution_count = max(self.execution_count, repetition)
+        self._add_records([f"[{time.strftime('%H:%M:%S')}] 继续上次的任务: "
+                           f"从第{repetition + 1}次执行的第{offset}步开始"])
+        self.start_simulation(resume=state)
+    
+    def _job_label(self):
+        """任务在队列中显示的名称"""
+        if self.file_source is not None:
+            return self.file_source.describe()
+        if self.data_source is not None:
+            return self.data_source.describe()
+        if self.large_document is not None:
+            text = self.large_document.index.line(0, 100).strip()
+        else:
+            text = self.text_area.get('1.0', '2.0').strip()
+        return text[:12] + ('…' if len(text) > 12 else '')
+    
+    def _refresh_queue(self):
+        """刷新任务队列列表"""
+        current = self.worker.current
+        rows = ([current] if current is not None else []) + self.worker.pending()
+        self.queue_rows = rows
+        if self.queue_list is None:
+            return
+        self.queue_list.delete(0, 'end')
+        for job in rows:
+            prefix = '▶ ' if job is current else '  '
+            self.queue_list.insert('end', prefix + job.describe())
+    
+    def _selected_job(self):
+        selection = self.queue_list.curselection()
+        if not selection or selection[0] >= len(self.queue_rows):
+            return None
+        return self.queue_rows[selection[0]]
+    
+    def _move_job(self, offset):
+        """调整选中任务在队列中的位置"""
+        job = self._selected_job()
+        if job is not None and self.worker.move(job.id, offset):
+            self._refresh_queue()
+            if job in self.queue_rows:
+                self.queue_list.selection_set(self.queue_rows.index(job))
+    
+    def _cancel_job(self):
+        """取消选中的任务, 正在执行的任务会立即停止"""
+        job = self._selected_job()
+        if job is not None and self.worker.cancel(job.id):
+            self._refresh_queue()
+    
+    def toggle_file_source(self):
+        """进入或退出文件模式; 文件模式下文本不载入输入框, 运行时流式读取"""
+        if self.file_source is not None:
+            self._exit_file_mode()
+            return
+        if self.data_source is not None:
+            self._exit_data_mode()
         
-        # 启动模拟线程
-        self.input_thread = threading.Thread(
-            target=self._simulation_worker,
-            args=(text_content, repetitions),
-            daemon=True
+        file_path = filedialog.askopenfilename(
+            filetypes=[('文本文件', '*.txt'), ('所有文件', '*.*')],
+            title='选择要输入的文本文件'
         )
-        self.input_thread.start()
+        if not file_path:
+            return
+        try:
+            self._enter_file_mode(file_path)
+        except Exception as e:
+            messagebox.showerror("载入失败", f"无法读取文件:\n{str(e)}")
     
-    def _simulation_worker(self, text_content, repetitions):
-        """模拟输入工作线程"""
-        keyboard = Controller()
-        delay = self.delay_var.get()
-        interval = self.interval_var.get()
-        newline_mode = self.newline_var.get()
+    def _enter_file_mode(self, file_path):
+        """以 file_path 进入文件模式, 读取失败时抛出异常"""
+        from keyboard_engine.text_source import FileTextSource
+        self.file_source = FileTextSource(file_path)
+        if self.large_document is not None:
+            self._exit_large_mode()
         
-        def handle_newline():
-            """处理不同的换行方式"""
-            if newline_mode == "Enter":
-                keyboard.tap(Key.enter)
-            elif newline_mode == "Shift+Enter":
-                with keyboard.pressed(Key.shift):
-                    keyboard.tap(Key.enter)
-            elif newline_mode == "Shift+Tab x10":
-                keyboard.tap(Key.enter)
-                time.sleep(interval)
-                for _ in range(10):
-                    if self.stop_event.is_set():
-                        break
-                    with keyboard.pressed(Key.shift):
-                        keyboard.tap(Key.tab)
-                    time.sleep(interval)
-            elif newline_mode == "Home x2":
-                keyboard.tap(Key.enter)
-                time.sleep(interval)
-                for _ in range(2):
-                    if self.stop_event.is_set():
-                        break
-                    keyboard.tap(Key.home)
-                    time.sleep(interval)
+        self.text_area.delete('1.0', 'end')
+        self.text_area.insert('1.0', f"[文件模式] {file_path}\n\n"
+                                     "文件内容不会载入输入框, 开始输入时按块流式读取。\n"
+                                     "点击「退出文件模式」恢复手动输入。")
+        self.text_area.config(state=tk.DISABLED)
+        self.text_stats.config(text=f"文件: {self.file_source.describe()}")
+        self.stats.invalidate()
+        self.load_btn.config(text='退出文件模式')
+    
+    def _exit_file_mode(self):
+        """退出文件模式并恢复可编辑的输入框"""
+        self.file_source = None
+        self.text_area.config(state=tk.NORMAL)
+        self.text_area.delete('1.0', 'end')
+        self.load_btn.config(text='载入文件')
+        self._update_text_stats()
+    
+    def toggle_data_source(self):
+        """进入或退出数据模式; 数据模式下输入框的内容作为模板, 每行数据填充一次"""
+        if self.data_source is not None:
+            self._exit_data_mode()
+            return
         
+        file_path = filedialog.askopenfilename(
+            filetypes=[('数据文件', '*.csv *.jsonl *.ndjson'), ('所有文件', '*.*')],
+            title='选择CSV或JSONL数据文件'
+        )
+        if not file_path:
+            return
         try:
-            # 开始延迟倒计时
-            for i in range(int(delay), 0, -1):
-                if self.stop_event.is_set():
-                    break
-                time.sleep(1)
-            
-            if self.stop_event.is_set():
-                return
-            
-            # 开始输入
-            for rep in range(repetitions):
-                if self.stop_event.is_set():
-                    break
-                
-                for char in text_content:
-                    if self.stop_event.is_set():
-                        break
-                    
-                    if char == '\n':
-                        handle_newline()
-                    else:
-                        keyboard.type(char)
-                    
-                    # 更新进度
-                    self.window.after(0, lambda: self.progress.step(1))
-                    time.sleep(interval)
-                
-                if self.stop_event.is_set():
-                    break
-                
-                # 记录执行结果
-                self.execution_count += 1
-                timestamp = time.strftime('%H:%M:%S')
-                record = f"[{timestamp}] 第{self.execution_count}次执行完成"
-                self.records.append(record)
-                self.window.after(0, self._add_record, record)
-                
+            self._enter_data_mode(file_path)
         except Exception as e:
-            self.window.after(0, lambda: messagebox.showerror("错误", f"执行过程中发生错误: {str(e)}"))
-        finally:
-            # 清理工作
-            if self.clear_text_var.get():
-                self.window.after(0, lambda: self.text_area.delete('1.0', 'end'))
-            
-            self.window.after(0, self._set_ui_state, False)
+            messagebox.showerror("载入失败", f"无法读取数据文件:\n{str(e)}")
+    
+    def _enter_data_mode(self, file_path):
+        """以 file_path 进入数据模式, 读取失败时抛出异常"""
+        from keyboard_engine.templating import TemplateSource
+        data_source = TemplateSource('', file_path)
+        
+        if self.file_source is not None:
+            self._exit_file_mode()
+        self.data_source = data_source
+        self.data_btn.config(text='退出数据模式')
+        self._add_records([f"[{time.strftime('%H:%M:%S')}] 已载入数据: {data_source.describe()}, "
+                           "输入框中的内容作为模板, 可用 {row.字段}、{i}、{timestamp}"])
+    
+    def _exit_data_mode(self):
+        """退出数据模式, 输入框恢复为普通文本"""
+        self.data_source = None
+        self.data_btn.config(text='载入数据')
+    
+    def _create_worker(self, use_async):
+        """创建执行任务的工作者
+        
+        协程引擎在界面线程中由 TkLoopPump 推进的事件循环里执行任务, 不占用额外的线程;
+        循环只在引擎等待的下一个节拍到期时才被推进。共用键盘的任务按队列依次执行,
+        各自输出到文件的任务同时执行。
+        """
+        if not use_async:
+            return EngineWorker(self._cached_backend, self.stop_event)
+        from keyboard_engine.async_engine import AsyncEngineWorker, TkLoopPump
+        if self.loop_pump is None:
+            self.loop_pump = TkLoopPump(self.window)
+        worker = AsyncEngineWorker(self._cached_backend, self.loop_pump.loop,
+                                   wake=self.loop_pump.wake,
+                                   poll_interval=self.ui_budget.frame_interval)
+        self.loop_pump.next_wake = worker.next_wake
+        return worker
+    
+    def _toggle_async_engine(self):
+        """切换线程引擎和协程引擎, 只能在没有任务时切换"""
+        use_async = self.async_engine_var.get()
+        if self.worker.busy:
+            self.async_engine_var.set(not use_async)
+            messagebox.showinfo("协程引擎", "请在全部任务结束后再切换引擎。")
+            return
+        self.worker.shutdown()
+        self.worker = self._create_worker(use_async)
+        self._add_records([f"[{time.strftime('%H:%M:%S')}] 已切换到"
+                           f"{'协程引擎' if use_async else '线程引擎'}"])
+    
+    def _cached_backend(self, name):
+        """工作线程按名称创建共用的后端, 系统键盘的粘贴模式使用界面的剪贴板"""
+        backend = create_backend(name)
+        backend.set_clipboard(self.clipboard)
+        return backend
+    
+    def _wake_clipboard(self):
+        """工作线程有剪贴板请求时通知界面线程处理"""
+        try:
+            self.window.event_generate('<<ClipboardRequest>>', when='tail')
+        except (RuntimeError, tk.TclError):
+            # 没有线程支持的Tcl或窗口正在关闭: 由下一帧的事件通道刷新处理
+            pass
+    
+    def _create_backend(self):
+        """按界面选择键盘后端, 返回 (任务独占的后端, 共用后端的名称), 取消或失败时返回None
+        
+        系统键盘和空跑后端由工作线程按名称缓存; 输出到文件时每个任务各写一个文件。
+        """
+        name = BACKEND_OPTIONS[self.backend_var.get()]
+        if name != "file":
+            return None, name
+        
+        file_path = filedialog.asksaveasfilename(
+            defaultextension='.txt',
+            filetypes=[('文本文件', '*.txt'), ('所有文件', '*.*')],
+            title='选择输出文件'
+        )
+        if not file_path:
+            return None
+        try:
+            return create_backend(name, target=file_path), None
+        except Exception as e:
+            messagebox.showerror("后端错误", f"无法创建键盘后端:\n{str(e)}")
+            return None
     
     def stop_simulation(self):
-        """停止模拟"""
-        self.stop_event.set()
+        """停止模拟; 等工作线程确认不再发送按键之后才提示已停止"""
+        message = "模拟输入任务已终止。"
+        if self.worker.busy:
+            # 停止正在执行的任务并清空队列
+            running = self.worker.current is not None
+            self.worker.cancel_all()
+            self.worker.wait_idle(1.0)
+            engine = self.worker.engine
+            if running and engine.stop_latency is not None:
+                message += f"\n停止延迟: {engine.stop_latency * 1000:.2f}ms"
+                message += f"\n停止位置: {engine.describe_checkpoint()}"
         self._set_ui_state(False)
-        messagebox.showinfo("已停止", "模拟输入任务已终止。")
+        self._refresh_queue()
+        messagebox.showinfo("已停止", message)
+    
+    def toggle_pause(self):
+        """暂停或继续当前任务, 继续时从暂停的字符位置接着输入"""
+        if self.worker.current is None:
+            return
+        if self.worker.engine.paused:
+            self.worker.resume()
+            self.pause_btn.config(text='暂停 (F7)')
+            self._add_records([f"[{time.strftime('%H:%M:%S')}] 继续执行"])
+        else:
+            # 工作线程停在暂停点时会把精确位置写入执行记录
+            self.worker.pause()
+            self.pause_btn.config(text='继续 (F7)')
     
     def _set_ui_state(self, running):
         """设置UI状态"""
-        state = tk.DISABLED if running else tk.NORMAL
-        self.start_btn.config(state=state)
+        # 运行中仍可继续添加任务, 新任务排在队尾
         self.stop_btn.config(state=tk.NORMAL if running else tk.DISABLED)
+        self.pause_btn.config(state=tk.NORMAL if running else tk.DISABLED)
         
         if not running:
+            self.pause_btn.config(text='暂停 (F7)')
             self.progress['value'] = 0
     
-    def _add_record(self, record):
-        """添加记录到记录区域"""
-        self.records_area.config(state=tk.NORMAL)
-        self.records_area.insert('end', record + '\n')
-        self.records_area.see('end')
-        self.records_area.config(state=tk.DISABLED)
+    def _start_channel_pump(self):
+        """启动事件通道的定时刷新"""
+        if self.channel_pump_id is None:
+            # 低开销运行或最小化时降低刷新频率
+            self.channel_pump_id = self.window.after(int(self.ui_budget.frame_interval * 1000),
+                                                     self._pump_channel)
+    
+    def _pump_channel(self):
+        """每帧取出一次各任务的聚合事件并应用到界面"""
+        self.channel_pump_id = None
+        self.clipboard.service()
+        
+        current = self.worker.current
+        if current is not None and current is not self.progress_job:
+            # 工作线程开始了下一个任务, 进度条切换到该任务
+            self.progress_job = current
+            self.telemetry = current.telemetry
+            self.progress['maximum'] = current.repetitions * current.total_units
+            self.progress['value'] = 0
+            self.pause_btn.config(text='继续 (F7)' if self.worker.engine.paused else '暂停 (F7)')
+            self._refresh_queue()
+        
+        job = self.progress_job
+        for active in list(self.active_jobs):
+            update = active.channel.drain()
+            if update is None:
+                continue
+            if update.progress and active is job:
+                self.progress['value'] = self.progress['value'] + update.progress
+            self.execution_count += update.executions
+            if update.records:
+                self._add_records(update.records)
+            for message in update.errors:
+                messagebox.showerror("错误", message)
+            if update.finished:
+                self.active_jobs.remove(active)
+        
+        if job is not None and not self.ui_budget.reduced:
+            self._update_run_labels(job)
+        
+        if not self.active_jobs:
+            # 队列中的任务全部结束后的清理, 恢复完整刷新并记录界面线程的开销
+            if job is not None:
+                self._update_run_labels(job)
+            self.ui_budget.end_run()
+            self._apply_ui_budget()
+            self._add_records([f"[{time.strftime('%H:%M:%S')}] {self.ui_budget.summary()}"])
+            if self.clear_text_var.get():
+                if self.file_source is not None:
+                    self._exit_file_mode()
+                elif self.large_document is not None:
+                    self._exit_large_mode()
+                else:
+                    self.text_area.delete('1.0', 'end')
+            self.progress_job = None
+            self._set_ui_state(False)
+            self._refresh_queue()
+            return
+        self._start_channel_pump()
+    
+    def _update_run_labels(self, job):
+        """刷新遥测和事件通道统计标签"""
+        self.telemetry_stats.config(text=self.telemetry.summary(
+            self.progress['value'], self.progress['maximum']))
+        self.channel_stats.config(text=job.channel.stats_text())
+    
+    def _add_records(self, records):
+        """批量添加记录, 整批只重绘一次可见窗口; 低开销运行时推迟到运行结束"""
+        self.records.extend(records)
+        if self.records_view is not None and not self.ui_budget.reduced:
+            self.records_view.render()
     
     def save_records(self):
         """保存记录到文件"""
@@ -524,12 +1522,30 @@ class TechKeyboardSimulator:
         
         if file_path:
             try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write('\n'.join(self.records))
+                self.records.save(file_path)
                 messagebox.showinfo("保存成功", f"记录已保存到:\n{file_path}")
             except Exception as e:
                 messagebox.showerror("保存失败", f"保存文件时出错:\n{str(e)}")
     
+    def save_telemetry(self):
+        """导出上一次运行的遥测数据, 按扩展名选择JSON或CSV"""
+        if self.telemetry is None or not self.telemetry.latency.count:
+            messagebox.showwarning("无遥测", "当前没有可导出的遥测数据。")
+            return
+        
+        file_path = filedialog.asksaveasfilename(
+            defaultextension='.json',
+            filetypes=[('JSON文件', '*.json'), ('CSV文件', '*.csv'), ('所有文件', '*.*')],
+            title='导出运行遥测'
+        )
+        
+        if file_path:
+            try:
+                self.telemetry.export(file_path)
+                messagebox.showinfo("导出成功", f"遥测已导出到:\n{file_path}")
+            except Exception as e:
+                messagebox.showerror("导出失败", f"导出文件时出错:\n{str(e)}")
+    
     def __del__(self):
         """析构函数，确保动画停止"""
         self._stop_title_animation()
@@ -537,7 +1553,9 @@ class TechKeyboardSimulator:
 def main():
     """主函数"""
     window = tk.Tk()
+    startup.timer.mark('window')
     app = TechKeyboardSimulator(window)
+    startup.timer.mark('interface')
     
     # 窗口居中显示
     window.update_idletasks()
@@ -546,6 +1564,8 @@ def main():
     x = (window.winfo_screenwidth() // 2) - (width // 2)
     y = (window.winfo_screenheight() // 2) - (height // 2)
     window.geometry(f'+{x}+{y}')
+    # 进入事件循环后的第一个空闲时刻即第一帧, 之后再构建参数和记录面板
+    window.after_idle(app.finish_startup)
     
     try:
         window.mainloop()
@@ -554,6 +1574,10 @@ def main():
     finally:
         # 确保动画停止
         app._stop_title_animation()
+        app.worker.shutdown()
+        if app.loop_pump is not None:
+            app.loop_pump.close()
+        app.records.close()
 
 if __name__ == "__main__":
     main()
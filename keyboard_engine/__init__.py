@@ -0,0 +1,5 @@
+"""ikun牌键盘自动化工具的输入引擎
+
+Tk桌面版与Kivy移动版共用的非界面逻辑。各子模块按需导入, 包本身不预先
+加载任何子模块。
+"""
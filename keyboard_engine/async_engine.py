@@ -0,0 +1,458 @@
+"""基于 asyncio 的输入引擎
+
+TypingEngine 的回放逻辑是产生截止时间的生成器, 线程版在每个截止时间处阻塞等待。
+这里用同一套生成器, 只把等待换成事件循环上的定时器: 许多输出流可以在同一个循环、
+同一个线程中同时按各自的节奏输入, 不需要为每个流创建线程。
+
+事件循环可以由界面驱动: Kivy 以 async_run() 运行在 asyncio 循环中, Tk 则由
+TkLoopPump 在 after 回调中推进循环。引擎和 AsyncEngineWorker 的所有方法都只能
+在事件循环所在的线程调用。定时器的精度取决于事件循环 (通常约1ms), 不做忙等,
+以免一个流占满CPU影响其他流; 需要亚毫秒精度的单个流仍可使用线程版引擎。
+"""
+import asyncio
+import math
+import time
+
+from .engine import TypingEngine
+from .timing import DeadlineScheduler
+from .ui_channel import FRAME_INTERVAL
+from .worker import EngineWorker
+
+
+async def drive(steps, wait):
+    """timing.drive 的协程版本, wait 返回可等待对象"""
+    try:
+        deadline = next(steps)
+        while True:
+            deadline = steps.send(await wait(deadline))
+    except StopIteration as e:
+        return e.value
+    finally:
+        steps.close()
+
+
+def _current_task():
+    try:
+        return asyncio.current_task()
+    except RuntimeError:
+        # 不在事件循环中
+        return None
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class AsyncPauseGate:
+    """协程版的暂停开关; 暂停和继续会立即唤醒正在进行的等待"""
+
+    def __init__(self):
+        self._paused = False
+        self._waiters = []
+        self.on_hold = None
+
+    @property
+    def paused(self):
+        return self._paused
+
+    def pause(self):
+        self._paused = True
+        self._wake_all()
+
+    def resume(self):
+        self._paused = False
+        self._wake_all()
+
+    def interrupt(self):
+        self.resume()
+
+    def _wake_all(self):
+        waiters, self._waiters = self._waiters, []
+        for future in waiters:
+            _wake(future)
+
+    async def wait(self, timeout):
+        """等待至多 timeout 秒, 暂停或继续时提前返回"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        handle = loop.call_later(timeout, _wake, future)
+        self._waiters.append(future)
+        try:
+            await future
+        finally:
+            handle.cancel()
+
+    async def hold(self, clock=time.perf_counter):
+        """暂停期间等待, 返回等待的秒数"""
+        start = clock()
+        on_hold = self.on_hold
+        if on_hold is not None:
+            on_hold()
+        while self._paused:
+            future = asyncio.get_running_loop().create_future()
+            self._waiters.append(future)
+            await future
+        return clock() - start
+
+
+class AsyncDeadlineScheduler(DeadlineScheduler):
+    """DeadlineScheduler 的协程版本: 截止时间和统计由父类计算, 只有等待在事件循环中进行
+
+    wait、tick、countdown 等需要等待的方法返回协程。wake_at 为正在等待的截止时间,
+    供 AsyncEngineWorker.next_wake 安排下一次推进事件循环的时刻。
+    """
+
+    def __init__(self, interval, stop_event=None, clock=time.perf_counter, max_lag=None,
+                 gate=None):
+        super().__init__(interval, stop_event, clock, spin_threshold=0.0, max_lag=max_lag,
+                         gate=gate)
+        self.wake_at = None
+
+    async def hold(self):
+        held = await self.gate.hold(self.clock)
+        self.paused_time += held
+        if self.deadline is not None:
+            self.deadline += held
+        return held
+
+    async def sleep_until(self, deadline):
+        gate = self.gate
+        while True:
+            if self.stopped():
+                return False
+            if gate is not None and gate.paused:
+                deadline += await self.hold()
+                continue
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return True
+            # 定时器到期后、任务恢复之前仍保留, 此时 next_wake 为0
+            self.wake_at = deadline
+            try:
+                if gate is not None:
+                    await gate.wait(remaining)
+                else:
+                    await asyncio.sleep(remaining)
+            finally:
+                self.wake_at = None
+
+    async def wait(self, deadline):
+        if deadline is None:
+            # 落后时也让出一次, 其他流不会被一个追赶中的流饿死
+            await asyncio.sleep(0)
+            return not self.stopped()
+        return await self.sleep_until(deadline)
+
+    def countdown(self, delay, on_second=None):
+        return drive(self.countdown_steps(delay, on_second), self.wait)
+
+
+class AsyncTypingEngine(TypingEngine):
+    """在事件循环中回放按键计划的引擎
+
+    回放逻辑与 TypingEngine 相同, 参数和返回的统计也相同, 但 run、run_segments
+    和 run_reporting 返回协程。停止通过取消执行回放的协程任务实现: 取消在当前
+    等待处立即生效, 回放不轮询停止信号; 被取消的运行在当前位置结束, 照常收尾
+    (恢复剪贴板、关闭独占后端) 并返回 stopped 为真、带停止延迟的统计, 不再向外
+    抛出 CancelledError。
+    """
+
+    def __init__(self, backend, stop_event=None):
+        super().__init__(backend, stop_event)
+        self.gate = AsyncPauseGate()
+        # 正在执行回放的协程任务
+        self._task = None
+
+    def stop(self):
+        """取消正在执行回放的任务; 还没开始时运行在开始处结束"""
+        first = not self.stop_event.is_set()
+        super().stop()
+        task = self._task
+        # 在回放任务自身中 (例如后端回调) 停止时, 下一次等待前就会看到停止信号
+        if first and task is not None and task is not _current_task():
+            task.cancel()
+
+    def _new_scheduler(self, interval):
+        return AsyncDeadlineScheduler(interval, self.stop_event, gate=self.gate)
+
+    async def _drive(self, steps):
+        self._task = asyncio.current_task()
+        try:
+            deadline = next(steps)
+            while True:
+                try:
+                    result = await self._scheduler.wait(deadline)
+                except asyncio.CancelledError:
+                    # 取消即为停止: 生成器收到False后在当前位置结束并照常收尾
+                    self._cancelled()
+                    result = False
+                deadline = steps.send(result)
+        except StopIteration as e:
+            return e.value
+        finally:
+            self._task = None
+            steps.close()
+
+    def _cancelled(self):
+        if self.stop_requested is None:
+            # 不是经 stop() 的取消 (例如关闭事件循环), 从此刻计算停止延迟
+            self.stop_requested = self.clock()
+        self.stop_event.set()
+        uncancel = getattr(self._task, 'uncancel', None)
+        if uncancel is not None:
+            # 取消已被处理, 之后的等待 (收尾、写日志) 不再受它影响
+            uncancel()
+
+
+class AsyncEngineWorker(EngineWorker):
+    """在事件循环中执行任务队列的 EngineWorker
+
+    每个任务是事件循环中的一个协程任务, 各自使用一个 AsyncTypingEngine。共用同一个
+    缓存后端 (backend_key 相同) 的任务按队列顺序依次执行, 独占后端的任务 (例如各自
+    输出到一个文件) 彼此同时执行: 许多输入流共用界面线程, 不需要各自的线程。取消
+    正在执行的任务即取消它的协程任务 (见 AsyncTypingEngine.stop)。
+
+    续打日志只能记录一次运行, 同时执行的任务中只有先开始的一个写日志, 其余的照常
+    输入, 执行记录中说明没有写日志。日志的开始和结束要落盘等待, 放到事件循环的默认
+    线程池中执行, 不阻塞界面线程; 这是协程引擎唯一用到的线程, 与输入流的数量无关。
+
+    engine 为最近开始的任务的引擎, current 为最早开始且仍在执行的任务; pause() 和
+    resume() 作用于所有正在执行的任务。所有方法都只能在事件循环所在的线程调用。
+    loop 为None时使用第一次 submit() 时正在运行的事件循环 (Kivy 的 async_run)。
+    wake 在提交、取消、暂停或继续之后调用, 例如让 TkLoopPump 立即推进循环;
+    poll_interval 为无法预知何时需要推进循环时 (等待线程池) next_wake 返回的秒数。
+    """
+
+    def __init__(self, backend_factory, loop=None, wake=None, poll_interval=FRAME_INTERVAL):
+        super().__init__(backend_factory)
+        self.engine = AsyncTypingEngine(None)
+        self.loop = loop
+        self.wake = wake
+        self.poll_interval = poll_interval
+        # 正在执行的任务和执行它们的协程任务, 按开始的先后顺序
+        self._running = {}
+        self._tasks = {}
+        # 正在线程池中写续打日志的任务数
+        self._offloaded = 0
+
+    def _key(self, job):
+        """任务占用的后端: 缓存后端按名称, 独占后端按任务"""
+        return ('shared', job.backend_key) if job.backend is None else ('own', job.id)
+
+    def _ensure_running(self):
+        self._dispatch()
+
+    def _dispatch(self):
+        """按队列顺序启动所有后端空闲的等待任务; 调用方需持有锁"""
+        if self._closed:
+            return
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+        busy = {self._key(job) for job in self._running.values()}
+        for job in list(self._jobs):
+            key = self._key(job)
+            if key in busy:
+                continue
+            busy.add(key)
+            self._jobs.remove(job)
+            job.state = 'running'
+            job.engine = self.engine = AsyncTypingEngine(None)
+            job.engine.reset(job.start)
+            self._running[job.id] = job
+            self._tasks[job.id] = self.loop.create_task(self._execute(job))
+        self.current = next(iter(self._running.values()), None)
+
+    def _wake_loop(self):
+        if self.wake is not None:
+            self.wake()
+
+    def submit(self, job):
+        super().submit(job)
+        self._wake_loop()
+        return job
+
+    def cancel(self, job_id):
+        with self._cond:
+            job = self._running.get(job_id)
+            if job is not None:
+                job.state = 'cancelled'
+                job.engine.stop()
+                found = True
+            else:
+                found = self._cancel_pending(job_id)
+        self._wake_loop()
+        return found
+
+    def cancel_all(self):
+        with self._cond:
+            while self._jobs:
+                self._drop(self._jobs.popleft())
+            for job in self._running.values():
+                job.state = 'cancelled'
+                job.engine.stop()
+        self._wake_loop()
+
+    def pause(self):
+        for job in self._running.values():
+            job.engine.pause()
+        self._wake_loop()
+
+    def resume(self):
+        for job in self._running.values():
+            job.engine.resume()
+        self._wake_loop()
+
+    def next_wake(self):
+        """距离下一次需要推进事件循环的秒数, 供 TkLoopPump 安排唤醒
+
+        为各任务正在等待的节拍中最早的截止时间; 没有任务或全部暂停时为None,
+        之后的操作会调用 wake。
+        """
+        if not self._running:
+            return None
+        if self._offloaded:
+            return self.poll_interval
+        wake = None
+        for job in self._running.values():
+            engine = job.engine
+            scheduler = engine._scheduler
+            wake_at = getattr(scheduler, 'wake_at', None)
+            if wake_at is not None:
+                delay = max(0.0, wake_at - scheduler.clock())
+            elif engine.paused:
+                continue
+            else:
+                # 任务已就绪, 还没有开始等待
+                return 0.0
+            if wake is None or delay < wake:
+                wake = delay
+        return wake
+
+    async def idle(self, timeout=None):
+        """等待队列清空且没有任务在执行; 返回是否已空闲"""
+        loop = asyncio.get_running_loop()
+        end = None if timeout is None else loop.time() + timeout
+        while self._running:
+            remaining = None if end is None else end - loop.time()
+            if remaining is not None and remaining <= 0:
+                break
+            tasks = list(self._tasks.values())
+            await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        return not self.busy
+
+    def wait_idle(self, timeout=None):
+        """在事件循环之外就地推进循环, 直到空闲或超时; 返回是否已空闲
+
+        循环正在运行时 (例如在 Kivy 的 async_run 中) 无法阻塞等待, 请改用 await idle()。
+        """
+        if not self._running:
+            return not self.busy
+        if self.loop.is_running():
+            raise RuntimeError('事件循环正在运行, 请使用 await idle()')
+        return self.loop.run_until_complete(self.idle(timeout))
+
+    def shutdown(self, timeout=1.0):
+        with self._cond:
+            self._closed = True
+        self.cancel_all()
+        if self._running and self.loop.is_running():
+            # 无法在运行中的循环里等待, 任务全部结束后再关闭后端
+            tasks = list(self._tasks.values())
+            done = asyncio.gather(*tasks, return_exceptions=True)
+            done.add_done_callback(lambda future: self._close_backends())
+            return
+        self.wait_idle(timeout)
+        self._close_backends()
+
+    async def _offload(self, job, function, *args):
+        """在线程池中执行会落盘等待的调用
+
+        线程中的调用无法中断: 等待期间任务被取消时按停止处理, 仍等调用完成,
+        续打日志不会停在开始了一半或没有关闭的状态。
+        """
+        self._offloaded += 1
+        try:
+            future = self.loop.run_in_executor(None, function, *args)
+            while True:
+                try:
+                    return await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    job.engine.stop()
+        finally:
+            self._offloaded -= 1
+
+    async def _execute(self, job):
+        try:
+            if self._attach_backend(job):
+                journal = None
+                if job.journal is not None:
+                    journal = await self._offload(job, self._start_journal, job)
+                try:
+                    job.result = await self._run(job)
+                finally:
+                    if journal is not None:
+                        await self._offload(job, journal.stop, job.result)
+        finally:
+            self._finish(job)
+
+    def _finish(self, job):
+        with self._cond:
+            if job.result is not None:
+                self.executions += job.result['completed']
+            if job.state == 'running':
+                job.state = 'done'
+            self._running.pop(job.id, None)
+            self._tasks.pop(job.id, None)
+            self.current = next(iter(self._running.values()), None)
+            self._dispatch()
+            self._cond.notify_all()
+
+
+class TkLoopPump:
+    """用 Tk 的 after 回调推进 asyncio 事件循环
+
+    每次推进执行循环中已就绪的回调和到期的定时器, 然后把控制交还 Tk。下一次推进
+    的时刻由 next_wake 给出 (通常是引擎正在等待的节拍截止时间), 每个节拍只唤醒
+    一次界面线程; next_wake 返回None或循环中没有任务时停止推进, 直到下一次 wake()。
+    没有 next_wake 时有任务就每 poll_interval 秒推进一次。
+    """
+
+    def __init__(self, widget, loop=None, next_wake=None, poll_interval=FRAME_INTERVAL):
+        self.widget = widget
+        self.loop = loop if loop is not None else asyncio.new_event_loop()
+        self.next_wake = next_wake
+        self.poll_interval = poll_interval
+        self._after_id = None
+
+    def wake(self):
+        """循环中有新的工作时调用, 立即推进一次"""
+        self._schedule(0)
+
+    def _schedule(self, delay):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+        # 向上取整到毫秒, 避免在截止时间前醒来后再空转一次
+        self._after_id = self.widget.after(int(math.ceil(delay * 1000)), self._pump)
+
+    def _pump(self):
+        self._after_id = None
+        loop = self.loop
+        loop.call_soon(loop.stop)
+        loop.run_forever()
+        if not asyncio.all_tasks(loop):
+            return
+        delay = self.next_wake() if self.next_wake is not None else self.poll_interval
+        if delay is not None:
+            self._schedule(delay)
+
+    def close(self):
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        loop = self.loop
+        # 让被取消的任务处理完取消, 再关闭循环
+        tasks = asyncio.all_tasks(loop)
+        if tasks:
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        loop.close()
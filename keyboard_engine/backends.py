@@ -0,0 +1,371 @@
+"""可插拔的键盘后端
+
+后端只负责把动作真正发送出去。键名统一使用 keystroke_plan 中的小写字符串
+(enter、tab、shift等), 由各后端在回放前通过 resolve_key 转换为自己的按键对象。
+"""
+import os
+import sys
+import threading
+
+from .clipboard import ClipboardPaster
+from .key_translation import KeyTranslator, unicode_sender
+
+# 特殊键在文本输出中的对应字符, 没有对应字符的键在文本类后端中被忽略
+KEY_TEXT = {
+    'enter': '\n',
+    'tab': '\t',
+    'space': ' ',
+}
+
+
+def key_text(key):
+    """单击键在文本输出中的对应字符; 宏中的单个字符键 (如 {a}) 输出该字符本身"""
+    text = KEY_TEXT.get(key)
+    if text is None and len(key) == 1:
+        return key
+    return text or ''
+
+
+def combo_text(modifiers, key):
+    """组合键在文本输出中的对应字符; 只有Shift+回车仍视为换行"""
+    if key == 'enter' and tuple(modifiers) in ((), ('shift',)):
+        return '\n'
+    return ''
+
+
+class KeyboardBackend:
+    """键盘后端接口"""
+
+    name = 'base'
+
+    # 字符翻译缓存 (key_translation.KeyTranslator), 没有时为None; 遥测显示其命中率
+    translator = None
+
+    # 剪贴板粘贴 (clipboard.ClipboardPaster), 没有设置剪贴板时为None
+    paster = None
+
+    def resolve_key(self, name):
+        """把键名转换为后端自己的按键对象, 每次运行前只调用一次"""
+        return name
+
+    def prepare(self, plan):
+        """回放计划之前调用一次, 可用于预热缓存"""
+
+    def type_text(self, text):
+        """输入一段普通文本"""
+        raise NotImplementedError
+
+    def paste(self, text):
+        """经剪贴板粘贴一块文本, 默认直接输入"""
+        self.type_text(text)
+
+    def set_clipboard(self, clipboard):
+        """设置粘贴模式使用的剪贴板提供者, 默认忽略"""
+
+    def tap(self, key):
+        """单击一个特殊键"""
+        raise NotImplementedError
+
+    def combo(self, modifiers, key):
+        """按住修饰键后单击一个键, 默认只单击主键"""
+        self.tap(key)
+
+    def finish(self):
+        """一次运行结束 (包括停止和出错) 后调用"""
+
+    def close(self):
+        """释放后端占用的资源"""
+
+
+class PynputBackend(KeyboardBackend):
+    """通过pynput向当前焦点窗口发送真实按键"""
+
+    name = 'pynput'
+
+    def __init__(self):
+        from pynput.keyboard import Controller, Key, KeyCode
+        self._controller = Controller()
+        self._keys = Key
+        self._key_code = KeyCode
+        # 与 Controller.type() 相同的控制字符映射
+        self._control = {'\n': Key.enter, '\r': Key.enter, '\t': Key.tab}
+        # 平台支持时连续的非ASCII字符整段一次发送
+        self.translator = KeyTranslator(self._translate, send_unicode=unicode_sender())
+
+    def _translate(self, char):
+        """字符对应的事件序列: ((按键, 是否按下), ...)"""
+        key = self._control.get(char)
+        if key is None:
+            key = self._key_code.from_char(char)
+        return ((key, True), (key, False))
+
+    def resolve_key(self, name):
+        # 单个字符直接交给pynput, 其余按特殊键名称查找
+        if len(name) == 1:
+            return name
+        return getattr(self._keys, name)
+
+    def prepare(self, plan):
+        self.translator.warm(plan.characters())
+
+    def _play(self, events):
+        controller = self._controller
+        for key, pressed in events:
+            if pressed:
+                controller.press(key)
+            else:
+                controller.release(key)
+
+    def type_text(self, text):
+        self.translator.type_text(text, self._play)
+
+    def set_clipboard(self, clipboard):
+        self.paster = ClipboardPaster(clipboard, self._send_paste, self.type_text)
+
+    def _send_paste(self):
+        # macOS 用Command+V, 其他平台用Ctrl+V
+        modifier = self._keys.cmd if sys.platform == 'darwin' else self._keys.ctrl
+        self.combo((modifier,), 'v')
+
+    def paste(self, text):
+        if self.paster is None:
+            self.type_text(text)
+        else:
+            self.paster.paste(text)
+
+    def finish(self):
+        if self.paster is not None:
+            self.paster.restore()
+
+    def tap(self, key):
+        self._controller.tap(key)
+
+    def combo(self, modifiers, key):
+        controller = self._controller
+        for modifier in modifiers:
+            controller.press(modifier)
+        try:
+            controller.tap(key)
+        finally:
+            for modifier in reversed(modifiers):
+                controller.release(modifier)
+
+
+class NullBackend(KeyboardBackend):
+    """不产生任何输出, 只计数; 用于单独测量引擎自身的开销"""
+
+    name = 'null'
+
+    def __init__(self):
+        self.chars = 0
+        self.calls = 0
+
+    def type_text(self, text):
+        self.calls += 1
+        self.chars += len(text)
+
+    def tap(self, key):
+        self.calls += 1
+
+    def combo(self, modifiers, key):
+        self.calls += 1
+
+
+class RecordingBackend(NullBackend):
+    """按顺序记录所有动作, 便于比对引擎的输出"""
+
+    name = 'recording'
+
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def type_text(self, text):
+        super().type_text(text)
+        self.events.append(('text', text))
+
+    def tap(self, key):
+        super().tap(key)
+        self.events.append(('tap', key))
+
+    def combo(self, modifiers, key):
+        super().combo(modifiers, key)
+        self.events.append(('combo', tuple(modifiers), key))
+
+    def text(self):
+        """按文本类后端的规则把记录还原为输出文本"""
+        parts = []
+        for event in self.events:
+            if event[0] == 'text':
+                parts.append(event[1])
+            elif event[0] == 'tap':
+                parts.append(key_text(event[1]))
+            else:
+                parts.append(combo_text(event[1], event[2]))
+        return ''.join(parts)
+
+
+class StreamSinkBackend(KeyboardBackend):
+    """把输出写入文件、管道或标准输出
+
+    target 可以是路径 ('-' 表示标准输出) 或已打开的文本流。单击键按 key_text
+    转换为字符, 组合键中只有Shift+回车输出换行。
+    """
+
+    name = 'file'
+
+    def __init__(self, target='-', encoding='utf-8', flush=False):
+        if hasattr(target, 'write'):
+            self._stream = target
+            self._owns_stream = False
+        elif target == '-':
+            self._stream = sys.stdout
+            self._owns_stream = False
+        else:
+            self._stream = open(target, 'w', encoding=encoding, newline='')
+            self._owns_stream = True
+        # 写管道时每次写入后立即刷新, 让下游按节奏收到输出
+        self._flush = flush
+
+    def type_text(self, text):
+        self._stream.write(text)
+        if self._flush:
+            self._stream.flush()
+
+    def tap(self, key):
+        text = key_text(key)
+        if text:
+            self.type_text(text)
+
+    def combo(self, modifiers, key):
+        text = combo_text(modifiers, key)
+        if text:
+            self.type_text(text)
+
+    def close(self):
+        if self._owns_stream:
+            self._stream.close()
+        else:
+            self._stream.flush()
+
+
+class PtyBackend(KeyboardBackend):
+    """在伪终端中运行一个子进程, 把输入写入它的终端 (仅限类Unix系统)
+
+    command 为参数列表。回车按真实终端发送 \\r, Ctrl+字母发送对应的控制字符。
+    子进程的输出由后台线程持续读出 (避免子进程写满缓冲区后阻塞), 指定 log 时
+    写入该路径。close() 发送 EOF 并等待子进程退出, 超时后结束它。
+    """
+
+    name = 'pty'
+
+    KEYS = {
+        'enter': '\r',
+        'tab': '\t',
+        'space': ' ',
+        'backspace': '\x7f',
+        'esc': '\x1b',
+    }
+
+    def __init__(self, command, log=None, encoding='utf-8', timeout=1.0):
+        if not hasattr(os, 'openpty'):
+            raise ValueError('伪终端只在类Unix系统上可用')
+        import subprocess
+        master, slave = os.openpty()
+        try:
+            self._process = subprocess.Popen(command, stdin=slave, stdout=slave, stderr=slave,
+                                             close_fds=True, start_new_session=True)
+        except OSError:
+            os.close(master)
+            raise
+        finally:
+            os.close(slave)
+        self._master = master
+        self._encoding = encoding
+        self._timeout = timeout
+        self._log = open(log, 'wb') if log else None
+        # 从终端读到的子进程输出字节数
+        self.received = 0
+        self._reader = threading.Thread(target=self._drain, name='pty-reader', daemon=True)
+        self._reader.start()
+
+    def _drain(self):
+        while True:
+            try:
+                data = os.read(self._master, 65536)
+            except OSError:
+                # 子进程退出后读取伪终端得到 EIO
+                return
+            if not data:
+                return
+            self.received += len(data)
+            if self._log is not None:
+                self._log.write(data)
+
+    def type_text(self, text):
+        data = text.encode(self._encoding)
+        while data:
+            written = os.write(self._master, data)
+            data = data[written:]
+
+    def tap(self, key):
+        text = self.KEYS.get(key)
+        if text is None and len(key) == 1:
+            text = key
+        if text:
+            self.type_text(text)
+
+    def combo(self, modifiers, key):
+        if tuple(modifiers) == ('ctrl',) and len(key) == 1 and key.isalpha():
+            self.type_text(chr(ord(key.lower()) - 96))
+        elif key == 'enter' or not modifiers:
+            self.tap(key)
+
+    @property
+    def returncode(self):
+        return self._process.poll()
+
+    def close(self):
+        import subprocess
+        process = self._process
+        if process.poll() is None:
+            try:
+                # 在行首发送EOF, 让 cat、shell 等读标准输入的程序正常结束
+                self.type_text('\r\x04')
+                process.wait(self._timeout)
+            except (OSError, subprocess.TimeoutExpired):
+                process.terminate()
+                try:
+                    process.wait(self._timeout)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+                    process.wait()
+        self._reader.join(self._timeout)
+        os.close(self._master)
+        if self._log is not None:
+            self._log.close()
+
+
+# 名称到后端类的映射, 供命令行和界面选择
+BACKENDS = {
+    'pynput': PynputBackend,
+    'null': NullBackend,
+    'recording': RecordingBackend,
+    'file': StreamSinkBackend,
+    'pty': PtyBackend,
+}
+
+
+def create_backend(name, **options):
+    """按名称创建后端"""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"未知的键盘后端: {name}") from None
+    return backend_class(**options)
+
+
+def pynput_available():
+    """当前环境是否安装了pynput (只查找, 不导入)"""
+    import importlib.util
+    return importlib.util.find_spec('pynput') is not None
@@ -0,0 +1,328 @@
+"""无界面的批量运行入口
+
+示例:
+    python -m keyboard_engine script.txt --interval 0.01 --repetitions 5
+    cat script.txt | python -m keyboard_engine - --backend file --output out.txt
+    python -m keyboard_engine login.macro --macro
+    python -m keyboard_engine contacts.csv --template letter.txt -o letters.txt
+    python -m keyboard_engine script.txt --profile 自然 --wpm 60 --seed 42
+    python -m keyboard_engine long.txt -n 100 --journal --resume
+    python -m keyboard_engine script.txt --sessions 8 --pty "python3 -i" --pty-log log-{n}.txt
+    python -m keyboard_engine script.txt --sessions 200 --async -o out-{n}.txt --interval 0.05
+
+运行结束后以JSON输出每个输入的统计: 输入字符数、耗时、实际速率等。
+"""
+import argparse
+import json
+import shlex
+import sys
+import threading
+
+from .backends import BACKENDS, create_backend
+from .delay_profiles import PROFILES, HumanTiming, wpm_from_interval
+from .engine import TypingEngine
+from .keystroke_plan import NEWLINE_MACROS, compile_plan
+from .macro import MacroCache, compile_macro, default_cache_dir
+from .resume_journal import ResumeJournal, default_journal_dir
+from .telemetry import RunTelemetry
+from .templating import Template, TemplateSource
+from .text_source import FileTextSource
+
+
+def build_parser():
+    """命令行参数定义"""
+    parser = argparse.ArgumentParser(
+        prog='python -m keyboard_engine',
+        description='ikun牌键盘自动化工具的无界面批量运行器')
+    parser.add_argument('inputs', nargs='*', default=['-'],
+                        help="输入文本文件, '-' 表示标准输入 (默认)")
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='开始前的延迟秒数 (默认 0)')
+    parser.add_argument('--interval', type=float, default=0.08,
+                        help='字符间隔秒数 (默认 0.08)')
+    parser.add_argument('-n', '--repetitions', type=int, default=1,
+                        help='每个输入的重复次数 (默认 1)')
+    parser.add_argument('--newline-mode', choices=list(NEWLINE_MACROS), default='Enter',
+                        help='换行方式 (默认 Enter)')
+    parser.add_argument('--burst-chunk', type=int, default=0,
+                        help='突发模式的块大小, 0 表示逐字输入 (默认 0)')
+    parser.add_argument('--macro', action='store_true',
+                        help='把输入作为宏脚本编译 (支持按键、组合键、重复块、等待和变速)')
+    parser.add_argument('--template', default=None,
+                        help='模板文件; 此时输入为CSV或JSONL数据文件, 每行数据填充一次模板')
+    parser.add_argument('--profile', choices=list(PROFILES), default=None,
+                        help='类人输入节奏, 代替固定的字符间隔 (默认不使用)')
+    parser.add_argument('--wpm', type=float, default=None,
+                        help='节奏的目标平均速率, 每分钟单词数 (默认按 --interval 换算)')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='节奏的随机种子, 相同种子可复现同样的等待时间 (默认随机)')
+    parser.add_argument('--journal', nargs='?', const=default_journal_dir(), default=None,
+                        metavar='DIR',
+                        help='把运行进度写入续打日志, 中断后可用 --resume 继续 (默认目录 %(const)s)')
+    parser.add_argument('--resume', action='store_true',
+                        help='输入和参数与续打日志中未完成的运行相同时, 从其最后落盘的位置继续')
+    parser.add_argument('--backend', choices=list(BACKENDS), default=None,
+                        help='键盘后端; 指定 --output 时默认为 file, 否则为 null')
+    parser.add_argument('-o', '--output', default=None,
+                        help="file 后端的输出路径, '-' 表示标准输出")
+    parser.add_argument('--encoding', default='utf-8',
+                        help='输入和输出文件的编码 (默认 utf-8)')
+    parser.add_argument('--no-strip', action='store_true',
+                        help='不去除输入首尾的空白 (界面版默认会去除)')
+    parser.add_argument('--stream', action='store_true',
+                        help='按块流式读取输入文件, 内存占用与文件大小无关 (不去除首尾空白)')
+    parser.add_argument('--telemetry', action='store_true',
+                        help='在统计结果中附带调用耗时、按键间隔和抖动的直方图')
+    parser.add_argument('--sessions', type=int, default=1,
+                        help='在进程池中同时驱动的会话数; 多个会话输出到文件时 --output 需包含 {n}')
+    parser.add_argument('--processes', type=int, default=None,
+                        help='进程池的进程数 (默认取会话数和CPU核数中较小的一个)')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='多个会话在一个线程中以协程运行, 代替进程池')
+    parser.add_argument('--pty', default=None, metavar='COMMAND',
+                        help='每个会话在伪终端中运行该命令并输入给它 (仅限类Unix系统)')
+    parser.add_argument('--pty-log', default=None, metavar='PATH',
+                        help='伪终端中子进程输出的保存路径, 可包含 {n} (默认丢弃)')
+    parser.add_argument('--summary', default='-',
+                        help="统计结果的输出路径, '-' 表示标准输出 (默认)")
+    return parser
+
+
+def read_input(source, encoding):
+    """读取一个输入的全部文本"""
+    if source == '-':
+        return sys.stdin.read()
+    with open(source, 'r', encoding=encoding) as f:
+        return f.read()
+
+
+def run_job(engine, plan, repetitions, delay, interval=0.0, telemetry=None, timing=None,
+            journal=None, start=None):
+    """在工作线程中执行, 主线程收到 Ctrl+C 时停止引擎并保留已完成部分的统计
+
+    plan 可以是按键计划, 也可以是流式输入的片段来源。journal 为续打日志写入器,
+    start 为继续运行的检查点。
+    """
+    outcome = {}
+
+    def target():
+        try:
+            if callable(plan):
+                outcome['result'] = engine.run_segments(plan, repetitions, delay,
+                                                        interval=interval, telemetry=telemetry,
+                                                        start=start, timing=timing)
+            else:
+                outcome['result'] = engine.run(plan, repetitions, delay, telemetry=telemetry,
+                                               start=start, timing=timing)
+        except Exception as e:
+            outcome['error'] = e
+
+    if journal is not None:
+        journal.start(engine, start)
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    try:
+        while worker.is_alive():
+            worker.join(0.1)
+    except KeyboardInterrupt:
+        engine.stop()
+        worker.join()
+    finally:
+        if journal is not None:
+            journal.stop(outcome.get('result'))
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+def main(argv=None):
+    """命令行入口, 返回进程退出码"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.repetitions < 1:
+        parser.error('重复次数必须是一个正整数')
+    if args.interval < 0 or args.delay < 0:
+        parser.error('延迟和间隔不能为负数')
+    if args.burst_chunk < 0:
+        parser.error('块大小不能为负数')
+    if args.macro and args.stream:
+        parser.error('--macro 不能与 --stream 同时使用')
+    if args.template and (args.macro or args.stream):
+        parser.error('--template 不能与 --macro 或 --stream 同时使用')
+    if args.profile is None and (args.wpm is not None or args.seed is not None):
+        parser.error('--wpm 和 --seed 需要与 --profile 一起使用')
+    if args.resume and args.journal is None:
+        args.journal = default_journal_dir()
+    if args.sessions < 1 or (args.processes is not None and args.processes < 1):
+        parser.error('会话数和进程数必须是正整数')
+    timing = None
+    if args.profile is not None:
+        if args.wpm is None and args.interval <= 0:
+            parser.error('间隔为0时需要用 --wpm 指定节奏的目标速率')
+        wpm = args.wpm if args.wpm is not None else wpm_from_interval(args.interval)
+        if wpm <= 0:
+            parser.error('目标速率必须大于0')
+        timing = HumanTiming(args.profile, wpm, args.seed)
+
+    if args.sessions > 1 or args.use_async or args.pty is not None or args.backend == 'pty':
+        return run_multi(args, parser, timing)
+
+    backend_name = args.backend or ('file' if args.output else 'null')
+    options = {}
+    if backend_name == 'file':
+        options['target'] = args.output or '-'
+        options['encoding'] = args.encoding
+    # 输出文本占用标准输出时, 统计结果改写到标准错误
+    summary_to_stderr = args.summary == '-' and options.get('target') == '-'
+
+    backend = create_backend(backend_name, **options)
+    engine = TypingEngine(backend)
+    macro_cache = MacroCache(default_cache_dir()) if args.macro else None
+    journal = ResumeJournal(args.journal) if args.journal is not None else None
+    reports = []
+    exit_code = 0
+    try:
+        resume = None
+        if args.resume:
+            try:
+                resume = journal.load()
+            except ValueError as e:
+                # 失效的日志不能继续: 丢弃后从头开始
+                print(f"警告: {e}, 已丢弃续打日志并从头开始", file=sys.stderr)
+                journal.clear()
+        template_text = read_input(args.template, args.encoding) if args.template else None
+        template = Template(template_text) if args.template else None
+        # 决定按键计划的参数, 与输入一起写入续打日志
+        params = {name: getattr(args, name) for name in (
+            'newline_mode', 'interval', 'burst_chunk', 'macro', 'stream', 'no_strip',
+            'repetitions', 'encoding')}
+        for source in args.inputs:
+            telemetry = RunTelemetry() if args.telemetry else None
+            text = template_text
+            files = {}
+            if template is not None:
+                # 数据行在运行时逐行读取和渲染, 不会展开全部文本
+                data_source = TemplateSource(template, source)
+                plan = lambda: data_source.segments(args.newline_mode, args.interval,
+                                                    args.burst_chunk)
+                files['data'] = source
+            elif args.stream and source != '-':
+                file_source = FileTextSource(source, args.encoding)
+                plan = lambda: file_source.segments(args.newline_mode, args.interval,
+                                                    args.burst_chunk)
+                files['file'] = source
+            else:
+                text = read_input(source, args.encoding)
+                if not args.no_strip:
+                    text = text.strip()
+                if args.macro:
+                    plan = compile_macro(text, args.interval, args.newline_mode,
+                                         args.burst_chunk, cache=macro_cache)
+                else:
+                    plan = compile_plan(text, args.newline_mode, args.interval,
+                                        args.burst_chunk)
+            recorder = start = None
+            if journal is not None and template is not None and not template.reproducible:
+                print(f"模板含 {{timestamp}}, 每次渲染的文本不同, 不记录续打日志: {source}",
+                      file=sys.stderr)
+            elif journal is not None:
+                recorder = journal.recorder(params, text, files, timing)
+                if resume is not None and resume.digest == recorder.digest:
+                    # 与日志中未完成的运行相同: 从检查点继续并沿用节奏种子
+                    start = resume.checkpoint
+                    if timing is not None and resume.timing is not None:
+                        timing.restore(resume.timing)
+                    print(f"从第{start.repetition + 1}次执行的第{start.offset}步继续: {source}",
+                          file=sys.stderr)
+            result = run_job(engine, plan, args.repetitions, args.delay, args.interval,
+                             telemetry, timing, recorder, start)
+            if template is not None:
+                result['rows'] = data_source.rows * args.repetitions
+            elif callable(plan):
+                result['bytes'] = file_source.size * args.repetitions
+            else:
+                result['steps'] = plan.total_steps * args.repetitions
+            result['source'] = source
+            reports.append(result)
+            if result['stopped']:
+                exit_code = 130
+                break
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        exit_code = 1
+    finally:
+        backend.close()
+
+    elapsed = sum(r['elapsed'] for r in reports)
+    units = sum(r['units'] for r in reports)
+    summary = {
+        'backend': backend_name,
+        'inputs': reports,
+        'total': {
+            'chars': units,
+            'elapsed': elapsed,
+            'achieved_rate': units / elapsed if elapsed > 0 else 0.0,
+            'completed': all(r['completed'] == r['repetitions'] for r in reports) and exit_code == 0,
+        },
+    }
+    write_summary(summary, args.summary, summary_to_stderr)
+    return exit_code
+
+
+def write_summary(summary, path, to_stderr=False):
+    """以JSON输出统计结果"""
+    text = json.dumps(summary, ensure_ascii=False, indent=2)
+    if to_stderr:
+        print(text, file=sys.stderr)
+    elif path == '-':
+        print(text)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+
+def run_multi(args, parser, timing):
+    """--sessions / --pty: 同一输入并行驱动多个会话 (进程池或 --async 的协程), 返回进程退出码"""
+    from .multi_session import run_sessions, run_sessions_async
+
+    if len(args.inputs) != 1 or args.stream or args.template:
+        parser.error('多会话运行只支持一个文本或宏脚本输入')
+    if args.journal is not None:
+        parser.error('--journal 不能与多会话运行同时使用')
+    backend_name = 'pty' if args.pty is not None else (args.backend or 'file')
+    if backend_name == 'pty' and not args.pty:
+        parser.error('pty 后端需要用 --pty 指定要运行的命令')
+    if backend_name not in ('pty', 'file', 'null'):
+        parser.error('多会话运行只支持 pty、file 和 null 后端')
+    output = args.output or 'session-{n}.txt'
+    if backend_name == 'file' and args.sessions > 1 and '{n}' not in output:
+        parser.error('多个会话输出到文件时 --output 需要包含 {n}')
+
+    try:
+        text = read_input(args.inputs[0], args.encoding)
+        if not args.no_strip:
+            text = text.strip()
+        if args.macro:
+            plan = compile_macro(text, args.interval, args.newline_mode, args.burst_chunk,
+                                 cache=MacroCache(default_cache_dir()))
+        else:
+            plan = compile_plan(text, args.newline_mode, args.interval, args.burst_chunk)
+        options = {'output': output, 'command': shlex.split(args.pty or ''),
+                   'log': args.pty_log, 'encoding': args.encoding}
+        if args.use_async:
+            summary = run_sessions_async(plan, args.sessions, backend_name, args.repetitions,
+                                         args.delay, timing, **options)
+        else:
+            summary = run_sessions(plan, args.sessions, backend_name, args.processes,
+                                   args.repetitions, args.delay, timing, **options)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 1
+    summary['backend'] = backend_name
+    summary['source'] = args.inputs[0]
+    write_summary(summary, args.summary)
+    return 0 if summary['total']['completed'] else 130
+
+
+if __name__ == '__main__':
+    sys.exit(main())
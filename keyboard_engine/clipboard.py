@@ -0,0 +1,173 @@
+"""剪贴板粘贴输入: 把文本分块放到剪贴板, 每块发送一次粘贴快捷键
+
+剪贴板由可替换的提供者读写 (界面提供 Tk 或 Kivy 的实现)。图形工具包的剪贴板
+只能在界面线程访问, UIThreadClipboard 把工作线程的请求转交界面线程执行并等待
+结果。ClipboardPaster 在第一次粘贴前保存剪贴板原有的文本, 运行结束后放回;
+剪贴板无法写入时改为逐字符输入剩余的文本。
+
+粘贴快捷键发出后, 目标程序是否接收了粘贴 (而不是忽略或拦截) 无法确认, 因此不会
+自动回退; 这类目标需要由用户手动选择「粘贴(逐字)」(compile_paste_plan 的 type_instead)。
+"""
+import threading
+import time
+from collections import deque
+
+# 等待界面线程处理剪贴板请求的最长秒数
+UI_TIMEOUT = 2.0
+
+
+class ClipboardError(Exception):
+    """剪贴板不可用或写入没有生效"""
+
+
+class ClipboardProvider:
+    """剪贴板提供者接口"""
+
+    def get_text(self):
+        """剪贴板中的文本, 没有文本时返回None"""
+        raise NotImplementedError
+
+    def set_text(self, text):
+        raise NotImplementedError
+
+
+class UIThreadClipboard(ClipboardProvider):
+    """在界面线程中访问另一个提供者
+
+    工作线程的读写请求排队后调用 wake() 通知界面线程, 界面线程在事件循环中
+    调用 service() 执行全部请求; 界面线程自己调用时直接执行。
+    """
+
+    def __init__(self, provider, wake=None, timeout=UI_TIMEOUT):
+        self.provider = provider
+        self.wake = wake
+        self.timeout = timeout
+        self.owner = threading.current_thread()
+        self._requests = deque()
+        # 保护请求的状态: 每个请求只能被界面线程领取执行或被超时的工作线程取消其中之一
+        self._lock = threading.Lock()
+
+    def _call(self, func, *args):
+        if threading.current_thread() is self.owner:
+            return func(*args)
+        request = {'func': func, 'args': args, 'state': 'pending', 'done': threading.Event()}
+        self._requests.append(request)
+        if self.wake is not None:
+            self.wake()
+        if not request['done'].wait(self.timeout):
+            with self._lock:
+                cancelled = request['state'] == 'pending'
+                if cancelled:
+                    request['state'] = 'cancelled'
+            if cancelled:
+                # 超时的请求之后不再执行, 以免晚到的写入覆盖剪贴板
+                raise ClipboardError('界面线程没有及时响应剪贴板请求')
+            # 界面线程已经开始执行: 等它完成并照常使用结果, 避免同一段文本既粘贴又逐字输入
+            request['done'].wait()
+        if 'error' in request:
+            raise ClipboardError(str(request['error']))
+        return request.get('result')
+
+    def service(self):
+        """在界面线程中调用, 执行所有待处理的请求"""
+        requests = self._requests
+        while requests:
+            request = requests.popleft()
+            with self._lock:
+                if request['state'] != 'pending':
+                    continue
+                request['state'] = 'running'
+            try:
+                request['result'] = request['func'](*request['args'])
+            except Exception as e:
+                request['error'] = e
+            finally:
+                request['done'].set()
+
+    def get_text(self):
+        return self._call(self.provider.get_text)
+
+    def set_text(self, text):
+        self._call(self.provider.set_text, text)
+
+
+class ClipboardPaster:
+    """按块粘贴文本, 统计粘贴的块数、字符数和速率
+
+    send_paste 发送粘贴快捷键, type_text 为逐字符输入的回退方式。
+    """
+
+    def __init__(self, clipboard, send_paste, type_text, clock=time.perf_counter):
+        self.clipboard = clipboard
+        self.send_paste = send_paste
+        self.type_text = type_text
+        self.clock = clock
+        self._saved = False
+        self._original = None
+        self.reset()
+
+    def reset(self):
+        """开始一次运行前调用, 清空统计"""
+        self.chunks = 0
+        self.chars = 0
+        self.fallback_chars = 0
+        self.error = None
+        self.start_time = self.clock()
+        self.end_time = None
+
+    def paste(self, text):
+        if self.error is None:
+            clipboard = self.clipboard
+            try:
+                if not self._saved:
+                    self._original = clipboard.get_text()
+                    self._saved = True
+                clipboard.set_text(text)
+                # 读回确认: 剪贴板被其他程序占用或禁止写入时不发送粘贴
+                if clipboard.get_text() != text:
+                    raise ClipboardError('剪贴板内容没有更新')
+            except ClipboardError as e:
+                self.error = str(e)
+            else:
+                self.send_paste()
+                self.chunks += 1
+                self.chars += len(text)
+                return
+        self.type_text(text)
+        self.fallback_chars += len(text)
+
+    def restore(self):
+        """放回第一次粘贴前的剪贴板文本 (原来不是文本时清空), 并冻结统计"""
+        if self.end_time is None:
+            self.end_time = self.clock()
+        if not self._saved:
+            return
+        self._saved = False
+        try:
+            self.clipboard.set_text(self._original or '')
+        except ClipboardError as e:
+            self.error = self.error or f'无法恢复剪贴板: {e}'
+        self._original = None
+
+    def stats(self):
+        end = self.end_time if self.end_time is not None else self.clock()
+        elapsed = end - self.start_time
+        chars = self.chars + self.fallback_chars
+        return {
+            'chunks': self.chunks,
+            'chars': self.chars,
+            'fallback_chars': self.fallback_chars,
+            'elapsed': elapsed,
+            'rate': chars / elapsed if elapsed > 0 else 0.0,
+            'error': self.error,
+        }
+
+    def summary(self):
+        """适合写入执行记录的一行摘要"""
+        s = self.stats()
+        text = f"粘贴输入 {s['chunks']}块 {s['chars']}字符, {s['rate']:.0f} 字符/秒"
+        if s['fallback_chars']:
+            text += f", 逐字输入 {s['fallback_chars']}字符 ({s['error']})"
+        elif s['error']:
+            text += f" ({s['error']})"
+        return text
@@ -0,0 +1,304 @@
+"""预先生成的类人输入节奏
+
+固定间隔的输入过于规律, 一些目标程序会因此限速或拦截。节奏配置描述每个节拍
+等待时间的形状: 随机抖动、标点和空格之后放慢、特殊键 (换行等) 之后的停顿、
+按单词成段的快速连打以及偶尔的长停顿。一次运行的全部等待时间在开始前按种子
+一次性生成, 再整体缩放到目标 WPM (每分钟单词数, 按5个字符一个单词计), 因此
+整次运行的平均速率与目标完全一致; 回放的热循环只按下标读取生成好的数组。
+
+安装了 numpy 时用向量化的一次计算生成, 否则退回纯 Python 实现。两种实现各自
+可以用同一种子复现, 但彼此生成的数值不同; to_dict() 记录所用的实现, 继续上次的
+运行时由 restore() 沿用同一种实现。
+"""
+import random
+import secrets
+from array import array
+
+from .keystroke_plan import OP_TEXT, OP_CHUNK, OP_PASTE, OP_WAIT
+
+# 节拍类别
+KIND_CHAR = 0
+KIND_SPACE = 1
+KIND_PUNCT = 2
+KIND_KEY = 3     # 特殊键和组合键 (换行方式展开的按键也在此列)
+KIND_CHUNK = 4   # 突发模式和粘贴模式的整块文本
+KIND_WAIT = 5    # 宏脚本中的等待, 保持原有时长, 不参与缩放
+
+# 之后需要放慢的标点
+PUNCTUATION = ',.;:!?\'"()，。；：！？、“”‘’（）《》…'
+
+# 每个单词按5个字符计
+CHARS_PER_WORD = 5
+
+# 一次生成的最大元素数; 重复次数很多时按块依次生成, 内存占用不随重复次数增长
+MAX_SCHEDULE_ENTRIES = 1 << 22
+
+
+def _numpy():
+    """numpy 可用时返回该模块, 否则返回None"""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class DelayProfile:
+    """一种节奏的形状参数, 各倍数都相对于普通字符的等待时间"""
+
+    def __init__(self, name, jitter=0.3, space=1.3, punctuation=2.5, key=3.0,
+                 burst_probability=0.0, burst_speed=0.6, pause_probability=0.0, pause=6.0):
+        self.name = name
+        # 对数正态抖动的标准差, 0 表示没有随机抖动
+        self.jitter = jitter
+        self.space = space
+        self.punctuation = punctuation
+        self.key = key
+        # 每个单词以 burst_probability 的概率整体快速连打, 等待时间乘以 burst_speed
+        self.burst_probability = burst_probability
+        self.burst_speed = burst_speed
+        # 空格和标点之后以 pause_probability 的概率停顿, 等待时间乘以 pause
+        self.pause_probability = pause_probability
+        self.pause = pause
+
+    def factors(self):
+        """各节拍类别的基础倍数, 按类别编号排列"""
+        return (1.0, self.space, self.punctuation, self.key, 1.0, 0.0)
+
+
+PROFILES = {
+    '稳定': DelayProfile('稳定', jitter=0.1, space=1.1, punctuation=1.5, key=2.0),
+    '自然': DelayProfile('自然', burst_probability=0.15, pause_probability=0.02),
+    '突发停顿': DelayProfile('突发停顿', jitter=0.45, space=1.5, punctuation=3.0, key=4.0,
+                         burst_probability=0.35, burst_speed=0.45,
+                         pause_probability=0.06, pause=8.0),
+}
+
+# 界面上表示不使用节奏、按固定间隔输入的选项
+FIXED_INTERVAL = '固定间隔'
+
+
+def wpm_from_interval(interval):
+    """固定字符间隔对应的 WPM"""
+    return 60.0 / (interval * CHARS_PER_WORD)
+
+
+def tick_layout(plan):
+    """按回放顺序列出计划每个节拍的 (类别, 进度单位数, 固定等待时长)
+
+    与 TypingEngine 的回放一致: 普通文本每个字符一个节拍, 其余动作各一个节拍。
+    """
+    kinds = array('B')
+    units = array('I')
+    waits = array('d')
+    for op, operand, delay in plan:
+        if op == OP_TEXT:
+            for char in operand:
+                kinds.append(KIND_SPACE if char == ' ' else
+                             KIND_PUNCT if char in PUNCTUATION else KIND_CHAR)
+            units.extend([1] * len(operand))
+            waits.extend([0.0] * len(operand))
+        elif op == OP_CHUNK or op == OP_PASTE:
+            kinds.append(KIND_CHUNK)
+            units.append(len(operand))
+            waits.append(0.0)
+        elif op == OP_WAIT:
+            kinds.append(KIND_WAIT)
+            units.append(0)
+            waits.append(delay)
+        else:
+            kinds.append(KIND_KEY)
+            units.append(1)
+            waits.append(0.0)
+    return kinds, units, waits
+
+
+class DelaySchedule:
+    """一个计划在若干次重复中每个节拍的等待时间, row(rep) 取第 rep 次重复
+
+    generate(count) 返回 count 行等待时间, 每行是 float64 的连续缓冲区 (numpy 数组
+    的行或 array('d')), 不转换为 Python 列表。
+    """
+
+    def __init__(self, generate, repetitions, ticks):
+        self.repetitions = repetitions
+        self.ticks = ticks
+        self._generate = generate
+        self._rows = ()
+        # 当前块第一行对应的重复序号
+        self._first = 0
+        self._next = 0
+        # 每块的重复次数只取决于节拍数, 同一种子分块生成的结果仍可复现
+        self._block = max(1, MAX_SCHEDULE_ENTRIES // max(1, ticks))
+        self._fill()
+
+    def _fill(self):
+        """生成下一块重复的等待时间, 之前的块不再保留"""
+        count = min(self._block, self.repetitions - self._next)
+        # 先释放上一块再生成, 同一时刻只占用一块的内存
+        self._rows = ()
+        self._rows = self._generate(count)
+        self._first = self._next
+        self._next += count
+
+    def row(self, rep):
+        """第 rep 次重复的等待时间, 按节拍下标读取
+
+        返回该行缓冲区的 memoryview, 下标读取得到 Python float, 热循环的截止时间
+        计算不会变成 numpy 标量运算。
+        """
+        if rep < self._first:
+            raise IndexError(f"第{rep}次重复所在的块已经释放")
+        while rep >= self._next and self._next < self.repetitions:
+            self._fill()
+        return memoryview(self._rows[rep - self._first])
+
+
+class HumanTiming:
+    """按节奏配置、目标 WPM 和种子为计划生成等待时间
+
+    seed 为None时随机选择一个, 可从 seed 属性读出用于复现同一次运行。
+    """
+
+    def __init__(self, profile, wpm, seed=None, use_numpy=True):
+        if isinstance(profile, str):
+            if profile not in PROFILES:
+                raise ValueError(f"未知的节奏: {profile}, 可用 {', '.join(PROFILES)}")
+            profile = PROFILES[profile]
+        if not wpm > 0:
+            raise ValueError(f"目标速率必须大于0: {wpm}")
+        self.profile = profile
+        self.wpm = float(wpm)
+        self.seed = secrets.randbits(32) if seed is None else int(seed)
+        self.numpy = _numpy() if use_numpy else None
+
+    @property
+    def unit_time(self):
+        """每个进度单位 (字符或按键) 的平均等待秒数"""
+        return 60.0 / (self.wpm * CHARS_PER_WORD)
+
+    def describe(self):
+        return f"{self.profile.name}, {self.wpm:.0f} WPM, 种子 {self.seed}"
+
+    def to_dict(self):
+        return {'profile': self.profile.name, 'wpm': self.wpm, 'seed': self.seed,
+                'numpy': self.numpy is not None}
+
+    def restore(self, data):
+        """沿用 to_dict() 记录的种子和生成实现, 继续的运行得到与上次相同的等待时间
+
+        上次由 numpy 生成而现在无法导入 numpy 时抛出 ValueError。
+        """
+        self.seed = int(data['seed'])
+        if not data.get('numpy', self.numpy is not None):
+            self.numpy = None
+        elif self.numpy is None:
+            self.numpy = _numpy()
+            if self.numpy is None:
+                raise ValueError('上次的节奏由 numpy 生成, 需要安装 numpy 才能按同一种子继续')
+
+    def schedule(self, plan, repetitions=1, key=()):
+        """生成 plan 重复 repetitions 次的等待时间
+
+        key 为附加的整数种子, 用于流式片段: 每个片段按 (重复次数, 片段序号)
+        单独生成, 与片段什么时候到达无关。
+        """
+        if self.numpy is not None:
+            generate, ticks = self._numpy_rows(plan, key)
+        else:
+            generate, ticks = self._python_rows(plan, key)
+        return DelaySchedule(generate, repetitions, ticks)
+
+    def _numpy_layout(self, plan):
+        """tick_layout 的向量化版本: 全部文本拼接后按码位一次分类, 其余动作逐个覆盖"""
+        np = self.numpy
+        pieces = []
+        actions = []
+        position = 0
+        for op, operand, delay in plan:
+            if op == OP_TEXT:
+                pieces.append(operand)
+                position += len(operand)
+                continue
+            if op == OP_CHUNK or op == OP_PASTE:
+                actions.append((position, KIND_CHUNK, len(operand), 0.0))
+            elif op == OP_WAIT:
+                actions.append((position, KIND_WAIT, 0, delay))
+            else:
+                actions.append((position, KIND_KEY, 1, 0.0))
+            # 占位字符, 分类之后被覆盖
+            pieces.append('\0')
+            position += 1
+        codes = np.frombuffer(''.join(pieces).encode('utf-32-le'), dtype='<u4')
+        punctuation = np.frombuffer(PUNCTUATION.encode('utf-32-le'), dtype='<u4')
+        kinds = np.where(np.isin(codes, punctuation), KIND_PUNCT, KIND_CHAR).astype(np.uint8)
+        kinds[codes == 32] = KIND_SPACE
+        units = np.ones(len(codes))
+        waits = np.zeros(len(codes))
+        if actions:
+            positions, action_kinds, action_units, action_waits = zip(*actions)
+            positions = list(positions)
+            kinds[positions] = action_kinds
+            units[positions] = action_units
+            waits[positions] = action_waits
+        return kinds, units, waits
+
+    def _numpy_rows(self, plan, key):
+        np = self.numpy
+        profile = self.profile
+        rng = np.random.default_rng([self.seed, *key])
+        kinds, units, waits = self._numpy_layout(plan)
+        base = np.asarray(profile.factors())[kinds] * units
+        is_wait = kinds == KIND_WAIT
+        boundary = (kinds == KIND_SPACE) | (kinds == KIND_PUNCT)
+        # 每个节拍所属的单词序号, 快速连打以单词为单位
+        words = np.cumsum(kinds == KIND_SPACE)
+        budget = units.sum() * self.unit_time
+
+        def generate(count):
+            n = len(kinds)
+            weights = np.broadcast_to(base, (count, n)).copy()
+            if profile.jitter:
+                weights *= rng.lognormal(0.0, profile.jitter, (count, n))
+            if profile.burst_probability:
+                bursts = rng.random((count, int(words[-1]) + 1 if n else 1)) < profile.burst_probability
+                weights *= np.where(bursts, profile.burst_speed, 1.0)[:, words]
+            if profile.pause_probability:
+                pauses = (rng.random((count, n)) < profile.pause_probability) & boundary
+                weights *= np.where(pauses, profile.pause, 1.0)
+            # 每次重复单独缩放, 总等待时间精确等于目标速率对应的时长
+            totals = weights.sum(axis=1, keepdims=True)
+            np.divide(weights * budget, totals, out=weights, where=totals > 0)
+            weights[:, is_wait] = waits[is_wait]
+            return weights
+        return generate, len(kinds)
+
+    def _python_rows(self, plan, key):
+        profile = self.profile
+        kinds, units, waits = tick_layout(plan)
+        rng = random.Random(':'.join(str(part) for part in (self.seed, *key)))
+        factors = profile.factors()
+        base = [factors[kind] * unit for kind, unit in zip(kinds, units)]
+        budget = sum(units) * self.unit_time
+
+        def generate(count):
+            rows = []
+            for _ in range(count):
+                row = list(base)
+                if profile.jitter:
+                    row = [w * rng.lognormvariate(0.0, profile.jitter) for w in row]
+                burst = profile.burst_probability and rng.random() < profile.burst_probability
+                for i, kind in enumerate(kinds):
+                    if burst:
+                        row[i] *= profile.burst_speed
+                    if kind == KIND_SPACE or kind == KIND_PUNCT:
+                        if profile.pause_probability and rng.random() < profile.pause_probability:
+                            row[i] *= profile.pause
+                        if kind == KIND_SPACE and profile.burst_probability:
+                            burst = rng.random() < profile.burst_probability
+                total = sum(row)
+                scale = budget / total if total > 0 else 0.0
+                rows.append(array('d', [waits[i] if kind == KIND_WAIT else w * scale
+                                        for i, (kind, w) in enumerate(zip(kinds, row))]))
+            return rows
+        return generate, len(kinds)
@@ -0,0 +1,376 @@
+"""Tk与Kivy界面共用的按键计划执行引擎"""
+import threading
+import time
+from collections import namedtuple
+
+from .keystroke_plan import OP_TEXT, OP_TAP, OP_COMBO, OP_CHUNK, OP_PASTE, OP_WAIT
+from .timing import DeadlineScheduler, PauseGate, drive
+
+# 运行位置: 第几次重复 (从0开始) 以及该次重复内已输出的步数
+Checkpoint = namedtuple('Checkpoint', 'repetition offset')
+
+
+class TypingEngine:
+    """在指定后端上回放按键计划
+
+    引擎不接触任何界面对象, 进度、记录和错误全部通过可选的 UIEventChannel
+    报告, 因此同一个引擎可以被两个图形界面和无界面的命令行共同使用。
+
+    回放逻辑写成产生截止时间的生成器 (各个 _steps 方法), 本身从不等待;
+    _drive 在调度器上阻塞等待每个截止时间。async_engine.AsyncTypingEngine
+    只替换调度器和 _drive, 在事件循环中执行同一套回放逻辑。
+    """
+
+    def __init__(self, backend, stop_event=None):
+        self.backend = backend
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.gate = PauseGate()
+        self.clock = time.perf_counter
+        self.stop_requested = None
+        self.stop_latency = None
+        self._scheduler = None
+        self._repetition = 0
+        self._rep_units = 0
+        # 本次运行的起点, 运行建立调度器之前 checkpoint() 返回它
+        self._start = Checkpoint(0, 0)
+
+    def reset(self, start=None):
+        """为下一次运行清除停止信号、停止记录和暂停, 并把位置设为 start
+
+        工作线程在取出任务时 (持有队列锁) 调用, 而不是在运行开始时: 取出之后、
+        运行开始之前到达的取消不会被清除, 运行在开始处结束并照常记录停止延迟;
+        这期间读取的位置是新任务的起点, 而不是上一个任务停下的位置。
+        """
+        self._scheduler = None
+        self._start = Checkpoint(*start) if start is not None else Checkpoint(0, 0)
+        self.stop_event.clear()
+        self.stop_requested = None
+        self.stop_latency = None
+        self.gate.resume()
+
+    def stop(self):
+        """请求停止, 正在进行的等待会被立即打断"""
+        if self.stop_requested is None:
+            self.stop_requested = self.clock()
+        self.stop_event.set()
+        self.gate.interrupt()
+
+    def pause(self):
+        """暂停, 在下一个按键之前生效, 不丢失任何位置"""
+        self.gate.pause()
+
+    def resume(self):
+        self.gate.resume()
+
+    @property
+    def paused(self):
+        return self.gate.paused
+
+    def checkpoint(self):
+        """当前位置; 可在任意线程调用, 暂停或停止后读取即为精确位置"""
+        scheduler = self._scheduler
+        if scheduler is None:
+            return self._start
+        return Checkpoint(self._repetition, scheduler.units - self._rep_units)
+
+    def describe_checkpoint(self):
+        """适合写入执行记录的位置说明"""
+        repetition, offset = self.checkpoint()
+        return f"第{repetition + 1}次执行, 已输出{offset}步"
+
+    def _stopped(self):
+        """在工作线程确认停止时调用, 记录从请求停止到不再发送按键的延迟"""
+        if self.stop_latency is None and self.stop_requested is not None:
+            self.stop_latency = self.clock() - self.stop_requested
+
+    def run(self, plan, repetitions=1, delay=0.0, channel=None, execution_base=0,
+            announce=False, telemetry=None, start=None, timing=None):
+        """执行计划并返回本次运行的统计信息
+
+        announce 为True时把倒计时和开始提示也写入执行记录。
+        """
+        return self._drive(self._run_steps(plan, repetitions, delay, channel, execution_base,
+                                           announce, telemetry, start, timing))
+
+    def run_segments(self, segments, repetitions=1, delay=0.0, channel=None,
+                     execution_base=0, announce=False, interval=0.0, telemetry=None,
+                     start=None, timing=None):
+        """依次执行一串计划片段, 用于流式输入
+
+        segments 是无参可调用对象, 每次重复执行时调用一次, 返回可迭代的
+        (计划, 进度权重)、(计划, 已解析操作数, 进度权重) 或再附带等待时间表的
+        四元组。权重为None时按步数计进度, 否则把权重平均分摊到片段的每一步上
+        (例如片段对应的字节数)。
+        telemetry 为 RunTelemetry 时记录每次后端调用的耗时和间隔。
+        start 为 Checkpoint 时从该位置继续: 之前的重复不再执行, 该次重复中已输出
+        的步数被跳过 (跳过部分的进度照常报告)。
+        timing 为 delay_profiles.HumanTiming 时按其生成的等待时间代替固定间隔;
+        没有附带等待时间表的片段在到达时按 (重复次数, 片段序号) 单独生成。
+        """
+        return self._drive(self._segment_steps(segments, repetitions, delay, channel,
+                                               execution_base, announce, interval, telemetry,
+                                               start, timing))
+
+    def _new_scheduler(self, interval):
+        return DeadlineScheduler(interval, self.stop_event, gate=self.gate)
+
+    def _drive(self, steps):
+        """执行回放生成器, 在本次运行的调度器上等待它产生的每个截止时间"""
+        return drive(steps, lambda deadline: self._scheduler.wait(deadline))
+
+    def _run_steps(self, plan, repetitions, delay, channel, execution_base, announce,
+                   telemetry, start, timing):
+        # 回放前一次性把键名解析为后端的按键对象并预热字符翻译缓存, 所有重复执行共用;
+        # 使用节奏配置时全部重复的等待时间也在开始前一次生成
+        self.backend.prepare(plan)
+        schedule = timing.schedule(plan, repetitions) if timing is not None else None
+        segment = ((plan, plan.map_operands(self.backend.resolve_key), None, schedule),)
+        return (yield from self._segment_steps(lambda: segment, repetitions, delay, channel,
+                                               execution_base, announce, plan.interval,
+                                               telemetry, start, timing))
+
+    def _segment_steps(self, segments, repetitions, delay, channel, execution_base, announce,
+                       interval, telemetry, start, timing):
+        backend = self.backend
+        stop_event = self.stop_event
+        # 第一次产生截止时间之前设置, _drive 在这个调度器上等待
+        scheduler = self._new_scheduler(interval)
+        first_rep, skip = start if start is not None else (0, 0)
+        self._repetition = first_rep
+        # 倒计时期间的位置仍是起点
+        self._rep_units = -skip
+        self._scheduler = scheduler
+
+        on_second = None
+        if announce and channel is not None:
+            on_second = lambda i: channel.post_record(f'倒计时: {i}秒')
+        if channel is not None:
+            self.gate.on_hold = lambda: channel.post_record(
+                f"[{time.strftime('%H:%M:%S')}] 已暂停: {self.describe_checkpoint()}")
+        paster = backend.paster
+        if paster is not None:
+            paster.reset()
+        try:
+            completed = yield from self._repetition_steps(
+                segments, repetitions, delay, channel, execution_base, announce, telemetry,
+                timing, scheduler, first_rep, skip, on_second)
+        finally:
+            # 放回粘贴前的剪贴板等, 停止或出错时同样执行
+            backend.finish()
+        if paster is not None and paster.chunks + paster.fallback_chars and channel is not None:
+            channel.post_record(f"[{time.strftime('%H:%M:%S')}] {paster.summary()}")
+
+        self.gate.on_hold = None
+        if stop_event.is_set():
+            self._stopped()
+        result = scheduler.stats()
+        result['backend'] = backend.name
+        result['repetitions'] = repetitions
+        result['completed'] = completed
+        result['stopped'] = stop_event.is_set()
+        result['checkpoint'] = self.checkpoint()._asdict()
+        result['stop_latency'] = self.stop_latency
+        if telemetry is not None:
+            result['telemetry'] = telemetry.to_dict()
+        if timing is not None:
+            result['timing'] = timing.to_dict()
+        if paster is not None:
+            result['paste'] = paster.stats()
+        return result
+
+    def _repetition_steps(self, segments, repetitions, delay, channel, execution_base,
+                          announce, telemetry, timing, scheduler, first_rep, skip, on_second):
+        """倒计时后依次执行各次重复, 返回完整执行的次数"""
+        backend = self.backend
+        completed = 0
+        if (yield from scheduler.countdown_steps(delay, on_second)):
+            if announce and channel is not None:
+                channel.post_record('开始执行模拟输入...')
+            if timing is not None and channel is not None:
+                channel.post_record(f"输入节奏: {timing.describe()}")
+
+            # 开始输入, 之后的每个节拍都以此刻为零点计算截止时间
+            scheduler.start()
+            if telemetry is not None:
+                telemetry.translator = backend.translator
+                telemetry.begin(scheduler.units)
+            for rep in range(first_rep, repetitions):
+                self._repetition = rep
+                self._rep_units = scheduler.units - skip
+                stopped = False
+                for index, segment in enumerate(segments()):
+                    schedule = None
+                    if len(segment) == 2:
+                        plan, weight = segment
+                        operands = None
+                    elif len(segment) == 3:
+                        plan, operands, weight = segment
+                    else:
+                        plan, operands, weight, schedule = segment
+                    unit = 1 if weight is None or not plan.total_steps else weight / plan.total_steps
+                    if skip >= plan.total_steps:
+                        # 从检查点继续: 整段已经输出过
+                        skip -= plan.total_steps
+                        if channel is not None and plan.total_steps:
+                            channel.post_progress(plan.total_steps * unit)
+                        continue
+                    if operands is None:
+                        backend.prepare(plan)
+                        operands = plan.map_operands(backend.resolve_key)
+                    delays = None
+                    if timing is not None:
+                        if schedule is None:
+                            schedule = timing.schedule(plan, 1, (rep, index))
+                            delays = schedule.row(0)
+                        else:
+                            delays = schedule.row(rep)
+                    if not (yield from self._replay_steps(plan, operands, scheduler, channel,
+                                                          unit, telemetry, skip, delays)):
+                        stopped = True
+                        break
+                    skip = 0
+                skip = 0
+                if stopped:
+                    break
+                completed += 1
+                if telemetry is not None:
+                    telemetry.end_repetition(scheduler.units)
+                if channel is not None:
+                    timestamp = time.strftime('%H:%M:%S')
+                    channel.post_execution(f"[{timestamp}] 第{execution_base + rep + 1}次执行完成")
+
+            # 记录实际速率与目标速率的对比
+            scheduler.finish()
+            if telemetry is not None:
+                telemetry.finish()
+            if scheduler.units and channel is not None:
+                channel.post_record(f"[{time.strftime('%H:%M:%S')}] {scheduler.summary()}")
+        return completed
+
+    def run_reporting(self, plan, repetitions=1, delay=0.0, channel=None, execution_base=0,
+                      announce=False, close_backend=False, interval=0.0, telemetry=None,
+                      start=None, timing=None):
+        """在工作线程中调用的 run: 错误和结束都通过事件通道报告给界面
+
+        plan 为按键计划时调用 run, 为可调用对象时作为片段来源调用 run_segments。
+        """
+        return self._drive(self._reporting_steps(plan, repetitions, delay, channel,
+                                                 execution_base, announce, close_backend,
+                                                 interval, telemetry, start, timing))
+
+    def _reporting_steps(self, plan, repetitions, delay, channel, execution_base, announce,
+                         close_backend, interval, telemetry, start, timing):
+        try:
+            if callable(plan):
+                return (yield from self._segment_steps(plan, repetitions, delay, channel,
+                                                       execution_base, announce, interval,
+                                                       telemetry, start, timing))
+            return (yield from self._run_steps(plan, repetitions, delay, channel,
+                                               execution_base, announce, telemetry, start,
+                                               timing))
+        except Exception as e:
+            if channel is not None:
+                channel.post_error(f"执行过程中发生错误: {str(e)}")
+        finally:
+            try:
+                if close_backend:
+                    self.backend.close()
+            finally:
+                if channel is not None:
+                    channel.post_finished()
+
+    def _replay_steps(self, plan, operands, scheduler, channel, unit=1, telemetry=None, skip=0,
+                      delays=None):
+        """回放一遍计划, 每一步报告 unit 个进度单位; 返回False表示中途被停止
+
+        每个节拍产生 scheduler.advance() 给出的截止时间, 由驱动方等待并送回等待
+        结果; 送回False (等待中被停止或协程任务被取消) 时在当前位置结束。热循环
+        本身不检查停止信号。
+        skip 为开头需要跳过的步数, 用于从检查点继续。delays 为按节拍顺序预先
+        生成的等待时间, 为None时使用计划中的固定间隔。
+        """
+        backend = self.backend
+        type_text = backend.type_text
+        paste = backend.paste
+        tap = backend.tap
+        combo = backend.combo
+        tick = scheduler.advance
+        post_progress = channel.post_progress if channel is not None else _ignore
+        if telemetry is not None:
+            # 只在需要遥测时才包装, 普通运行的热循环不增加任何开销
+            type_text = telemetry.instrument(type_text)
+            paste = telemetry.instrument(paste)
+            tap = telemetry.instrument(tap)
+            combo = telemetry.instrument(combo)
+            tick = telemetry.instrument_tick(tick, scheduler.interval)
+
+        # 预先生成的等待时间表中当前动作第一个节拍的下标
+        t = 0
+        for op, arg, step_delay in zip(plan.ops, plan.args, plan.delays):
+            operand = operands[arg]
+            if skip:
+                if op == OP_WAIT:
+                    t += 1
+                    continue
+                if op == OP_TAP or op == OP_COMBO:
+                    skipped = 1
+                else:
+                    # 文本、突发块和粘贴块可以只跳过开头的一部分
+                    skipped = min(skip, len(operand))
+                    operand = operand[skipped:]
+                skip -= skipped
+                post_progress(skipped * unit)
+                if op == OP_TEXT:
+                    t += skipped
+                if not operand or op == OP_TAP or op == OP_COMBO:
+                    if op != OP_TEXT:
+                        t += 1
+                    continue
+
+            if op == OP_TEXT:
+                if delays is None:
+                    for char in operand:
+                        type_text(char)
+                        post_progress(unit)
+                        if not (yield tick(step_delay)):
+                            return False
+                else:
+                    for char in operand:
+                        type_text(char)
+                        post_progress(unit)
+                        if not (yield tick(delays[t])):
+                            return False
+                        t += 1
+                continue
+            if delays is not None:
+                step_delay = delays[t]
+            t += 1
+            if op == OP_CHUNK:
+                # 突发模式: 整块文本一次交给后端, 间隔作用于整块
+                type_text(operand)
+                post_progress(len(operand) * unit)
+                if not (yield tick(step_delay, units=len(operand))):
+                    return False
+            elif op == OP_PASTE:
+                # 粘贴模式: 整块文本经剪贴板一次粘贴, 间隔作用于整块
+                paste(operand)
+                post_progress(len(operand) * unit)
+                if not (yield tick(step_delay, units=len(operand))):
+                    return False
+            elif op == OP_TAP:
+                tap(operand)
+                post_progress(unit)
+                if not (yield tick(step_delay)):
+                    return False
+            elif op == OP_COMBO:
+                combo(*operand)
+                post_progress(unit)
+                if not (yield tick(step_delay)):
+                    return False
+            elif not (yield tick(step_delay, units=0)):
+                return False
+        return True
+
+
+def _ignore(units):
+    """没有事件通道时的空进度回调"""
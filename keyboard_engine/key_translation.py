@@ -0,0 +1,167 @@
+"""字符到按键事件的翻译缓存和非ASCII文本的批量输入
+
+pynput 的 type() 每输入一个字符都要重新把它解析为按键对象, 非ASCII字符还会
+走更慢的路径。KeyTranslator 把每个字符翻译成的事件序列保存在LRU缓存中, 并在
+开始输入前用计划中的全部字符预热; 连续的非ASCII字符在平台支持时整段一次发送
+(Windows 上为一次 SendInput 调用), 否则逐字符回放缓存的事件。其他平台没有批量
+发送的方式, unicode_sender() 返回None, 输入与普通的逐字符回放完全相同。
+"""
+import functools
+import re
+import sys
+
+# 缓存的字符数上限; 常用汉字约三千个, 中英混合文本一般都能完全命中
+DEFAULT_CAPACITY = 8192
+
+# 把文本切分为连续的ASCII段和非ASCII段
+_RUNS = re.compile(r'[\x00-\x7f]+|[^\x00-\x7f]+')
+
+
+def split_runs(text):
+    """按是否为ASCII切分文本, 返回各段组成的列表"""
+    return _RUNS.findall(text)
+
+
+class KeyTranslator:
+    """带LRU缓存的字符翻译
+
+    translate(char) 返回该字符的事件序列, 具体内容由后端决定 (例如 pynput 的
+    ((按键, 是否按下), ...))。send_unicode 为 unicode_sender() 的结果, 为None时
+    全部逐字符回放。统计信息可在任意线程读取, 由遥测显示命中率。
+    """
+
+    def __init__(self, translate, capacity=DEFAULT_CAPACITY, send_unicode=None):
+        self.capacity = capacity
+        self.events = functools.lru_cache(maxsize=capacity)(translate)
+        self.send_unicode = send_unicode
+        # 预热时的查找发生在开始输入之前, 不计入命中率
+        self._warm_hits = 0
+        self._warm_misses = 0
+        # 通过批量方式发送的非ASCII字符数和调用次数
+        self.batched_chars = 0
+        self.batch_calls = 0
+
+    def warm(self, chars):
+        """预先翻译一组字符, 超出容量的部分不再预热"""
+        events = self.events
+        before = events.cache_info()
+        for count, char in enumerate(chars):
+            if count >= self.capacity:
+                break
+            events(char)
+        after = events.cache_info()
+        self._warm_hits += after.hits - before.hits
+        self._warm_misses += after.misses - before.misses
+
+    def type_text(self, text, play):
+        """输入一段文本: 连续的非ASCII字符整段批量发送, 其余字符用 play 回放缓存的事件
+
+        批量发送被系统拒绝 (OSError, 例如目标窗口权限更高) 时, 这一段和之后的
+        文本都改回逐字符输入。
+        """
+        events = self.events
+        send_unicode = self.send_unicode
+        if len(text) == 1 and (send_unicode is None or text < '\x80'):
+            # 逐字输入的常见情况: 直接回放缓存的事件
+            play(events(text))
+            return
+        for run in split_runs(text):
+            if send_unicode is not None and run[0] >= '\x80':
+                try:
+                    send_unicode(run)
+                except OSError:
+                    self.send_unicode = send_unicode = None
+                else:
+                    self.batched_chars += len(run)
+                    self.batch_calls += 1
+                    continue
+            for char in run:
+                play(events(char))
+
+    def stats(self):
+        info = self.events.cache_info()
+        hits = info.hits - self._warm_hits
+        misses = info.misses - self._warm_misses
+        return {
+            'capacity': self.capacity,
+            'size': info.currsize,
+            'warmed': self._warm_misses,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            'batched_chars': self.batched_chars,
+            'batch_calls': self.batch_calls,
+        }
+
+    def summary(self):
+        """适合附加在遥测摘要后的一段文字"""
+        s = self.stats()
+        text = f"字符缓存命中 {s['hit_rate']:.1%} ({s['size']}字)"
+        if s['batch_calls']:
+            text += f" | 批量输入 {s['batched_chars']}字/{s['batch_calls']}次"
+        return text
+
+
+def unicode_sender():
+    """返回把一段文本作为Unicode按键一次发送的函数
+
+    目前只有 Windows 支持。其他平台, 或 Windows 上无法加载 user32 时返回None,
+    调用方应逐字符回放事件。
+    """
+    if sys.platform != 'win32':
+        return None
+    try:
+        return _windows_unicode_sender()
+    except (AttributeError, OSError):
+        return None
+
+
+def _windows_unicode_sender():
+    """用一次 SendInput 发送整段文本的全部按下和抬起事件 (KEYEVENTF_UNICODE)"""
+    import ctypes
+    from array import array
+    from ctypes import wintypes
+
+    input_keyboard = 1
+    keyeventf_keyup = 0x0002
+    keyeventf_unicode = 0x0004
+
+    class KEYBDINPUT(ctypes.Structure):
+        _fields_ = (('wVk', wintypes.WORD), ('wScan', wintypes.WORD),
+                    ('dwFlags', wintypes.DWORD), ('time', wintypes.DWORD),
+                    ('dwExtraInfo', ctypes.c_size_t))
+
+    class MOUSEINPUT(ctypes.Structure):
+        # 只用于让联合体的大小与系统定义一致
+        _fields_ = (('dx', wintypes.LONG), ('dy', wintypes.LONG),
+                    ('mouseData', wintypes.DWORD), ('dwFlags', wintypes.DWORD),
+                    ('time', wintypes.DWORD), ('dwExtraInfo', ctypes.c_size_t))
+
+    class INPUTUNION(ctypes.Union):
+        _fields_ = (('ki', KEYBDINPUT), ('mi', MOUSEINPUT))
+
+    class INPUT(ctypes.Structure):
+        _fields_ = (('type', wintypes.DWORD), ('union', INPUTUNION))
+
+    send_input = ctypes.windll.user32.SendInput
+    send_input.argtypes = (wintypes.UINT, ctypes.POINTER(INPUT), ctypes.c_int)
+    send_input.restype = wintypes.UINT
+    size = ctypes.sizeof(INPUT)
+
+    def send(text):
+        # 超出BMP的字符按UTF-16拆成两个代理项, 各自按下和抬起
+        units = array('H', text.encode('utf-16-le'))
+        inputs = (INPUT * (len(units) * 2))()
+        for i, unit in enumerate(units):
+            down = inputs[2 * i]
+            down.type = input_keyboard
+            down.union.ki.wScan = unit
+            down.union.ki.dwFlags = keyeventf_unicode
+            up = inputs[2 * i + 1]
+            up.type = input_keyboard
+            up.union.ki.wScan = unit
+            up.union.ki.dwFlags = keyeventf_unicode | keyeventf_keyup
+        sent = send_input(len(inputs), inputs, size)
+        if sent != len(inputs):
+            raise ctypes.WinError()
+    return send
@@ -0,0 +1,239 @@
+"""把输入文本和参数编译为可重复回放的按键计划"""
+from array import array
+
+# 动作类型
+OP_TEXT = 0   # 逐字输入一段普通文本, 每个字符一个节拍
+OP_TAP = 1    # 单击一个特殊键
+OP_COMBO = 2  # 按住修饰键后单击一个键
+OP_WAIT = 3   # 不产生按键, 只等待
+OP_CHUNK = 4  # 突发模式: 一次后端调用输入整块文本, 整块只占一个节拍
+OP_PASTE = 5  # 粘贴模式: 整块文本经剪贴板粘贴, 整块只占一个节拍
+
+# 突发模式的默认块大小
+DEFAULT_BURST_CHUNK = 32
+
+# 粘贴模式的默认块大小, 以及两次粘贴之间的最短间隔 (目标程序需要时间读取剪贴板)
+DEFAULT_PASTE_CHUNK = 2000
+MIN_PASTE_INTERVAL = 0.1
+
+# 各换行方式对应的宏片段 (语法见 macro 模块), 每个动作之后等待一个字符间隔
+NEWLINE_MACROS = {
+    'Enter': '{enter}',
+    'Shift+Enter': '{shift+enter}',
+    'Shift+Tab x10': '{enter}{shift+tab 10}',
+    'Home x2': '{enter}{home 2}',
+    '双击空格': '  ',
+    '制表符': '{tab}',
+}
+
+
+class KeystrokePlan:
+    """编译后的按键计划
+
+    动作类型、操作数下标和动作后的等待时间分别存放在三个紧凑数组中, 文本段、
+    键名等操作数去重后存放在 operands 列表里。计划只编译一次, 之后每次重复
+    执行都直接回放这些数组。
+    """
+
+    __slots__ = ('ops', 'args', 'delays', 'operands', 'total_steps', 'interval', 'burst_chunk',
+                 '_operand_index', '_pending_text', '_pending_delay')
+
+    def __init__(self, interval=0.0, burst_chunk=0):
+        self.ops = array('B')
+        self.args = array('I')
+        self.delays = array('d')
+        self.operands = []
+        # 一次回放产生的进度单位数, 文本每个字符一个, 其余按键动作各一个
+        self.total_steps = 0
+        # 编译时指定的名义字符间隔
+        self.interval = interval
+        # 大于0时普通文本按此大小切块, 每块一次后端调用
+        self.burst_chunk = burst_chunk
+        self._operand_index = {}
+        self._pending_text = []
+        self._pending_delay = None
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __iter__(self):
+        """依次产生 (动作类型, 操作数, 动作后的等待时间)"""
+        operands = self.operands
+        for op, arg, delay in zip(self.ops, self.args, self.delays):
+            yield op, operands[arg], delay
+
+    def _intern(self, op, value):
+        """返回操作数下标, 同类动作的相同操作数只存一份"""
+        index = self._operand_index.get((op, value))
+        if index is None:
+            index = len(self.operands)
+            self.operands.append(value)
+            self._operand_index[(op, value)] = index
+        return index
+
+    def _emit(self, op, operand, delay):
+        self.flush()
+        self.ops.append(op)
+        self.args.append(self._intern(op, operand))
+        self.delays.append(delay)
+
+    def flush(self):
+        """把累积的相邻普通文本合并为一个文本动作, 突发模式下切分为多个文本块"""
+        if not self._pending_text:
+            return
+        text = ''.join(self._pending_text)
+        self._pending_text = []
+        if self.burst_chunk > 0:
+            size = self.burst_chunk
+            for start in range(0, len(text), size):
+                self.ops.append(OP_CHUNK)
+                self.args.append(self._intern(OP_CHUNK, text[start:start + size]))
+                self.delays.append(self._pending_delay)
+        else:
+            self.ops.append(OP_TEXT)
+            self.args.append(self._intern(OP_TEXT, text))
+            self.delays.append(self._pending_delay)
+
+    def add_text(self, text, delay):
+        """追加普通文本, 与前面相同间隔的文本合并为一段"""
+        if not text:
+            return
+        if self._pending_text and self._pending_delay != delay:
+            self.flush()
+        self._pending_text.append(text)
+        self._pending_delay = delay
+        self.total_steps += len(text)
+
+    def add_tap(self, key, delay):
+        """追加单击特殊键"""
+        self._emit(OP_TAP, key, delay)
+        self.total_steps += 1
+
+    def add_combo(self, modifiers, key, delay):
+        """追加组合键"""
+        self._emit(OP_COMBO, (tuple(modifiers), key), delay)
+        self.total_steps += 1
+
+    def add_paste(self, text, delay):
+        """追加一块经剪贴板粘贴的文本"""
+        self._emit(OP_PASTE, text, delay)
+        self.total_steps += len(text)
+
+    def add_chunk(self, text, delay):
+        """追加一块一次后端调用输入的文本, 不再按 burst_chunk 切分"""
+        self._emit(OP_CHUNK, text, delay)
+        self.total_steps += len(text)
+
+    def add_wait(self, seconds):
+        """追加一段纯等待"""
+        self._emit(OP_WAIT, None, seconds)
+
+    def add_action(self, action, delay):
+        """追加 macro.newline_actions 形式的动作描述"""
+        kind = action[0]
+        if kind == 'text':
+            self.add_text(action[1], delay)
+        elif kind == 'tap':
+            self.add_tap(action[1], delay)
+        elif kind == 'combo':
+            self.add_combo(action[1], action[2], delay)
+        elif kind == 'wait':
+            self.add_wait(action[1])
+        else:
+            raise ValueError(f"未知的动作类型: {kind}")
+
+    def characters(self):
+        """计划中普通文本用到的全部字符 (去重)"""
+        chars = set()
+        texts = {arg for op, arg in zip(self.ops, self.args)
+                 if op == OP_TEXT or op == OP_CHUNK or op == OP_PASTE}
+        for arg in texts:
+            chars.update(self.operands[arg])
+        return chars
+
+    def map_operands(self, key_resolver):
+        """把键名解析为后端的按键对象, 返回与 operands 对齐的新列表
+
+        在回放前调用一次, 热循环中就不再需要按名称查找按键。
+        """
+        resolved = list(self.operands)
+        done = set()
+        for op, arg in zip(self.ops, self.args):
+            if arg in done:
+                continue
+            done.add(arg)
+            if op == OP_TAP:
+                resolved[arg] = key_resolver(self.operands[arg])
+            elif op == OP_COMBO:
+                modifiers, key = self.operands[arg]
+                resolved[arg] = (tuple(key_resolver(m) for m in modifiers), key_resolver(key))
+        return resolved
+
+    def dumps(self):
+        """导出为只含基本类型的元组, 可用 marshal 写入磁盘缓存"""
+        self.flush()
+        return (self.interval, self.burst_chunk, self.total_steps, self.args.itemsize,
+                self.ops.tobytes(), self.args.tobytes(), self.delays.tobytes(),
+                tuple(self.operands))
+
+    @classmethod
+    def loads(cls, data):
+        """从 dumps 的结果重建计划, 数据不匹配时抛出 ValueError"""
+        interval, burst_chunk, total_steps, itemsize, ops, args, delays, operands = data
+        plan = cls(interval, burst_chunk)
+        if itemsize != plan.args.itemsize:
+            raise ValueError('数组格式不匹配')
+        plan.ops.frombytes(ops)
+        plan.args.frombytes(args)
+        plan.delays.frombytes(delays)
+        if not len(plan.ops) == len(plan.args) == len(plan.delays):
+            raise ValueError('数组长度不一致')
+        plan.operands = list(operands)
+        plan.total_steps = total_steps
+        return plan
+
+
+def compile_plan(text, newline_mode='Enter', interval=0.08, burst_chunk=0):
+    """把文本编译为按键计划, 换行按指定方式展开
+
+    burst_chunk 大于0时启用突发模式: 两个换行之间的普通文本按块交给后端一次
+    输入, 字符间隔改为作用于每个块。
+    """
+    # macro 模块依赖本模块, 因此在函数内导入
+    from .macro import newline_actions
+
+    actions = newline_actions(newline_mode)
+    if burst_chunk < 0:
+        raise ValueError(f"块大小不能为负数: {burst_chunk}")
+
+    plan = KeystrokePlan(interval, burst_chunk)
+    for i, line in enumerate(text.split('\n')):
+        if i:
+            for action in actions:
+                plan.add_action(action, interval)
+        plan.add_text(line, interval)
+    plan.flush()
+    return plan
+
+
+def compile_paste_plan(text, chunk_size=DEFAULT_PASTE_CHUNK, interval=MIN_PASTE_INTERVAL,
+                       type_instead=False):
+    """把文本编译为按块粘贴的计划, 换行随文本一起粘贴
+
+    每块之后至少等待 MIN_PASTE_INTERVAL 秒, 避免目标程序读取剪贴板之前
+    下一块就已经写入。目标程序是否真正接收了粘贴无法确认, 因此不会自动改用
+    逐字输入; 对忽略或拦截粘贴的目标由用户手动选择「粘贴(逐字)」, 即 type_instead:
+    同样按块划分进度, 但每个字符各一个节拍、按 interval 逐字输入, 不经过剪贴板。
+    """
+    if chunk_size < 1:
+        raise ValueError(f"块大小必须是正整数: {chunk_size}")
+    plan = KeystrokePlan(interval)
+    for start in range(0, len(text), chunk_size):
+        chunk = text[start:start + chunk_size]
+        if type_instead:
+            plan.add_text(chunk, interval)
+            # 每块单独一个文本动作, 进度仍按块计算
+            plan.flush()
+        else:
+            plan.add_paste(chunk, max(interval, MIN_PASTE_INTERVAL))
+    return plan
@@ -0,0 +1,162 @@
+"""大文档的只读分窗预览
+
+几MB的文本放进可编辑的输入框后, 自动换行和布局要遍历全部内容, 界面会长时间卡住。
+大文档模式下文本只保存在内存中, 开始时建立一次行首偏移索引, 预览控件只渲染窗口内
+可见的几十行; 滚动、跳转到行和查找都只改变窗口的起始行, 代价与文本大小无关。
+"""
+from array import array
+from bisect import bisect_right
+
+# 粘贴或载入的文本超过该字符数时改用大文档模式
+LARGE_TEXT_THRESHOLD = 512 * 1024
+
+# 预览中每行最多显示的字符数, 超长的行截断显示 (不影响实际输入)
+MAX_COLUMNS = 1000
+
+
+class LineIndex:
+    """文本的行首偏移索引, 建立一次后按行号或偏移取行"""
+
+    def __init__(self, text):
+        self.text = text
+        starts = array('q', [0])
+        append = starts.append
+        find = text.find
+        pos = find('\n')
+        while pos != -1:
+            append(pos + 1)
+            pos = find('\n', pos + 1)
+        self.starts = starts
+
+    @property
+    def line_count(self):
+        return len(self.starts)
+
+    def line(self, number, limit=None):
+        """第 number 行 (从0开始) 的内容, 不含换行符; limit 为最多取出的字符数"""
+        starts = self.starts
+        start = starts[number]
+        end = starts[number + 1] - 1 if number + 1 < len(starts) else len(self.text)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.text[start:end].rstrip('\r')
+
+    def line_of(self, offset):
+        """字符偏移所在的行号"""
+        return bisect_right(self.starts, offset) - 1
+
+    def find(self, needle, start=0, backward=False):
+        """从字符偏移 start 开始查找, 向后查找时找 start 之前的最后一处; 没有时返回-1"""
+        if backward:
+            return self.text.rfind(needle, 0, start)
+        return self.text.find(needle, start)
+
+
+class DocumentView:
+    """预览窗口的状态: 起始行、可见行数和当前的查找结果
+
+    不依赖任何界面工具包; 界面在大小变化时设置 rows, 滚动或查找后调用 render()
+    取得可见各行的文字重新绘制。
+    """
+
+    def __init__(self, index, rows=40, max_columns=MAX_COLUMNS):
+        self.index = index
+        self.rows = rows
+        self.max_columns = max_columns
+        self.top = 0
+        # 当前查找结果的字符偏移和长度, 跳转到行时为该行
+        self.match = None
+        # 最近一次查找是否从另一端重新开始
+        self.wrapped = False
+
+    @property
+    def last_top(self):
+        return max(0, self.index.line_count - self.rows)
+
+    def scroll_to(self, line):
+        self.top = min(max(0, int(line)), self.last_top)
+
+    def scroll(self, lines):
+        self.scroll_to(self.top + lines)
+
+    def page(self, pages):
+        self.scroll(pages * max(1, self.rows - 1))
+
+    def moveto(self, fraction):
+        """按滚动条位置 (0~1) 滚动"""
+        self.scroll_to(round(float(fraction) * self.index.line_count))
+
+    def fraction(self):
+        """可见部分在全文中的起止位置 (0~1), 用于设置滚动条"""
+        count = self.index.line_count
+        return self.top / count, min(1.0, (self.top + self.rows) / count)
+
+    def _reveal(self, line):
+        """行不在窗口内时滚动, 使其位于窗口上部三分之一处"""
+        if not self.top <= line < self.top + self.rows:
+            self.scroll_to(line - self.rows // 3)
+
+    def goto(self, number):
+        """跳转到第 number 行 (从1开始), 返回实际跳转到的行号"""
+        index = self.index
+        line = min(max(1, int(number)), index.line_count) - 1
+        self.match = (index.starts[line], len(index.line(line, self.max_columns)))
+        self._reveal(line)
+        return line + 1
+
+    def find(self, needle, backward=False):
+        """从当前结果 (没有时从窗口首行) 查找下一处或上一处, 到达一端后从另一端继续
+
+        找到时返回所在的行号 (从1开始), 没有时返回None。
+        """
+        index = self.index
+        self.wrapped = False
+        if not needle:
+            return None
+        if self.match is not None:
+            offset, length = self.match
+            start = offset if backward else offset + max(1, length)
+        else:
+            start = index.starts[self.top]
+        found = index.find(needle, start, backward)
+        if found == -1:
+            self.wrapped = True
+            found = index.find(needle, len(index.text) if backward else 0, backward)
+            if found == -1:
+                return None
+        self.match = (found, len(needle))
+        line = index.line_of(found)
+        self._reveal(line)
+        return line + 1
+
+    def gutter_width(self):
+        return len(str(self.index.line_count))
+
+    def render(self):
+        """可见各行的文字, 每行前面是右对齐的行号"""
+        index = self.index
+        width = self.gutter_width()
+        limit = self.max_columns
+        lines = []
+        for line in range(self.top, min(self.top + self.rows, index.line_count)):
+            text = index.line(line, limit + 1)
+            if len(text) > limit:
+                text = text[:limit] + '…'
+            lines.append(f"{line + 1:>{width}}  {text}")
+        return lines
+
+    def highlight(self):
+        """当前结果在 render() 结果中的 (行, 起始列, 结束列), 不可见时返回None"""
+        if self.match is None:
+            return None
+        index = self.index
+        offset, length = self.match
+        line = index.line_of(offset)
+        if not self.top <= line < self.top + self.rows:
+            return None
+        column = offset - index.starts[line]
+        if column >= self.max_columns:
+            return None
+        gutter = self.gutter_width() + 2
+        end = min(column + length, len(index.line(line, self.max_columns)))
+        return line - self.top, gutter + column, gutter + max(end, column)
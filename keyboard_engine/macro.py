@@ -0,0 +1,356 @@
+"""宏脚本: 把带控制指令的文本编译为预先定时的按键计划
+
+语法 (花括号内为指令, 其余为原样输入的文本):
+    {enter} {tab} {home} ...    单击特殊键, 也可以是单个字符, 如 {a}
+    {shift+tab} {ctrl+a}        组合键, 最后一个为主键, 其余为修饰键
+    {tab 3} {shift+tab 10}      按键后跟次数表示连续按下多次
+    {wait 0.5}                  等待指定秒数
+    {speed 0.02} / {speed}      之后的字符间隔改为指定秒数 / 恢复默认间隔
+    {repeat 3} ... {/repeat}    重复块, 可以嵌套; 块内的 speed 只作用于块内
+    {{ 和 }}                    原样输入花括号
+文本中的换行按所选的换行方式展开。
+
+脚本只在编译时解析和校验一次, 重复块直接展开, 结果是普通的 KeystrokePlan,
+回放时不再有任何解析。MacroCache 按内容哈希缓存编译结果, 可以同时写入磁盘。
+"""
+import hashlib
+import marshal
+import os
+from collections import OrderedDict
+from functools import lru_cache
+
+from .keystroke_plan import NEWLINE_MACROS, KeystrokePlan
+
+# 特殊键名称 (与 pynput 的 Key 成员同名)
+KEY_NAMES = frozenset([
+    'alt', 'alt_l', 'alt_r', 'backspace', 'caps_lock', 'cmd', 'cmd_l', 'cmd_r',
+    'ctrl', 'ctrl_l', 'ctrl_r', 'delete', 'down', 'end', 'enter', 'esc', 'home',
+    'insert', 'left', 'menu', 'num_lock', 'page_down', 'page_up', 'pause',
+    'print_screen', 'right', 'scroll_lock', 'shift', 'shift_l', 'shift_r', 'space',
+    'tab', 'up',
+] + [f'f{i}' for i in range(1, 21)])
+
+# 常用别名
+KEY_ALIASES = {
+    'return': 'enter', 'escape': 'esc', 'del': 'delete', 'bs': 'backspace',
+    'pgup': 'page_up', 'pgdn': 'page_down', 'control': 'ctrl', 'win': 'cmd',
+    'ins': 'insert',
+}
+
+# 展开重复块后允许的最大动作数, 防止误写的嵌套重复占满内存
+MAX_MACRO_ACTIONS = 10000000
+
+# 磁盘缓存格式版本, 格式变化时旧文件自动失效
+CACHE_FORMAT = 1
+
+
+class MacroError(ValueError):
+    """宏脚本语法错误, 附带出错的行号和列号"""
+
+    def __init__(self, message, line=None, column=None):
+        if line is not None:
+            message = f"第{line}行第{column}列: {message}"
+        super().__init__(message)
+        self.line = line
+        self.column = column
+
+
+def _position(source, index):
+    """字符下标对应的 (行号, 列号), 均从1开始"""
+    line = source.count('\n', 0, index) + 1
+    return line, index - (source.rfind('\n', 0, index) + 1) + 1
+
+
+def _key_name(name):
+    """校验并规范化一个键名, 无效时返回None"""
+    if len(name) == 1:
+        return name
+    name = name.lower()
+    name = KEY_ALIASES.get(name, name)
+    return name if name in KEY_NAMES else None
+
+
+def _number(text, kind):
+    """解析指令参数; kind 为 int 时要求正整数, 为 float 时要求非负数"""
+    try:
+        value = kind(text)
+    except ValueError:
+        return None
+    if kind is int:
+        return value if value >= 1 else None
+    return value if 0 <= value < float('inf') else None
+
+
+def parse_macro(source):
+    """把脚本解析为指令树, 语法错误时抛出 MacroError
+
+    节点为元组: ('text', 文本) ('tap', 键, 次数) ('combo', 修饰键, 键, 次数)
+    ('wait', 秒数) ('speed', 间隔或None) ('repeat', 次数, 子节点列表)。
+    """
+    root = []
+    # 打开的重复块: (节点列表, 开始位置)
+    stack = [(root, 0)]
+    text = []
+    index = 0
+    length = len(source)
+
+    def fail(message, at):
+        raise MacroError(message, *_position(source, at))
+
+    def flush_text():
+        if text:
+            stack[-1][0].append(('text', ''.join(text)))
+            text.clear()
+
+    while index < length:
+        char = source[index]
+        if char == '}':
+            if source.startswith('}}', index):
+                text.append('}')
+                index += 2
+                continue
+            fail("多余的 '}', 原样输入请写作 '}}'", index)
+        if char != '{':
+            end = index + 1
+            while end < length and source[end] not in '{}':
+                end += 1
+            text.append(source[index:end])
+            index = end
+            continue
+        if source.startswith('{{', index):
+            text.append('{')
+            index += 2
+            continue
+
+        close = source.find('}', index)
+        if close < 0:
+            fail("缺少 '}'", index)
+        body = source[index + 1:close]
+        if '{' in body or '\n' in body:
+            fail("缺少 '}'", index)
+        parts = body.split()
+        if not parts:
+            fail('空指令', index)
+        command = parts[0].lower()
+        argument = parts[1] if len(parts) > 1 else None
+        if len(parts) > 2:
+            fail(f"指令参数过多: {{{body}}}", index)
+        flush_text()
+        nodes = stack[-1][0]
+
+        if command == 'wait':
+            seconds = _number(argument, float) if argument is not None else None
+            if seconds is None:
+                fail(f"wait 需要一个非负的秒数: {{{body}}}", index)
+            nodes.append(('wait', seconds))
+        elif command == 'speed':
+            interval = None
+            if argument is not None:
+                interval = _number(argument, float)
+                if interval is None:
+                    fail(f"speed 需要一个非负的秒数: {{{body}}}", index)
+            nodes.append(('speed', interval))
+        elif command == 'repeat':
+            count = _number(argument, int) if argument is not None else None
+            if count is None:
+                fail(f"repeat 需要一个正整数: {{{body}}}", index)
+            block = []
+            nodes.append(('repeat', count, block))
+            stack.append((block, index))
+        elif command == '/repeat':
+            if argument is not None:
+                fail(f"指令参数过多: {{{body}}}", index)
+            if len(stack) == 1:
+                fail('多余的 {/repeat}', index)
+            stack.pop()
+        else:
+            count = 1
+            if argument is not None:
+                count = _number(argument, int)
+                if count is None:
+                    fail(f"按键次数必须是正整数: {{{body}}}", index)
+            # 单独的 '+' 是字符键, 否则 '+' 分隔修饰键和主键
+            names = [parts[0]] if parts[0] == '+' else parts[0].split('+')
+            keys = [_key_name(name) for name in names]
+            for name, key in zip(names, keys):
+                if key is None:
+                    fail(f"未知的按键: {name}", index)
+            if len(keys) == 1:
+                nodes.append(('tap', keys[0], count))
+            else:
+                nodes.append(('combo', tuple(keys[:-1]), keys[-1], count))
+        index = close + 1
+
+    flush_text()
+    if len(stack) > 1:
+        fail('缺少 {/repeat}', stack[-1][1])
+    return root
+
+
+def _count_actions(nodes):
+    """展开后的动作数上界, 用于在展开前拒绝过大的脚本"""
+    total = 0
+    for node in nodes:
+        kind = node[0]
+        if kind == 'text':
+            total += len(node[1])
+        elif kind in ('tap', 'combo'):
+            total += node[-1]
+        elif kind == 'repeat':
+            total += node[1] * _count_actions(node[2])
+        else:
+            total += 1
+    return total
+
+
+def _flatten(nodes):
+    """把不含换行和速度指令的指令树展开为 add_action 形式的动作序列"""
+    actions = []
+    for node in nodes:
+        kind = node[0]
+        if kind == 'text':
+            actions.append(node)
+        elif kind == 'tap':
+            actions.extend([('tap', node[1])] * node[2])
+        elif kind == 'combo':
+            actions.extend([('combo', node[1], node[2])] * node[3])
+        elif kind == 'wait':
+            actions.append(node)
+        elif kind == 'repeat':
+            actions.extend(_flatten(node[2]) * node[1])
+        else:
+            raise MacroError('换行片段中不能使用 speed')
+    return tuple(actions)
+
+
+@lru_cache(maxsize=None)
+def newline_actions(newline_mode):
+    """换行方式对应的动作序列, 由 NEWLINE_MACROS 中的宏片段编译而来"""
+    snippet = NEWLINE_MACROS.get(newline_mode)
+    if snippet is None:
+        raise ValueError(f"未知的换行方式: {newline_mode}")
+    return _flatten(parse_macro(snippet))
+
+
+def _emit(plan, nodes, interval, newline):
+    """把指令树展开写入计划; interval 为当前字符间隔, 重复块结束后恢复"""
+    default = plan.interval
+    for node in nodes:
+        kind = node[0]
+        if kind == 'text':
+            for i, line in enumerate(node[1].split('\n')):
+                if i:
+                    for action in newline:
+                        plan.add_action(action, interval)
+                plan.add_text(line, interval)
+        elif kind == 'tap':
+            for _ in range(node[2]):
+                plan.add_tap(node[1], interval)
+        elif kind == 'combo':
+            for _ in range(node[3]):
+                plan.add_combo(node[1], node[2], interval)
+        elif kind == 'wait':
+            plan.add_wait(node[1])
+        elif kind == 'speed':
+            interval = default if node[1] is None else node[1]
+        else:
+            for _ in range(node[1]):
+                _emit(plan, node[2], interval, newline)
+
+
+def compile_macro(source, interval=0.08, newline_mode='Enter', burst_chunk=0, cache=None):
+    """把宏脚本编译为按键计划; cache 为 MacroCache 时先按内容哈希查找"""
+    if cache is not None:
+        return cache.compile(source, interval, newline_mode, burst_chunk)
+    if burst_chunk < 0:
+        raise ValueError(f"块大小不能为负数: {burst_chunk}")
+    newline = newline_actions(newline_mode)
+    nodes = parse_macro(source)
+    if _count_actions(nodes) > MAX_MACRO_ACTIONS:
+        raise MacroError(f"展开后的动作超过 {MAX_MACRO_ACTIONS} 个, 请减少重复次数")
+    plan = KeystrokePlan(interval, burst_chunk)
+    _emit(plan, nodes, interval, newline)
+    plan.flush()
+    return plan
+
+
+def default_cache_dir():
+    """默认的磁盘缓存目录"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ikun-keyboard', 'macros')
+
+
+class MacroCache:
+    """按内容哈希缓存编译后的宏
+
+    键由脚本内容和所有编译参数共同决定, 内容不变时直接返回之前的计划。内存中
+    按最近使用保留 capacity 个; 指定 directory 时同时写入磁盘, 下次启动后
+    读取一个文件即可得到计划, 不再解析脚本。磁盘缓存读写失败时退回重新编译。
+    """
+
+    def __init__(self, directory=None, capacity=64):
+        self.directory = directory
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+
+    def key(self, source, interval, newline_mode, burst_chunk):
+        """脚本和编译参数的内容哈希"""
+        digest = hashlib.sha256()
+        header = f"{CACHE_FORMAT}\0{interval!r}\0{newline_mode}\0{burst_chunk}\0"
+        digest.update(header.encode('utf-8'))
+        digest.update(NEWLINE_MACROS.get(newline_mode, '').encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(source.encode('utf-8', 'surrogatepass'))
+        return digest.hexdigest()
+
+    def compile(self, source, interval=0.08, newline_mode='Enter', burst_chunk=0):
+        key = self.key(source, interval, newline_mode, burst_chunk)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = self._load(key)
+        if plan is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            plan = compile_macro(source, interval, newline_mode, burst_chunk)
+            self._store(key, plan)
+        self._plans[key] = plan
+        self._plans.move_to_end(key)
+        while len(self._plans) > self.capacity:
+            self._plans.popitem(last=False)
+        return plan
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.plan')
+
+    def _load(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                return KeystrokePlan.loads(marshal.load(f))
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+    def _store(self, key, plan):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        temp = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp, 'wb') as f:
+                marshal.dump(plan.dumps(), f)
+            # 先写临时文件再替换, 其他进程不会读到写了一半的文件
+            os.replace(temp, path)
+        except OSError:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+
+    def clear(self):
+        """清空内存中的缓存 (磁盘文件保留)"""
+        self._plans.clear()
@@ -0,0 +1,202 @@
+"""多会话并行运行
+
+同一个按键计划同时驱动多个会话, 每个会话有自己的输出端 (伪终端中运行的子进程
+或输出文件), 不需要多个界面窗口抢同一个键盘焦点。会话在进程池中执行, 每个进程
+有自己的解释器, 可以利用多个CPU核心; 计划只在主进程编译一次, 以序列化的形式
+交给各进程。运行结束后汇总所有会话的吞吐量。
+
+run_sessions_async 改为在一个线程的事件循环中以协程执行全部会话, 适合会话很多
+而每个会话间隔较长、CPU并不繁忙的情况。
+"""
+import os
+import threading
+import time
+
+from .backends import create_backend
+from .engine import TypingEngine
+from .keystroke_plan import KeystrokePlan
+
+# 子进程中共享的停止信号, 由进程池的初始化函数设置
+_stop = None
+
+
+def _init_session(stop):
+    """进程池中每个进程启动时调用; Ctrl+C 只由主进程处理, 再经停止信号转达"""
+    global _stop
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _stop = stop
+
+
+def run_session(index, plan_data, backend_name, options, repetitions=1, delay=0.0,
+                timing=None):
+    """在子进程中执行一个会话, 返回引擎的统计信息
+
+    timing 为 HumanTiming.to_dict() 的内容; 各会话的种子依次加上会话序号,
+    节奏彼此不同但可以复现。
+    """
+    plan = KeystrokePlan.loads(plan_data)
+    timing = _session_timing(timing, index)
+    backend = create_backend(backend_name, **options)
+    engine = TypingEngine(backend)
+    done = threading.Event()
+
+    def watch():
+        # 主进程请求停止时立即打断本会话的等待
+        while not done.is_set():
+            if _stop.wait(0.05):
+                engine.stop()
+                return
+
+    if _stop is not None:
+        threading.Thread(target=watch, daemon=True).start()
+    try:
+        result = engine.run(plan, repetitions, delay, timing=timing)
+    finally:
+        done.set()
+        backend.close()
+    return _session_result(result, index, backend)
+
+
+def _session_timing(timing, index):
+    """第 index 个会话的节奏; timing 为 HumanTiming.to_dict() 的内容或None"""
+    if timing is None:
+        return None
+    from .delay_profiles import HumanTiming
+    session = HumanTiming(timing['profile'], timing['wpm'])
+    # 各会话与主进程使用同一种生成实现
+    session.restore(dict(timing, seed=timing['seed'] + index))
+    return session
+
+
+def _session_result(result, index, backend):
+    result['session'] = index
+    result['pid'] = os.getpid()
+    if hasattr(backend, 'received'):
+        result['received'] = backend.received
+    return result
+
+
+def session_options(backend_name, index, output=None, command=None, log=None,
+                    encoding='utf-8'):
+    """第 index 个会话的后端参数; output 和 log 中的 {n} 替换为会话序号 (从1开始)"""
+    number = index + 1
+    if backend_name == 'pty':
+        options = {'command': command, 'encoding': encoding}
+        if log:
+            options['log'] = log.format(n=number)
+        return options
+    if backend_name == 'file':
+        return {'target': output.format(n=number), 'encoding': encoding}
+    return {}
+
+
+def run_sessions(plan, sessions, backend_name='file', processes=None, repetitions=1,
+                 delay=0.0, timing=None, **options):
+    """在进程池中并行执行 sessions 个会话, 返回各会话的统计和汇总
+
+    options 传给 session_options, 为各会话生成后端参数。主进程收到 Ctrl+C 时
+    停止所有会话, 已完成部分的统计照常返回。
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    if processes is None:
+        processes = min(sessions, os.cpu_count() or 1)
+    plan_data = plan.dumps()
+    timing_data = timing.to_dict() if timing is not None else None
+    stop = multiprocessing.Event()
+    started = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(processes, initializer=_init_session,
+                             initargs=(stop,)) as pool:
+        futures = [pool.submit(run_session, index, plan_data, backend_name,
+                               session_options(backend_name, index, **options),
+                               repetitions, delay, timing_data)
+                   for index in range(sessions)]
+        try:
+            for future in futures:
+                results.append(future.result())
+        except KeyboardInterrupt:
+            stop.set()
+            for future in futures:
+                future.cancel()
+            results = _stopped_results(futures)
+    elapsed = time.perf_counter() - started
+    return aggregate(results, elapsed, processes)
+
+
+def _stopped_results(futures):
+    """Ctrl+C 之后收集各会话的统计
+
+    已开始的会话收到停止信号后照常返回统计; 还没开始就被取消的会话和出错的会话
+    不计入汇总, 它们的异常不会盖过这次中断。
+    """
+    results = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception:
+            # 包括被取消的会话抛出的 concurrent.futures.CancelledError
+            continue
+    return results
+
+
+def run_sessions_async(plan, sessions, backend_name='file', repetitions=1, delay=0.0,
+                       timing=None, **options):
+    """在当前线程的事件循环中以协程同时执行 sessions 个会话, 返回与 run_sessions 相同的汇总
+
+    所有会话共用一个线程, 不需要进程池; Ctrl+C 停止所有会话 (仅限类Unix系统,
+    其他系统上 Ctrl+C 直接中断运行)。
+    """
+    import asyncio
+    import signal
+    from .async_engine import AsyncTypingEngine
+
+    timing_data = timing.to_dict() if timing is not None else None
+
+    async def run_all():
+        engines = []
+        try:
+            for index in range(sessions):
+                backend = create_backend(backend_name,
+                                         **session_options(backend_name, index, **options))
+                engines.append(AsyncTypingEngine(backend))
+            loop = asyncio.get_running_loop()
+            try:
+                loop.add_signal_handler(signal.SIGINT,
+                                        lambda: [engine.stop() for engine in engines])
+            except (NotImplementedError, RuntimeError):
+                pass
+            results = await asyncio.gather(*(
+                engine.run(plan, repetitions, delay, timing=_session_timing(timing_data, index))
+                for index, engine in enumerate(engines)))
+        finally:
+            for engine in engines:
+                engine.backend.close()
+        return [_session_result(result, index, engine.backend)
+                for index, (result, engine) in enumerate(zip(results, engines))]
+
+    started = time.perf_counter()
+    results = asyncio.run(run_all())
+    return aggregate(results, time.perf_counter() - started, 1)
+
+
+def aggregate(results, elapsed, processes):
+    """汇总各会话的统计: 总字符数按主进程测得的总耗时计算吞吐量"""
+    results = sorted(results, key=lambda r: r['session'])
+    units = sum(r['units'] for r in results)
+    return {
+        'sessions': results,
+        'total': {
+            'sessions': len(results),
+            'processes': processes,
+            'chars': units,
+            'elapsed': elapsed,
+            'achieved_rate': units / elapsed if elapsed > 0 else 0.0,
+            # 各会话自身速率之和; 与 achieved_rate 的差距反映进程启动和调度开销
+            'session_rate_sum': sum(r['achieved_rate'] for r in results),
+            'completed': bool(results) and all(
+                r['completed'] == r['repetitions'] for r in results),
+        },
+    }
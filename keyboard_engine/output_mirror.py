@@ -0,0 +1,70 @@
+"""工作线程输出的镜像缓冲"""
+import threading
+from collections import deque
+
+# 预览中保留的最大字符数
+DEFAULT_PREVIEW_CHARS = 4000
+
+
+class OutputMirror:
+    """只追加的输出缓冲
+
+    后端每输出一段文本只在锁内追加一次, 不触碰任何界面对象; 界面线程每帧调用
+    一次 flush() 取走新增的文本并更新预览。待取走的文本和预览都只保留末尾
+    max_preview 个字符, 因此界面线程长时间没有刷新 (例如窗口最小化) 时, 高速输出
+    占用的内存和重新布局的代价仍有上限。
+    """
+
+    def __init__(self, max_preview=DEFAULT_PREVIEW_CHARS):
+        self.max_preview = max_preview
+        self._lock = threading.Lock()
+        self._pending = deque()
+        # 待取走文本的字符数, 不超过 max_preview
+        self._pending_chars = 0
+        self._preview = ''
+        self.total = 0
+        self.flushes = 0
+
+    def write(self, text):
+        """追加一段输出, 可在任意线程调用"""
+        with self._lock:
+            self.total += len(text)
+            pending = self._pending
+            pending.append(text)
+            self._pending_chars += len(text)
+            # 超出预览长度的部分不会显示, 写入时就丢弃最早的文本
+            excess = self._pending_chars - self.max_preview
+            while excess > 0:
+                head = pending[0]
+                if len(head) <= excess:
+                    pending.popleft()
+                    self._pending_chars -= len(head)
+                    excess -= len(head)
+                else:
+                    pending[0] = head[excess:]
+                    self._pending_chars -= excess
+                    excess = 0
+
+    def flush(self):
+        """合并新增的输出并返回新的预览; 没有新输出时返回None"""
+        with self._lock:
+            pending, self._pending = self._pending, deque()
+            self._pending_chars = 0
+        if not pending:
+            return None
+        self.flushes += 1
+        self._preview = (self._preview + ''.join(pending))[-self.max_preview:]
+        return self._preview
+
+    @property
+    def preview(self):
+        return self._preview
+
+    def clear(self):
+        """清空缓冲和预览"""
+        with self._lock:
+            self._pending = deque()
+            self._pending_chars = 0
+            self.total = 0
+        self._preview = ''
+        self.flushes = 0
@@ -0,0 +1,90 @@
+"""容量固定的执行记录, 可选溢写到磁盘"""
+from collections import deque
+from itertools import islice
+
+# 内存中保留的记录条数
+DEFAULT_CAPACITY = 1000
+
+
+class RecordLog:
+    """执行记录的环形缓冲区
+
+    内存中只保留最近 capacity 条记录, 因此长时间运行时内存占用恒定。
+    spill 为True时所有记录同时追加到一个临时文件 (第一次写入时才创建), 为字符串
+    时追加到该路径;
+    保存时从溢写文件流式复制, 不在内存中拼接全部记录。
+    记录按追加顺序编号, 编号从0开始, 被挤出内存的记录编号不会复用。
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, spill=None):
+        self.capacity = capacity
+        self._recent = deque(maxlen=capacity)
+        self.total = 0
+        self.spill_path = None
+        self._spill = None
+        self._spill_pending = spill is True
+        if spill and spill is not True:
+            self.spill_path = spill
+            self._spill = open(spill, 'a+', encoding='utf-8')
+
+    def __len__(self):
+        return self.total
+
+    def append(self, record):
+        """追加一条记录"""
+        self.extend((record,))
+
+    def extend(self, records):
+        """追加一批记录, 溢写文件整批只写一次"""
+        records = list(records)
+        if not records:
+            return
+        self._recent.extend(records)
+        self.total += len(records)
+        if self._spill_pending:
+            # 推迟到第一条记录时再创建临时文件, 不拖慢启动
+            import tempfile
+            self._spill = tempfile.TemporaryFile('w+', encoding='utf-8')
+            self._spill_pending = False
+        if self._spill is not None:
+            self._spill.write('\n'.join(records) + '\n')
+
+    @property
+    def first_index(self):
+        """内存中最早一条记录的编号"""
+        return self.total - len(self._recent)
+
+    def window(self, start, count):
+        """取出从编号 start 开始的至多 count 条内存中的记录"""
+        offset = max(0, start - self.first_index)
+        return list(islice(self._recent, offset, offset + count))
+
+    def recent(self, count):
+        """最近的 count 条记录"""
+        return self.window(self.total - count, count)
+
+    @property
+    def complete(self):
+        """是否能保存全部记录 (有溢写文件或还没有记录被挤出内存)"""
+        return self._spill is not None or self._spill_pending or self.first_index == 0
+
+    def save(self, path, encoding='utf-8'):
+        """把记录写入 path; 有溢写文件时流式复制全部记录, 否则写出内存中的记录"""
+        with open(path, 'w', encoding=encoding) as f:
+            if self._spill is None:
+                f.write('\n'.join(self._recent))
+                return
+            import shutil
+            self._spill.flush()
+            self._spill.seek(0)
+            try:
+                shutil.copyfileobj(self._spill, f)
+            finally:
+                self._spill.seek(0, 2)
+
+    def close(self):
+        """关闭溢写文件 (临时文件随之删除)"""
+        self._spill_pending = False
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
@@ -0,0 +1,286 @@
+"""断点续打日志
+
+长时间的重复输入被关闭或崩溃打断后, 可以从最后落盘的位置继续, 不必从头再输入。
+日志是只追加写入的 JSON Lines 文件: 每次运行先写一条 start 记录 (文本哈希、参数
+和文本来源), 运行期间由后台线程按固定间隔读取引擎的检查点, 位置变化时追加一条
+progress 记录并 fsync, 结束时写一条 end 记录。输入的热循环本身不做任何写入;
+崩溃时最多丢失一个间隔的进度, 继续时重新输入这一小段。
+
+日志只保存最近一次运行, 同一时刻只能有一次运行在写。文本框中的文本另存为一个文件
+(与上次运行的文本相同时不再重写), 文件输入只记录路径、大小和修改时间, 继续之前
+核对文本和文件都没有变化。
+"""
+import errno
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from .engine import Checkpoint
+
+JOURNAL_NAME = 'resume.jsonl'
+TEXT_NAME = 'resume.txt'
+
+# 两次落盘之间的最长秒数
+FLUSH_INTERVAL = 1.0
+
+# 可以继续的运行: 哈希、参数、文本 (没有时为None)、各输入文件的路径、检查点以及
+# 上次运行的节奏配置 (delay_profiles.HumanTiming.to_dict(), 没有时为None)
+ResumeState = namedtuple('ResumeState', 'digest params text files checkpoint timing')
+
+
+def default_journal_dir():
+    """默认的日志目录"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'ikun-keyboard', 'journal')
+
+
+def file_identity(path):
+    """文件的绝对路径、大小和修改时间, 用于判断文件是否变化"""
+    st = os.stat(path)
+    return {'path': os.path.abspath(path), 'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+def fingerprint(params, text=None, files=None):
+    """参数、文本和输入文件共同决定的哈希; 三者不变时检查点的位置才有意义"""
+    digest = hashlib.sha256()
+    header = json.dumps([params, files or {}], sort_keys=True, ensure_ascii=False)
+    digest.update(header.encode('utf-8'))
+    digest.update(b'\0')
+    if text is not None:
+        digest.update(text.encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+def text_digest(text):
+    """文本本身的哈希, 用于判断另存的文本文件是否需要重写"""
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+def _fsync_write(path, text):
+    """先写临时文件并落盘再替换, 崩溃时不会留下写了一半的文件"""
+    temp = f"{path}.{os.getpid()}.tmp"
+    with open(temp, 'w', encoding='utf-8', errors='surrogatepass', newline='') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+class ResumeJournal:
+    """一个目录中的续打日志"""
+
+    def __init__(self, directory=None, interval=FLUSH_INTERVAL):
+        self.directory = directory if directory is not None else default_journal_dir()
+        self.interval = interval
+        self.path = os.path.join(self.directory, JOURNAL_NAME)
+        self.text_path = os.path.join(self.directory, TEXT_NAME)
+        # 正在写日志的 JournalRecorder; 同时执行的任务可能在不同线程中开始, 用锁判断
+        self.active = None
+        self._lock = threading.Lock()
+
+    def _claim(self, recorder):
+        """开始写日志; 已有另一次运行在写时抛出 OSError (EBUSY)"""
+        with self._lock:
+            if self.active is not None:
+                # 两次运行交替写同一个日志会使其中记录的位置失去意义
+                raise OSError(errno.EBUSY, '续打日志正被另一个任务使用')
+            self.active = recorder
+
+    def _release(self, recorder):
+        with self._lock:
+            if self.active is recorder:
+                self.active = None
+
+    def recorder(self, params, text=None, files=None, timing=None):
+        """为一次运行创建日志写入器
+
+        params 为决定按键计划的参数 (可JSON序列化), files 为 {名称: 路径}。
+        timing 为 HumanTiming 时记录其种子, 继续时可以沿用; 节奏不影响位置。
+        """
+        return JournalRecorder(self, params, text, files, timing)
+
+    def _records(self):
+        """读出日志的全部记录; 崩溃时没写完的最后一行被忽略"""
+        records = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break
+        except OSError:
+            return []
+        return records
+
+    def _start_record(self):
+        """只读出日志的第一条记录, 没有或无法解析时返回None"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+    def load(self):
+        """上一次没有完成的运行, 没有时返回None
+
+        日志已损坏, 或文本、输入文件在那之后被修改时抛出 ValueError; 调用方应当
+        提示后用 clear() 丢弃日志, 从头开始。
+        """
+        records = self._records()
+        if not records or records[0].get('event') != 'start':
+            return None
+        start = records[0]
+        last = records[-1]
+        if last.get('event') == 'end' and last.get('finished'):
+            return None
+        try:
+            return self._resume_state(start, last)
+        except (KeyError, TypeError, AttributeError):
+            raise ValueError('续打日志已损坏') from None
+
+    def _resume_state(self, start, last):
+        """按 start 记录核对文本和输入文件, 得到从最后一条记录的位置继续的运行"""
+        text = None
+        if start.get('text'):
+            try:
+                with open(self.text_path, 'r', encoding='utf-8', errors='surrogatepass',
+                          newline='') as f:
+                    text = f.read()
+            except OSError as e:
+                raise ValueError(f"无法读取上次运行的文本: {e}") from None
+        paths = {name: identity['path'] for name, identity in start['files'].items()}
+        try:
+            files = {name: file_identity(path) for name, path in paths.items()}
+        except OSError as e:
+            raise ValueError(f"上次运行的输入文件不可用: {e}") from None
+        if fingerprint(start['params'], text, files) != start['digest']:
+            raise ValueError('文本或输入文件在上次运行之后已改变, 无法继续')
+        checkpoint = Checkpoint(last.get('repetition', 0), last.get('offset', 0))
+        return ResumeState(start['digest'], start['params'], text, paths, checkpoint,
+                           start.get('timing'))
+
+    def clear(self):
+        """删除日志, 之后 load() 返回None"""
+        for path in (self.path, self.text_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class JournalRecorder:
+    """一次运行的日志写入
+
+    工作线程在运行前调用 start(), 结束后 (包括停止和出错) 调用 stop()。
+    """
+
+    def __init__(self, journal, params, text=None, files=None, timing=None):
+        self.journal = journal
+        self.params = params
+        self.text = text
+        self.files = {name: file_identity(path) for name, path in (files or {}).items()}
+        self.digest = fingerprint(params, text, self.files)
+        self.text_digest = text_digest(text) if text is not None else None
+        self.timing = timing
+        self._engine = None
+        self._file = None
+        self._thread = None
+        self._done = threading.Event()
+        self._last = None
+        # 已落盘的记录条数, 便于观察写入频率
+        self.writes = 0
+
+    def start(self, engine, start=None):
+        """写入 start 记录并开始按间隔记录引擎的检查点
+
+        会落盘等待, 不要在界面线程调用。另存的文本与上次运行相同时不再重写。
+        """
+        journal = self.journal
+        journal._claim(self)
+        try:
+            os.makedirs(journal.directory, exist_ok=True)
+            saved = self.text is not None and self._text_saved()
+            # 先清空日志再替换文本: 中途崩溃时不会留下与文本不符的 start 记录
+            self._file = open(journal.path, 'w', encoding='utf-8')
+            if self.text is not None and not saved:
+                _fsync_write(journal.text_path, self.text)
+            self._engine = engine
+            self._last = Checkpoint(*start) if start is not None else Checkpoint(0, 0)
+            self._write({
+                'event': 'start',
+                'time': time.time(),
+                'digest': self.digest,
+                'params': self.params,
+                'text': self.text is not None,
+                'text_digest': self.text_digest,
+                'files': self.files,
+                'timing': self.timing.to_dict() if self.timing is not None else None,
+                'repetition': self._last.repetition,
+                'offset': self._last.offset,
+            })
+        except OSError:
+            self._close()
+            raise
+        self._thread = threading.Thread(target=self._loop, name='resume-journal', daemon=True)
+        self._thread.start()
+
+    def _text_saved(self):
+        """另存的文本文件是否就是本次的文本 (按上次 start 记录中的哈希判断)"""
+        previous = self.journal._start_record()
+        if previous is None or previous.get('text_digest') != self.text_digest:
+            return False
+        return os.path.exists(self.journal.text_path)
+
+    def _write(self, record):
+        """追加一条记录并落盘"""
+        f = self._file
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+        self.writes += 1
+
+    def _loop(self):
+        while not self._done.wait(self.journal.interval):
+            try:
+                self._record_progress()
+            except OSError:
+                # 磁盘写满等错误不影响输入, 只是停止记录
+                return
+
+    def _record_progress(self):
+        checkpoint = self._engine.checkpoint()
+        # 位置只会前进; 没有变化 (例如暂停中) 时不写入
+        if checkpoint <= self._last:
+            return
+        self._last = checkpoint
+        self._write({'event': 'progress', 'repetition': checkpoint.repetition,
+                     'offset': checkpoint.offset})
+
+    def stop(self, result=None):
+        """写入 end 记录并关闭日志; result 为引擎返回的统计, 出错时为None
+
+        与 start() 一样会落盘等待, 不要在界面线程调用。
+        """
+        if self._file is None:
+            return
+        self._done.set()
+        self._thread.join()
+        checkpoint = self._engine.checkpoint()
+        finished = result is not None and not result['stopped']
+        try:
+            self._write({'event': 'end', 'time': time.time(), 'finished': finished,
+                         'repetition': checkpoint.repetition, 'offset': checkpoint.offset})
+        except OSError:
+            pass
+        finally:
+            self._close()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.journal._release(self)
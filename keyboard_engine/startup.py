@@ -0,0 +1,95 @@
+"""启动耗时记录和延迟导入
+
+界面脚本最先导入本模块, 计时从此刻开始; 之后在导入完成、窗口创建、第一帧
+和延迟构建的面板完成等阶段调用 mark()。设置环境变量 IKUN_STARTUP_REPORT
+后, 启动完成时输出各阶段耗时: 值为 1 或 - 时写到标准错误, 否则作为JSON文件路径。
+"""
+import importlib
+import json
+import os
+import sys
+import time
+
+REPORT_ENV = 'IKUN_STARTUP_REPORT'
+
+# 从计时开始到第一帧的预算秒数, 超出时在报告中标出
+FIRST_FRAME_BUDGET = 0.5
+
+
+class StartupTimer:
+    """按顺序记录启动各阶段距计时开始的秒数"""
+
+    def __init__(self, clock=time.perf_counter, budget=FIRST_FRAME_BUDGET):
+        self.clock = clock
+        self.budget = budget
+        self.origin = clock()
+        self.marks = []
+        self.reported = False
+
+    def mark(self, name):
+        """记录一个阶段的完成时刻, 返回距计时开始的秒数"""
+        elapsed = self.clock() - self.origin
+        self.marks.append((name, elapsed))
+        return elapsed
+
+    def get(self, name):
+        for mark, elapsed in self.marks:
+            if mark == name:
+                return elapsed
+        return None
+
+    def to_dict(self):
+        first_frame = self.get('first_frame')
+        return {
+            'marks': dict(self.marks),
+            'budget': self.budget,
+            'over_budget': first_frame is not None and first_frame > self.budget,
+        }
+
+    def format(self):
+        """每个阶段一行: 累计耗时和与上一阶段的差值"""
+        lines = []
+        previous = 0.0
+        for name, elapsed in self.marks:
+            lines.append(f"{name:<16}{elapsed * 1000:8.1f}ms  (+{(elapsed - previous) * 1000:.1f}ms)")
+            previous = elapsed
+        first_frame = self.get('first_frame')
+        if first_frame is not None and first_frame > self.budget:
+            lines.append(f"第一帧超出预算 {self.budget * 1000:.0f}ms")
+        return '\n'.join(lines)
+
+    def report(self, target=None):
+        """按环境变量 (或 target) 输出一次报告, 未设置时什么也不做"""
+        if target is None:
+            target = os.environ.get(REPORT_ENV)
+        if not target or self.reported:
+            return
+        self.reported = True
+        if target in ('1', '-'):
+            print('启动耗时:\n' + self.format(), file=sys.stderr)
+        else:
+            with open(target, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+# 界面脚本共用的计时器, 在导入本模块时开始计时
+timer = StartupTimer()
+
+
+class LazyModule:
+    """第一次访问属性时才导入的模块, 用于启动时用不到的对话框等"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+
+def lazy_import(name):
+    """返回一个在第一次使用时才真正导入 name 的模块代理"""
+    return LazyModule(name)
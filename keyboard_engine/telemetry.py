@@ -0,0 +1,230 @@
+"""运行遥测: 后端调用耗时、按键间隔、抖动、每轮速率与剩余时间估计
+
+所有分布都记录在对数分桶的直方图中而不是保存原始样本, 因此无论运行多久,
+内存占用都是固定的。
+"""
+import csv
+import json
+import math
+import time
+from collections import deque
+
+# 每轮速率最多保留的条数
+MAX_REPETITION_RECORDS = 1000
+
+
+class LogHistogram:
+    """对数分桶直方图, 单位为秒
+
+    默认范围 1微秒 ~ 100秒, 每个数量级分20个桶, 相邻桶边界相差约12%。
+    小于下限的值计入第一个桶, 大于上限的值计入最后一个桶。
+    """
+
+    def __init__(self, low=1e-6, high=100.0, buckets_per_decade=20):
+        self.low = low
+        self.buckets_per_decade = buckets_per_decade
+        self._log_low = math.log10(low)
+        size = int(math.ceil((math.log10(high) - self._log_low) * buckets_per_decade))
+        self.counts = [0] * size
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """记录一个样本"""
+        if value > self.low:
+            index = int((math.log10(value) - self._log_low) * self.buckets_per_decade)
+            if index >= len(self.counts):
+                index = len(self.counts) - 1
+        else:
+            index = 0
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def bounds(self, index):
+        """第 index 个桶的上下边界"""
+        step = 1.0 / self.buckets_per_decade
+        return (10 ** (self._log_low + index * step), 10 ** (self._log_low + (index + 1) * step))
+
+    def quantile(self, q):
+        """估计分位数, 返回所在桶的几何中点 (限制在实际的最小值和最大值之间)"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                low, high = self.bounds(index)
+                return min(max(math.sqrt(low * high), self.min), self.max)
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def to_dict(self):
+        """导出统计值和非空的桶"""
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': [list(self.bounds(i)) + [count]
+                        for i, count in enumerate(self.counts) if count],
+        }
+
+
+class RunTelemetry:
+    """一次运行的遥测数据
+
+    引擎在回放时用 instrument() 包装后端的输出方法和调度器的 tick, 记录:
+    latency 每次后端调用的耗时; spacing 相邻两次调用的实际间隔;
+    jitter 实际间隔与请求间隔之差的绝对值。
+    每轮结束时记录该轮的输出量和速率。后端带有字符翻译缓存时, 引擎把它
+    设为 translator, 摘要和导出中附带缓存命中率。界面线程可以随时读取摘要。
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.latency = LogHistogram()
+        self.spacing = LogHistogram()
+        self.jitter = LogHistogram()
+        self.repetitions = deque(maxlen=MAX_REPETITION_RECORDS)
+        self.start_time = None
+        self.end_time = None
+        self._last_call = None
+        self._requested = 0.0
+        self._rep_start = None
+        self._rep_units = 0
+        self._rep_index = 0
+        self.translator = None
+
+    def begin(self, units=0):
+        """在开始输入时调用, units 为调度器当前已登记的单位数"""
+        self.start_time = self._rep_start = self.clock()
+        self.end_time = None
+        self._rep_units = units
+        self._last_call = None
+        self._requested = 0.0
+
+    def end_repetition(self, units):
+        """一轮执行完成时调用, units 为调度器累计登记的单位数"""
+        now = self.clock()
+        count = units - self._rep_units
+        elapsed = now - self._rep_start
+        self._rep_index += 1
+        self.repetitions.append({
+            'repetition': self._rep_index,
+            'units': count,
+            'elapsed': elapsed,
+            'rate': count / elapsed if elapsed > 0 else 0.0,
+        })
+        self._rep_start = now
+        self._rep_units = units
+
+    def instrument(self, func):
+        """包装一个后端输出方法, 记录耗时和与上一次调用的间隔"""
+        clock = self.clock
+
+        def timed(*args):
+            start = clock()
+            result = func(*args)
+            end = clock()
+            self.latency.add(end - start)
+            last = self._last_call
+            if last is not None:
+                spacing = start - last
+                self.spacing.add(spacing)
+                self.jitter.add(abs(spacing - self._requested))
+            self._last_call = start
+            self._requested = 0.0
+            return result
+        return timed
+
+    def instrument_tick(self, tick, default_interval):
+        """包装调度器的 tick, 累加两次调用之间请求的间隔 (包括等待动作)"""
+        def timed_tick(interval=None, units=1):
+            self._requested += default_interval if interval is None else interval
+            return tick(interval, units)
+        return timed_tick
+
+    def finish(self):
+        """冻结结束时间"""
+        if self.start_time is not None and self.end_time is None:
+            self.end_time = self.clock()
+
+    def elapsed(self):
+        if self.start_time is None:
+            return 0.0
+        end = self.end_time if self.end_time is not None else self.clock()
+        return end - self.start_time
+
+    def eta(self, done, total):
+        """按开始以来的平均速率估计剩余秒数; 无法估计时返回None"""
+        elapsed = self.elapsed()
+        if done <= 0 or elapsed <= 0:
+            return None
+        return max(0.0, total - done) * elapsed / done
+
+    def to_dict(self):
+        data = {
+            'elapsed': self.elapsed(),
+            'latency': self.latency.to_dict(),
+            'spacing': self.spacing.to_dict(),
+            'jitter': self.jitter.to_dict(),
+            'repetitions': list(self.repetitions),
+        }
+        if self.translator is not None:
+            data['translation'] = self.translator.stats()
+        return data
+
+    def summary(self, done=None, total=None):
+        """适合显示在界面上的一行摘要"""
+        text = (f"调用耗时 p50 {self.latency.quantile(0.5) * 1000:.2f}ms "
+                f"p99 {self.latency.quantile(0.99) * 1000:.2f}ms | "
+                f"间隔抖动 p90 {self.jitter.quantile(0.9) * 1000:.2f}ms")
+        if self.repetitions:
+            text += f" | 上一轮 {self.repetitions[-1]['rate']:.1f}/秒"
+        if self.translator is not None:
+            text += f" | {self.translator.summary()}"
+        if done is not None and total is not None:
+            eta = self.eta(done, total)
+            if eta is not None:
+                text += f" | 剩余约 {eta:.0f}秒"
+        return text
+
+    def export(self, path):
+        """导出到文件: .csv 后缀写为表格, 其余写为JSON"""
+        if path.lower().endswith('.csv'):
+            self._export_csv(path)
+        else:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def _export_csv(self, path):
+        """每行一个直方图桶或一轮执行"""
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['type', 'name', 'low', 'high', 'count', 'value'])
+            for name in ('latency', 'spacing', 'jitter'):
+                histogram = getattr(self, name)
+                for index, count in enumerate(histogram.counts):
+                    if count:
+                        low, high = histogram.bounds(index)
+                        writer.writerow(['histogram', name, low, high, count, ''])
+            for rep in self.repetitions:
+                writer.writerow(['repetition', rep['repetition'], '', '', rep['units'],
+                                 rep['rate']])
+            if self.translator is not None:
+                for name, value in self.translator.stats().items():
+                    writer.writerow(['translation', name, '', '', '', value])
@@ -0,0 +1,207 @@
+"""按数据行填充模板: 从CSV或JSONL文件逐行读取, 每行渲染一次模板后输入
+
+模板只解析一次; 数据行在回放时才读取、渲染和编译, 每行是一个独立的片段,
+因此无论数据文件有多少行, 内存中同时只存在当前这一行的文本和按键计划。
+"""
+import copy
+import csv
+import json
+import os
+import re
+import time
+
+from .keystroke_plan import compile_plan
+
+# 按JSONL读取的文件后缀, 其余按CSV读取
+JSONL_EXTENSIONS = ('.jsonl', '.ndjson')
+
+# {timestamp} 的格式
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+_TOKEN = re.compile(r'\{\{|\}\}|\{([^{}]*)\}|[{}]')
+
+# 行号和时间戳占位符
+_INDEX = object()
+_TIMESTAMP = object()
+
+
+class Template:
+    """预先解析的模板
+
+    占位符: {row.字段} 当前行的字段 (JSONL 可用 {row.a.b} 访问嵌套字段);
+    {i} 从1开始的行号; {timestamp} 渲染时的本地时间; {{ 和 }} 原样输出花括号。
+    """
+
+    def __init__(self, source):
+        self.source = source
+        # 字符串为原文, 元组为字段路径, 其余为 _INDEX / _TIMESTAMP
+        self.parts = []
+        # 模板引用的顶层字段名, 用于按CSV表头校验
+        self.fields = set()
+        literal = []
+        position = 0
+        for match in _TOKEN.finditer(source):
+            literal.append(source[position:match.start()])
+            position = match.end()
+            token = match.group()
+            if token in ('{{', '}}'):
+                literal.append(token[0])
+                continue
+            name = match.group(1)
+            if name is None:
+                line = source.count('\n', 0, match.start()) + 1
+                raise ValueError(f"模板第{line}行: 多余的 '{token}', 原样输出请写作 '{token * 2}'")
+            part = self._placeholder(name.strip(), source.count('\n', 0, match.start()) + 1)
+            self.parts.append(''.join(literal))
+            literal = []
+            self.parts.append(part)
+        literal.append(source[position:])
+        self.parts.append(''.join(literal))
+        self.parts = [part for part in self.parts if part != '']
+
+    def _placeholder(self, name, line):
+        if name == 'i':
+            return _INDEX
+        if name == 'timestamp':
+            return _TIMESTAMP
+        if name.startswith('row.') and len(name) > 4:
+            path = tuple(name[4:].split('.'))
+            if '' not in path:
+                self.fields.add(path[0])
+                return path
+        raise ValueError(f"模板第{line}行: 未知的占位符 {{{name}}}, "
+                         f"可用 {{row.字段}}、{{i}} 和 {{timestamp}}")
+
+    @property
+    def reproducible(self):
+        """同一行数据每次渲染的结果是否相同; 含 {timestamp} 时不同"""
+        return _TIMESTAMP not in self.parts
+
+    def render(self, row, index):
+        """用一行数据渲染模板, index 为从1开始的行号"""
+        out = []
+        for part in self.parts:
+            if part.__class__ is str:
+                out.append(part)
+            elif part is _INDEX:
+                out.append(str(index))
+            elif part is _TIMESTAMP:
+                out.append(time.strftime(TIMESTAMP_FORMAT))
+            else:
+                out.append(_lookup(row, part, index))
+        return ''.join(out)
+
+
+def _lookup(row, path, index):
+    """按字段路径取值并转换为文本"""
+    value = row
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, TypeError):
+            raise ValueError(f"第{index}行缺少字段: {'.'.join(path)}") from None
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value)
+
+
+def is_jsonl(path):
+    return path.lower().endswith(JSONL_EXTENSIONS)
+
+
+def iter_rows(path, encoding='utf-8-sig'):
+    """逐行产生字典; CSV 的第一行为表头, JSONL 每个非空行是一个JSON对象"""
+    if not is_jsonl(path):
+        with open(path, 'r', encoding=encoding, newline='') as f:
+            yield from csv.DictReader(f)
+        return
+    with open(path, 'r', encoding=encoding) as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"第{number}行不是有效的JSON: {e}") from None
+            if not isinstance(row, dict):
+                raise ValueError(f"第{number}行不是JSON对象")
+            yield row
+
+
+def count_rows(path, encoding='utf-8-sig'):
+    """不解析内容地统计数据行数, 与 iter_rows 产生的行数一致"""
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        if is_jsonl(path):
+            return sum(1 for line in f if line.strip())
+        # 与 DictReader 一样跳过空行, 引号内的换行不会被当作新行
+        return max(0, sum(1 for row in csv.reader(f) if row) - 1)
+
+
+def read_header(path, encoding='utf-8-sig'):
+    """CSV 的表头; JSONL 没有表头, 返回None"""
+    if is_jsonl(path):
+        return None
+    with open(path, 'r', encoding=encoding, newline='') as f:
+        return next(csv.reader(f), [])
+
+
+class TemplateSource:
+    """数据文件和模板, 作为 TypingEngine.run_segments 的片段来源
+
+    每行数据渲染为一个片段, 进度权重为1, 进度条和剩余时间因此都按行数计算。
+    相邻两行之间插入 separator (默认一个换行, 按所选的换行方式展开)。
+    """
+
+    def __init__(self, template, path, encoding='utf-8-sig', separator='\n'):
+        self.template = template if isinstance(template, Template) else Template(template)
+        self.path = path
+        self.encoding = encoding
+        self.separator = separator
+        self.header = read_header(path, encoding)
+        self.rows = count_rows(path, encoding)
+        self._check_fields()
+
+    def _check_fields(self):
+        """CSV 按表头检查模板引用的字段; JSONL 在渲染到缺少字段的行时才报错"""
+        if self.header is not None:
+            missing = self.template.fields.difference(self.header)
+            if missing:
+                raise ValueError(f"数据表头中没有这些字段: {', '.join(sorted(missing))}")
+
+    def with_template(self, template):
+        """换用另一个模板, 沿用已统计的行数"""
+        source = copy.copy(self)
+        source.template = template if isinstance(template, Template) else Template(template)
+        source._check_fields()
+        return source
+
+    def __iter__(self):
+        """依次产生每行渲染后的文本 (第一行之后带分隔符)"""
+        render = self.template.render
+        for index, row in enumerate(iter_rows(self.path, self.encoding), 1):
+            text = render(row, index)
+            yield text if index == 1 else self.separator + text
+
+    def segments(self, newline_mode='Enter', interval=0.08, burst_chunk=0):
+        """产生 (按键计划, 行数) 供 TypingEngine.run_segments 使用"""
+        carried = 0
+        for text in self:
+            plan = compile_plan(text, newline_mode, interval, burst_chunk)
+            carried += 1
+            # 渲染为空的行把进度顺延到下一行
+            if len(plan):
+                yield plan, carried
+                carried = 0
+
+    @property
+    def reproducible(self):
+        """重新回放时是否产生相同的文本; 不同时续打日志的位置没有意义, 不应记录"""
+        return self.template.reproducible
+
+    def describe(self):
+        """适合显示在界面上的数据说明"""
+        return f"{os.path.basename(self.path)} ({self.rows}行)"
@@ -0,0 +1,69 @@
+"""大文件的流式文本来源
+
+文件按固定大小的块读取和解码, 每块单独编译为按键计划后立即交给引擎回放,
+因此无论文件多大, 内存中同时只存在一个块及其计划。
+"""
+import codecs
+import io
+import os
+
+from .keystroke_plan import compile_plan
+
+# 默认每次读取的字节数
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class FileTextSource:
+    """按块读取文本文件, 并记录每块对应的字节范围"""
+
+    def __init__(self, path, encoding='utf-8', chunk_size=DEFAULT_CHUNK_SIZE):
+        self.path = path
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(path)
+        # 校验编码名称, 避免运行到一半才报错
+        codecs.lookup(encoding)
+
+    def __iter__(self):
+        """依次产生 (文本块, 起始字节偏移, 结束字节偏移)
+
+        换行统一转换为 '\\n'; 跨块的多字节字符和 '\\r\\n' 由增量解码器正确拼接。
+        """
+        decoder = io.IncrementalNewlineDecoder(
+            codecs.getincrementaldecoder(self.encoding)(errors='replace'), translate=True)
+        start = offset = 0
+        with open(self.path, 'rb') as f:
+            while True:
+                raw = f.read(self.chunk_size)
+                final = not raw
+                text = decoder.decode(raw, final=final)
+                offset += len(raw)
+                if text:
+                    yield text, start, offset
+                    start = offset
+                if final:
+                    break
+
+    def segments(self, newline_mode='Enter', interval=0.08, burst_chunk=0):
+        """产生 (按键计划, 字节数) 供 TypingEngine.run_segments 使用"""
+        carried = 0
+        for text, start, end in self:
+            plan = compile_plan(text, newline_mode, interval, burst_chunk)
+            carried += end - start
+            # 没有产生动作的块 (如被解码器暂存的半个字符) 把字节数顺延到下一块
+            if len(plan):
+                yield plan, carried
+                carried = 0
+
+    def describe(self):
+        """适合显示在界面上的文件说明"""
+        return f"{os.path.basename(self.path)} ({format_size(self.size)})"
+
+
+def format_size(size):
+    """把字节数格式化为便于阅读的形式"""
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f}{unit}" if unit == 'B' else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}GB"
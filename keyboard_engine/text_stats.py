@@ -0,0 +1,58 @@
+"""按编辑增量维护的文本统计"""
+
+# 编辑停止多久之后刷新统计标签 (秒)
+STATS_DEBOUNCE = 0.15
+
+
+class TextStats:
+    """字符数与行数统计
+
+    只在载入或粘贴时对全文重新计数, 平时由输入框报告每次插入和删除的文本,
+    统计按增量更新, 代价与编辑量成正比而与文档大小无关。
+    """
+
+    __slots__ = ('chars', 'newlines', '_shown')
+
+    def __init__(self, text=''):
+        self._shown = None
+        self.reset(text)
+
+    def reset(self, text):
+        """对全文重新计数"""
+        self.chars = len(text)
+        self.newlines = text.count('\n')
+
+    def insert(self, text):
+        """登记一次插入"""
+        self.chars += len(text)
+        self.newlines += text.count('\n')
+
+    def remove(self, text):
+        """登记一次删除"""
+        self.chars -= len(text)
+        self.newlines -= text.count('\n')
+
+    def apply(self, chars, newlines):
+        """直接登记字符数和换行数的变化量"""
+        self.chars += chars
+        self.newlines += newlines
+
+    @property
+    def lines(self):
+        return self.newlines + 1
+
+    def label(self):
+        """统计标签文本"""
+        return f"字符数: {self.chars} | 行数: {self.lines}"
+
+    def changed_label(self):
+        """与上次显示的标签不同时返回新标签, 否则返回None"""
+        label = self.label()
+        if label == self._shown:
+            return None
+        self._shown = label
+        return label
+
+    def invalidate(self):
+        """忘记上次显示的标签, 下次一定刷新 (标签被其它内容覆盖之后调用)"""
+        self._shown = None
@@ -0,0 +1,247 @@
+"""基于单调时钟绝对截止时间的按键节拍调度"""
+import math
+import threading
+import time
+
+
+def drive(steps, wait):
+    """执行一个产生截止时间的生成器: 每个截止时间交给 wait 等待, 再把等待结果送回
+
+    返回生成器的返回值。生成器不等待, 因此同一段回放逻辑既可以由线程阻塞等待,
+    也可以由 async_engine.drive 在事件循环中等待。
+    """
+    try:
+        deadline = next(steps)
+        while True:
+            deadline = steps.send(wait(deadline))
+    except StopIteration as e:
+        return e.value
+    finally:
+        # 被异常中断时也让生成器执行 finally 中的收尾
+        steps.close()
+
+
+class PauseGate:
+    """暂停与继续的开关
+
+    调度器的等待都挂在同一个唤醒事件上, 暂停、继续和停止都会立即打断等待,
+    因此无论字符间隔多长, 这些操作都不需要等到当前间隔结束才生效。
+    """
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._open = threading.Event()
+        self._open.set()
+        # 工作线程真正停在暂停点时的回调, 此时读取的位置是精确的
+        self.on_hold = None
+
+    @property
+    def paused(self):
+        return not self._open.is_set()
+
+    def pause(self):
+        self._open.clear()
+        self._wake.set()
+
+    def resume(self):
+        self._open.set()
+        self._wake.set()
+
+    def interrupt(self):
+        """停止时调用: 解除暂停并打断正在进行的等待"""
+        self.resume()
+
+    def wait(self, timeout):
+        """等待至多 timeout 秒, 被打断时提前返回; 调用方返回后需要重新检查状态"""
+        self._wake.wait(timeout)
+        self._wake.clear()
+
+    def hold(self, clock=time.perf_counter):
+        """暂停期间阻塞, 返回阻塞的秒数"""
+        start = clock()
+        on_hold = self.on_hold
+        if on_hold is not None:
+            on_hold()
+        self._open.wait()
+        return clock() - start
+
+
+class DeadlineScheduler:
+    """按绝对截止时间调度按键节拍
+
+    每个节拍的截止时间都从起点累加计算, 而不是在每次动作之后再sleep一个间隔,
+    因此按键调用和界面调度的耗时不会累积成漂移。
+    """
+
+    def __init__(self, interval, stop_event=None, clock=time.perf_counter,
+                 spin_threshold=0.002, max_lag=None, gate=None):
+        self.interval = float(interval)
+        self.stop_event = stop_event
+        # 可选的 PauseGate; 暂停的时长不计入耗时, 之后的截止时间整体顺延
+        self.gate = gate
+        self.clock = clock
+        # 剩余时间低于该阈值时改为让出CPU的短轮询, 弥补系统sleep的粒度误差
+        self.spin_threshold = spin_threshold
+        # 落后超过该值时放弃追赶并重新对齐, 避免积压后连续无间隔地输出
+        if max_lag is None:
+            max_lag = max(0.25, self.interval * 5)
+        self.max_lag = max_lag
+        self.reset()
+
+    def reset(self):
+        """清空统计并回到未开始状态"""
+        self.start_time = None
+        self.end_time = None
+        self.deadline = None
+        self.ticks = 0
+        self.units = 0
+        self.requested_time = 0.0
+        self.late_ticks = 0
+        self.resyncs = 0
+        self.worst_lag = 0.0
+        self.paused_time = 0.0
+
+    def stopped(self):
+        """是否已收到停止信号"""
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def start(self):
+        """以当前时刻作为节拍零点"""
+        now = self.clock()
+        self.start_time = now
+        self.end_time = None
+        self.deadline = now
+        return now
+
+    def finish(self):
+        """冻结结束时间, 之后的统计不再随时间变化"""
+        if self.end_time is None:
+            self.end_time = self.clock()
+        return self.end_time
+
+    def hold(self):
+        """暂停时阻塞到继续或停止, 并把截止时间顺延暂停的时长; 返回顺延的秒数"""
+        held = self.gate.hold(self.clock)
+        self.paused_time += held
+        if self.deadline is not None:
+            self.deadline += held
+        return held
+
+    def sleep_until(self, deadline):
+        """等待到指定的绝对时刻; 返回False表示等待期间收到停止信号
+
+        暂停时截止时间随暂停时长顺延。较长的等待挂在停止或暂停信号上,
+        收到信号时立即返回, 而不是睡完整个间隔。
+        """
+        gate = self.gate
+        stop_event = self.stop_event
+        while True:
+            if self.stopped():
+                return False
+            if gate is not None and gate.paused:
+                deadline += self.hold()
+                continue
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                return True
+            if remaining > self.spin_threshold:
+                if gate is not None:
+                    gate.wait(remaining - self.spin_threshold)
+                elif stop_event is not None:
+                    stop_event.wait(remaining - self.spin_threshold)
+                else:
+                    time.sleep(remaining - self.spin_threshold)
+            else:
+                time.sleep(0)
+
+    def countdown(self, delay, on_second=None):
+        """开始前的倒计时, 每个整秒回调一次剩余秒数; 返回False表示被停止"""
+        return drive(self.countdown_steps(delay, on_second), self.wait)
+
+    def countdown_steps(self, delay, on_second=None):
+        """倒计时的生成器版本: 产生每一秒的截止时间, 送回False时结束"""
+        start = self.clock()
+        end = start + max(0.0, delay)
+        paused = self.paused_time
+        seconds = int(math.ceil(delay)) if delay > 0 else 0
+        for remaining in range(seconds, 0, -1):
+            if on_second is not None:
+                on_second(remaining)
+            # 每一秒的截止时间都相对于终点计算, 回调耗时不会拉长倒计时, 暂停则使终点顺延
+            if not (yield end + (self.paused_time - paused) - (remaining - 1)):
+                return False
+        # 倒计时期间的暂停不计入输入耗时
+        self.paused_time = paused
+        return not self.stopped()
+
+    def tick(self, interval=None, units=1):
+        """登记一次动作并等待到下一个截止时间; 返回False表示被停止"""
+        return self.wait(self.advance(interval, units))
+
+    def advance(self, interval=None, units=1):
+        """登记一次动作, 返回需要等待到的截止时间; 已经落后时返回None, 不必等待
+
+        这里只计算截止时间和统计, 等待由 wait() 完成。暂停时返回当前的截止时间,
+        等待中会先在暂停处阻塞并顺延截止时间。
+        """
+        if interval is None:
+            interval = self.interval
+        if self.deadline is None:
+            self.start()
+        self.ticks += 1
+        self.units += units
+        self.requested_time += interval
+        self.deadline += interval
+        if self.gate is not None and self.gate.paused:
+            return self.deadline
+
+        lag = self.clock() - self.deadline
+        if lag > 0:
+            self.late_ticks += 1
+            if lag > self.worst_lag:
+                self.worst_lag = lag
+            if lag > self.max_lag:
+                self.deadline += lag
+                self.resyncs += 1
+            return None
+        return self.deadline
+
+    def wait(self, deadline):
+        """等待到 advance() 返回的截止时间; 返回False表示被停止"""
+        if deadline is None:
+            return not self.stopped()
+        return self.sleep_until(deadline)
+
+    def stats(self):
+        """返回实际速率与目标速率的对比"""
+        if self.start_time is None:
+            elapsed = 0.0
+        else:
+            end = self.end_time if self.end_time is not None else self.clock()
+            elapsed = end - self.start_time - self.paused_time
+        requested_rate = self.units / self.requested_time if self.requested_time > 0 else 0.0
+        achieved_rate = self.units / elapsed if elapsed > 0 else 0.0
+        return {
+            'interval': self.interval,
+            'ticks': self.ticks,
+            'units': self.units,
+            'elapsed': elapsed,
+            'requested_time': self.requested_time,
+            'drift': elapsed - self.requested_time,
+            'requested_rate': requested_rate,
+            'achieved_rate': achieved_rate,
+            'late_ticks': self.late_ticks,
+            'resyncs': self.resyncs,
+            'worst_lag': self.worst_lag,
+            'paused_time': self.paused_time,
+        }
+
+    def summary(self):
+        """适合写入执行记录的一行速率摘要"""
+        s = self.stats()
+        text = (f"目标 {s['requested_rate']:.1f} 字符/秒, 实际 {s['achieved_rate']:.1f} 字符/秒, "
+                f"耗时 {s['elapsed']:.2f}秒 (偏差 {s['drift'] * 1000:+.0f}ms, 延迟节拍 {s['late_ticks']})")
+        if s['ticks'] and s['units'] != s['ticks']:
+            # 突发模式下一个节拍包含多个字符
+            text += f", 平均每次调用 {s['units'] / s['ticks']:.1f} 字符"
+        return text
@@ -0,0 +1,65 @@
+"""界面线程的刷新预算和CPU计量
+
+运行期间界面线程的大部分工作只是装饰: 标题动画、文本统计、遥测标签和逐帧
+刷新的进度条与记录列表。低开销模式下这些工作在运行期间暂停, 进度条降到低
+帧率刷新, 错误仍然立即提示; 全部任务结束后恢复完整刷新并补上一次更新。
+窗口最小化时无论是否选择低开销模式都按同样的方式处理。
+"""
+import time
+
+from .ui_channel import FRAME_INTERVAL
+
+# 低开销模式下取出事件通道的间隔 (秒)
+LOW_OVERHEAD_FRAME_INTERVAL = 0.5
+
+
+class UIBudget:
+    """界面线程当前的刷新预算
+
+    界面在任务开始和全部结束时调用 begin_run() / end_run(), 窗口最小化和还原时
+    设置 minimized; reduced 为真时只做必要的刷新。运行期间用 time.thread_time()
+    计量界面线程自身消耗的CPU时间, 便于比较两种模式。
+    """
+
+    def __init__(self, low_overhead=False):
+        self.low_overhead = low_overhead
+        self.minimized = False
+        self.running = False
+        # 上一次运行界面线程消耗的CPU秒数和经过的秒数
+        self.cpu = 0.0
+        self.wall = 0.0
+        self._cpu_start = 0.0
+        self._wall_start = 0.0
+
+    @property
+    def reduced(self):
+        """是否只做必要的界面刷新"""
+        return self.minimized or (self.running and self.low_overhead)
+
+    @property
+    def frame_interval(self):
+        return LOW_OVERHEAD_FRAME_INTERVAL if self.reduced else FRAME_INTERVAL
+
+    def begin_run(self):
+        """第一个任务提交时调用, 开始计量界面线程的CPU时间"""
+        if self.running:
+            return
+        self.running = True
+        self._cpu_start = time.thread_time()
+        self._wall_start = time.perf_counter()
+
+    def end_run(self):
+        """全部任务结束时调用, 返回本次运行界面线程的 (CPU秒数, 经过秒数)"""
+        if not self.running:
+            return 0.0, 0.0
+        self.running = False
+        self.cpu = time.thread_time() - self._cpu_start
+        self.wall = time.perf_counter() - self._wall_start
+        return self.cpu, self.wall
+
+    def summary(self):
+        """上一次运行的界面线程开销, 适合写入执行记录"""
+        share = self.cpu / self.wall if self.wall else 0.0
+        mode = '低开销' if self.low_overhead else '完整'
+        return (f"界面线程CPU: {self.cpu * 1000:.0f}ms / {self.wall:.1f}s "
+                f"({share:.1%}, {mode}刷新)")
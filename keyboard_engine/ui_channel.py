@@ -0,0 +1,125 @@
+"""工作线程到界面线程的合并事件通道"""
+import threading
+from collections import deque, namedtuple
+
+# 界面线程每帧取出的聚合增量
+UIUpdate = namedtuple('UIUpdate', 'progress records executions errors finished')
+
+# 界面线程的默认刷新帧率
+FRAME_RATE = 30
+FRAME_INTERVAL = 1.0 / FRAME_RATE
+
+
+class UIEventChannel:
+    """线程安全的事件通道
+
+    工作线程只在锁内累加增量, 不直接调度任何界面回调; 界面线程按固定帧率调用
+    drain() 一次性取走本帧的全部增量。进度等计数类事件被合并为一个数值, 记录
+    按顺序保留, 积压超过上限时丢弃最早的记录并计入丢弃数。
+    """
+
+    def __init__(self, max_pending_records=5000):
+        self._lock = threading.Lock()
+        self._progress = 0
+        self._records = deque(maxlen=max_pending_records)
+        self._executions = 0
+        self._errors = []
+        self._finished = False
+        self._depth = 0
+        self._frame_dropped = 0
+        # 统计信息
+        self.posted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.drains = 0
+        self.max_depth = 0
+
+    def _post(self):
+        """登记一次投递, 调用方需持有锁"""
+        self.posted += 1
+        self._depth += 1
+        if self._depth > self.max_depth:
+            self.max_depth = self._depth
+
+    def post_progress(self, units=1):
+        """累加进度"""
+        with self._lock:
+            self._post()
+            self._progress += units
+
+    def _append_record(self, record):
+        """追加记录, 积压已满时计入丢弃数; 调用方需持有锁"""
+        if len(self._records) == self._records.maxlen:
+            self.dropped += 1
+            self._frame_dropped += 1
+        self._records.append(record)
+
+    def post_record(self, record):
+        """追加一条执行记录"""
+        with self._lock:
+            self._post()
+            self._append_record(record)
+
+    def post_execution(self, record=None):
+        """登记一次完整执行, 可附带对应的记录"""
+        with self._lock:
+            self._post()
+            self._executions += 1
+            if record is not None:
+                self._append_record(record)
+
+    def post_error(self, message):
+        """报告错误"""
+        with self._lock:
+            self._post()
+            self._errors.append(message)
+
+    def post_finished(self):
+        """通知工作线程已结束"""
+        with self._lock:
+            self._post()
+            self._finished = True
+
+    def depth(self):
+        """当前尚未被界面取走的事件数"""
+        with self._lock:
+            return self._depth
+
+    def drain(self):
+        """取走本帧的聚合增量; 没有新事件时返回None"""
+        with self._lock:
+            if not self._depth:
+                return None
+            update = UIUpdate(self._progress, list(self._records), self._executions,
+                              self._errors, self._finished)
+            applied = ((1 if self._progress else 0) + len(self._records)
+                       + (1 if self._executions else 0) + len(self._errors)
+                       + (1 if self._finished else 0))
+            self.coalesced += max(0, self._depth - applied - self._frame_dropped)
+            self.drains += 1
+            self._progress = 0
+            self._records.clear()
+            self._executions = 0
+            self._errors = []
+            self._finished = False
+            self._depth = 0
+            self._frame_dropped = 0
+        return update
+
+    def stats(self):
+        """通道统计信息"""
+        with self._lock:
+            return {
+                'depth': self._depth,
+                'max_depth': self.max_depth,
+                'posted': self.posted,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'drains': self.drains,
+            }
+
+    def stats_text(self):
+        """适合显示在界面上的统计摘要"""
+        s = self.stats()
+        return (f"事件: {s['posted']} | 合并: {s['coalesced']} | 丢弃: {s['dropped']} | "
+                f"最大积压: {s['max_depth']} | 刷新: {s['drains']}帧")
@@ -0,0 +1,246 @@
+"""常驻的输入线程和任务队列"""
+import itertools
+import threading
+from collections import deque
+
+from .engine import TypingEngine
+
+
+class Job:
+    """排队执行的一次输入任务
+
+    plan 为按键计划或流式片段来源 (见 TypingEngine.run_reporting)。
+    backend 为None时使用工作线程按 backend_key 缓存的后端, 否则该任务独占
+    传入的后端并在结束后关闭它 (例如每个任务各自的输出文件)。
+    timing 为 delay_profiles.HumanTiming 时按类人节奏代替固定间隔。
+    journal 为 resume_journal.JournalRecorder 时把运行进度写入续打日志。
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, plan, repetitions=1, delay=0.0, interval=None, channel=None,
+                 announce=False, telemetry=None, backend=None, backend_key=None,
+                 label='', total_units=0, start=None, timing=None, journal=None):
+        self.id = next(Job._ids)
+        self.plan = plan
+        self.repetitions = repetitions
+        self.delay = delay
+        self.interval = plan.interval if interval is None else interval
+        self.channel = channel
+        self.announce = announce
+        self.telemetry = telemetry
+        self.backend = backend
+        self.backend_key = backend_key
+        self.label = label
+        # 一次任务的总进度单位数, 供界面设置进度条
+        self.total_units = total_units
+        self.start = start
+        self.timing = timing
+        self.journal = journal
+        self.state = 'pending'
+        self.result = None
+        # 执行该任务的引擎, 开始执行时设置
+        self.engine = None
+
+    def describe(self):
+        return f"#{self.id} {self.label} ×{self.repetitions}"
+
+
+class EngineWorker:
+    """一个长期存在的工作线程, 按顺序执行队列中的任务
+
+    所有任务共用同一个 TypingEngine, 系统键盘等后端按名称只创建一次;
+    前一个任务结束后立即开始下一个, 不再为每次运行创建线程。等待中的任务
+    可以取消或调整顺序, 取消正在执行的任务会立即打断它。
+    """
+
+    def __init__(self, backend_factory, stop_event=None):
+        self.backend_factory = backend_factory
+        self.engine = TypingEngine(None, stop_event)
+        self.current = None
+        # 所有任务累计完成的执行次数, 用于执行记录的编号
+        self.executions = 0
+        self._backends = {}
+        self._jobs = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = None
+
+    def submit(self, job):
+        """把任务加入队尾, 返回该任务"""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('工作线程已关闭')
+            self._jobs.append(job)
+            self._ensure_running()
+            self._cond.notify_all()
+        return job
+
+    def _ensure_running(self):
+        """第一次提交任务时启动工作线程; 调用方需持有锁"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name='typing-engine',
+                                            daemon=True)
+            self._thread.start()
+
+    def pending(self):
+        """等待中的任务列表 (按执行顺序)"""
+        with self._cond:
+            return list(self._jobs)
+
+    @property
+    def busy(self):
+        return self.current is not None or bool(self._jobs)
+
+    def cancel(self, job_id):
+        """取消任务; 正在执行的任务会被立即停止。返回是否找到该任务"""
+        with self._cond:
+            job = self.current
+            if job is not None and job.id == job_id:
+                job.state = 'cancelled'
+                self.engine.stop()
+                return True
+            return self._cancel_pending(job_id)
+
+    def _cancel_pending(self, job_id):
+        """从队列中取消一个等待中的任务, 返回是否找到; 调用方需持有锁"""
+        for job in self._jobs:
+            if job.id == job_id:
+                self._jobs.remove(job)
+                self._drop(job)
+                self._cond.notify_all()
+                return True
+        return False
+
+    def cancel_all(self):
+        """清空队列并停止正在执行的任务"""
+        with self._cond:
+            while self._jobs:
+                self._drop(self._jobs.popleft())
+            if self.current is not None:
+                self.current.state = 'cancelled'
+                self.engine.stop()
+            self._cond.notify_all()
+
+    def _drop(self, job):
+        """丢弃一个还没开始的任务; 调用方需持有锁"""
+        job.state = 'cancelled'
+        if job.backend is not None:
+            job.backend.close()
+        if job.channel is not None:
+            job.channel.post_finished()
+
+    def move(self, job_id, offset):
+        """把等待中的任务前移 (offset<0) 或后移, 返回是否移动"""
+        with self._cond:
+            for index, job in enumerate(self._jobs):
+                if job.id == job_id:
+                    target = min(max(index + offset, 0), len(self._jobs) - 1)
+                    if target == index:
+                        return False
+                    del self._jobs[index]
+                    self._jobs.insert(target, job)
+                    return True
+        return False
+
+    def pause(self):
+        self.engine.pause()
+
+    def resume(self):
+        self.engine.resume()
+
+    def wait_idle(self, timeout=None):
+        """等待队列清空且没有任务在执行; 返回是否已空闲"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self.busy, timeout)
+
+    def shutdown(self, timeout=1.0):
+        """取消全部任务, 结束线程并关闭缓存的后端"""
+        with self._cond:
+            self._closed = True
+        self.cancel_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._close_backends()
+
+    def _close_backends(self):
+        for backend in self._backends.values():
+            backend.close()
+        self._backends.clear()
+
+    def _backend(self, key):
+        """按名称取得缓存的后端, 第一次使用时创建"""
+        backend = self._backends.get(key)
+        if backend is None:
+            backend = self._backends[key] = self.backend_factory(key)
+        return backend
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while not self._jobs and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                job = self._take()
+            if self._attach_backend(job):
+                journal = self._start_journal(job)
+                try:
+                    job.result = self._run(job)
+                finally:
+                    if journal is not None:
+                        journal.stop(job.result)
+            self._finish(job)
+
+    def _take(self):
+        """取出队首任务作为当前任务; 调用方需持有锁"""
+        job = self._jobs.popleft()
+        self.current = job
+        job.state = 'running'
+        job.engine = self.engine
+        # 在锁内清除停止信号, 之后的取消一定会作用在这个任务上
+        self.engine.reset(job.start)
+        return job
+
+    def _attach_backend(self, job):
+        """为任务准备后端, 返回是否成功; 失败时通过任务的事件通道报告"""
+        try:
+            job.engine.backend = job.backend if job.backend is not None \
+                else self._backend(job.backend_key)
+        except Exception as e:
+            if job.channel is not None:
+                job.channel.post_error(f"无法创建键盘后端: {str(e)}")
+                job.channel.post_finished()
+            job.result = None
+            return False
+        return True
+
+    def _start_journal(self, job):
+        """开始记录续打日志, 返回日志写入器; 没有日志或无法写入时返回None"""
+        journal = job.journal
+        if journal is None:
+            return None
+        try:
+            journal.start(job.engine, job.start)
+        except OSError as e:
+            # 日志写不了时照常输入, 只是之后无法继续
+            if job.channel is not None:
+                job.channel.post_record(f"无法写入续打日志: {str(e)}")
+            return None
+        return journal
+
+    def _run(self, job):
+        return job.engine.run_reporting(
+            job.plan, job.repetitions, job.delay, job.channel, self.executions,
+            job.announce, close_backend=job.backend is not None,
+            interval=job.interval, telemetry=job.telemetry, start=job.start,
+            timing=job.timing)
+
+    def _finish(self, job):
+        with self._cond:
+            if job.result is not None:
+                self.executions += job.result['completed']
+            if job.state == 'running':
+                job.state = 'done'
+            self.current = None
+            self._cond.notify_all()
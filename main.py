@@ -1,22 +1,48 @@
+# 最先导入, 启动计时从这里开始
+from keyboard_engine import startup
+# 以下控件都出现在 build() 构建的第一帧中 (TextInput 还是模块级 StatsTextInput 的基类),
+# 推迟导入不能减少第一帧之前的工作, 因此保持在模块顶部导入
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.label import Label
-from kivy.uix.textinput import TextInput
+from kivy.uix.textinput import TextInput, FL_IS_LINEBREAK
 from kivy.uix.button import Button
-from kivy.uix.slider import Slider
 from kivy.uix.checkbox import CheckBox
-from kivy.uix.spinner import Spinner
 from kivy.uix.progressbar import ProgressBar
 from kivy.uix.scrollview import ScrollView
 from kivy.clock import Clock
+from kivy.metrics import dp
+from kivy.properties import StringProperty
 from kivy.core.window import Window
 from kivy.utils import platform
+import os
 import threading
 import time
 
+from keyboard_engine.backends import KeyboardBackend, PynputBackend, pynput_available
+from keyboard_engine.clipboard import ClipboardProvider, UIThreadClipboard
+from keyboard_engine.keystroke_plan import (DEFAULT_BURST_CHUNK, DEFAULT_PASTE_CHUNK,
+                                            compile_paste_plan, compile_plan)
+from keyboard_engine.output_mirror import OutputMirror
+from keyboard_engine.record_log import RecordLog
+from keyboard_engine.resume_journal import ResumeJournal
+from keyboard_engine.text_stats import TextStats, STATS_DEBOUNCE
+from keyboard_engine.ui_budget import UIBudget
+from keyboard_engine.ui_channel import UIEventChannel
+from keyboard_engine.worker import EngineWorker, Job
+
+# 只有第一帧之后才构建的参数和记录面板用到的控件模块 (Slider、Spinner、RecycleView),
+# 以及宏、数据模板、文件输入和遥测模块在第一次使用时导入
+startup.timer.mark('imports')
+
+# 设为1时以 async_run() 在 asyncio 事件循环中启动, 才能使用协程引擎
+ASYNC_ENGINE_ENV = 'IKUN_ASYNC_ENGINE'
+
 # 在移动端，键盘模拟功能受限，这里提供模拟实现
-class MobileKeyboardController:
+class MobileKeyboardController(KeyboardBackend):
+    name = 'mobile'
+    
     def __init__(self):
         self.output_callback = None
     
@@ -33,17 +59,298 @@ class MobileKeyboardController:
         """模拟回车"""
         if self.output_callback:
             self.output_callback('\n')
+    
+    def tap(self, key):
+        """模拟单击特殊键, 没有可见输出的键忽略; 组合键只输出主键"""
+        if key == 'enter':
+            self.press_enter()
+        elif key == 'tab':
+            self.type_text('\t')
+        elif len(key) == 1:
+            self.type_text(key)
+
+class KivyClipboard(ClipboardProvider):
+    """Kivy的剪贴板, 只能在界面线程调用"""
+    
+    def get_text(self):
+        from kivy.core.clipboard import Clipboard
+        return Clipboard.paste() or None
+    
+    def set_text(self, text):
+        from kivy.core.clipboard import Clipboard
+        Clipboard.copy(text)
+
+class StatsTextInput(TextInput):
+    """按编辑增量维护字符数和行数的输入框
+
+    insert_text、do_backspace 和 delete_selection 先登记本次编辑的增量,
+    text 变化时用长度核对; 整体赋值或增量对不上 (如按词删除) 时才对全文重新计数。
+    统计在编辑停止后才写入 stats_text, 内容不变时不会触发绑定。
+    """
+    stats_text = StringProperty('字符数: 0 | 行数: 1')
+    
+    def __init__(self, **kwargs):
+        self.stats = TextStats()
+        self._pending = None
+        # 粘贴的文本超过大文档阈值时不插入, 而是带着粘贴后的全文触发该事件
+        self.register_event_type('on_large_paste')
+        super().__init__(**kwargs)
+        self._refresh_trigger = Clock.create_trigger(self._refresh_stats, STATS_DEBOUNCE)
+        self.stats.reset(self.text)
+        self.bind(text=self._on_text_changed)
+    
+    def _edit(self, delta, method, *args, **kwargs):
+        """带着预先登记的增量执行一次编辑"""
+        self._pending = delta
+        try:
+            return method(*args, **kwargs)
+        finally:
+            self._pending = None
+    
+    def insert_text(self, substring, from_undo=False):
+        if self.readonly or not substring:
+            return super().insert_text(substring, from_undo=from_undo)
+        return self._edit((len(substring), substring.count('\n')),
+                          super().insert_text, substring, from_undo=from_undo)
+    
+    def delete_selection(self, from_undo=False):
+        removed = self.selection_text
+        if self.readonly or not removed:
+            return super().delete_selection(from_undo=from_undo)
+        return self._edit((-len(removed), -removed.count('\n')),
+                          super().delete_selection, from_undo=from_undo)
+    
+    def do_backspace(self, from_undo=False, mode='bkspc'):
+        col, row = self.cursor
+        if self.readonly or self._selection or (col == 0 and row == 0):
+            return super().do_backspace(from_undo=from_undo, mode=mode)
+        # 行首退格删除的是换行符还是自动折行处的字符, 由行标志区分
+        newline = col == 0 and bool(self._lines_flags[row] & FL_IS_LINEBREAK)
+        return self._edit((-1, -int(newline)),
+                          super().do_backspace, from_undo=from_undo, mode=mode)
+    
+    def _on_text_changed(self, instance, text):
+        pending = self._pending
+        if pending is not None and len(text) == self.stats.chars + pending[0]:
+            self.stats.apply(*pending)
+            # 同一次编辑可能触发多次 text 变化, 增量只登记一次
+            self._pending = (0, 0)
+        elif pending is None or len(text) != self.stats.chars:
+            self.stats.reset(text)
+        self._refresh_trigger.cancel()
+        self._refresh_trigger()
+    
+    def _refresh_stats(self, dt):
+        self.stats_text = self.stats.label()
+    
+    def paste(self):
+        from kivy.core.clipboard import Clipboard
+        from keyboard_engine.large_document import LARGE_TEXT_THRESHOLD
+        data = Clipboard.paste() or ''
+        if self.readonly or len(data) <= LARGE_TEXT_THRESHOLD:
+            return super().paste()
+        if self._selection:
+            first, last = sorted((self.selection_from, self.selection_to))
+        else:
+            first = last = self.cursor_index()
+        text = self.text
+        self.dispatch('on_large_paste', text[:first] + data + text[last:])
+    
+    def on_large_paste(self, text):
+        pass
+
+class DocumentPreview(BoxLayout):
+    """大文档的只读预览
+    
+    标签里只放窗口内可见的几十行, 滑块按总行数定位, 滚动、跳转和查找的代价都只与
+    窗口高度有关。窗口的状态保存在 large_document.DocumentView 中。
+    """
+    
+    def __init__(self, on_close, **kwargs):
+        from kivy.core.text import Label as CoreLabel
+        from kivy.uix.slider import Slider
+        super().__init__(orientation='vertical', spacing=5, **kwargs)
+        self.view = None
+        self._syncing = False
+        
+        toolbar = BoxLayout(orientation='horizontal', size_hint_y=None, height='36dp', spacing=5)
+        self.goto_input = TextInput(hint_text='行号', input_filter='int', multiline=False,
+                                    font_size='12sp', size_hint_x=None, width='80dp')
+        self.goto_input.bind(on_text_validate=lambda instance: self.goto())
+        toolbar.add_widget(self.goto_input)
+        toolbar.add_widget(Button(text='跳转', font_size='12sp', size_hint_x=None, width='50dp',
+                                  on_press=lambda instance: self.goto()))
+        self.find_input = TextInput(hint_text='查找', multiline=False, font_size='12sp')
+        self.find_input.bind(on_text_validate=lambda instance: self.find())
+        toolbar.add_widget(self.find_input)
+        toolbar.add_widget(Button(text='上一个', font_size='12sp', size_hint_x=None, width='60dp',
+                                  on_press=lambda instance: self.find(backward=True)))
+        toolbar.add_widget(Button(text='下一个', font_size='12sp', size_hint_x=None, width='60dp',
+                                  on_press=lambda instance: self.find()))
+        self.status_label = Label(text='', font_size='12sp', size_hint_x=None, width='130dp',
+                                  color=(0.5, 0.55, 0.6, 1))
+        toolbar.add_widget(self.status_label)
+        toolbar.add_widget(Button(text='关闭大文档', font_size='12sp', size_hint_x=None,
+                                  width='90dp', on_press=lambda instance: on_close()))
+        self.add_widget(toolbar)
+        
+        body = BoxLayout(orientation='horizontal', spacing=5)
+        self.content = Label(markup=True, font_size='14sp', halign='left', valign='top',
+                             color=(0.17, 0.24, 0.31, 1))
+        self.line_height = CoreLabel(font_size=self.content.font_size).get_extents('Ag')[1]
+        self.content.bind(size=self.on_content_size)
+        body.add_widget(self.content)
+        # 竖直滑块的最大值在上方, 对应文档开头
+        self.slider = Slider(orientation='vertical', min=0, max=1, value=1,
+                             size_hint_x=None, width='30dp')
+        self.slider.bind(value=self.on_slider)
+        body.add_widget(self.slider)
+        self.add_widget(body)
+    
+    def show(self, view):
+        """显示一个新的文档"""
+        self.view = view
+        self.goto_input.text = ''
+        self.status_label.text = ''
+        self.on_content_size(self.content, self.content.size)
+    
+    def on_content_size(self, instance, size):
+        width, height = size
+        instance.text_size = size
+        if self.view is not None:
+            self.view.rows = max(1, int(height // self.line_height))
+            # 标签会自动折行, 按全角字符的宽度估计每行能显示的字符数并截断, 避免折行
+            columns = int(width // instance.font_size) - self.view.gutter_width()
+            self.view.max_columns = max(10, columns)
+            self.render()
+    
+    def on_slider(self, instance, value):
+        if self._syncing or self.view is None:
+            return
+        self.view.moveto(1 - value)
+        self.render()
+    
+    def scroll(self, lines):
+        self.view.scroll(lines)
+        self.render()
+    
+    def on_touch_down(self, touch):
+        if self.view is not None and self.content.collide_point(*touch.pos):
+            if touch.is_mouse_scrolling:
+                if touch.button in ('scrolldown', 'scrollup'):
+                    self.scroll(-3 if touch.button == 'scrolldown' else 3)
+                return True
+            # 拖动内容按行滚动
+            touch.grab(self)
+            touch.ud['preview_y'] = touch.y
+            return True
+        return super().on_touch_down(touch)
+    
+    def on_touch_move(self, touch):
+        if touch.grab_current is self:
+            moved = int((touch.y - touch.ud['preview_y']) / self.line_height)
+            if moved:
+                touch.ud['preview_y'] += moved * self.line_height
+                self.scroll(moved)
+            return True
+        return super().on_touch_move(touch)
+    
+    def on_touch_up(self, touch):
+        if touch.grab_current is self:
+            touch.ungrab(self)
+            return True
+        return super().on_touch_up(touch)
+    
+    def goto(self):
+        try:
+            number = int(self.goto_input.text)
+        except ValueError:
+            self.status_label.text = '请输入行号'
+            return
+        self.status_label.text = f'第{self.view.goto(number)}行'
+        self.render()
+    
+    def find(self, backward=False):
+        """查找下一处或上一处, 结果所在的行显示在窗口中并高亮"""
+        needle = self.find_input.text
+        line = self.view.find(needle, backward)
+        if line is None:
+            self.status_label.text = f'没有找到「{needle}」' if needle else ''
+            return
+        status = f'第{line}行'
+        if self.view.wrapped:
+            status += ' (已从末尾继续)' if backward else ' (已从开头继续)'
+        self.status_label.text = status
+        self.render()
+    
+    def render(self):
+        """把窗口内的行写入标签并同步滑块"""
+        from kivy.utils import escape_markup
+        view = self.view
+        view.scroll(0)
+        gutter = view.gutter_width()
+        mark = view.highlight()
+        lines = []
+        for row, line in enumerate(view.render()):
+            if mark is not None and mark[0] == row:
+                start, end = mark[1], mark[2]
+                body = (escape_markup(line[gutter:start])
+                        + f'[b][color=f39c12]{escape_markup(line[start:end])}[/color][/b]'
+                        + escape_markup(line[end:]))
+            else:
+                body = escape_markup(line[gutter:])
+            lines.append(f'[color=7f8c8d]{line[:gutter]}[/color]{body}')
+        self.content.text = '\n'.join(lines)
+        self._syncing = True
+        self.slider.value = 1 - view.fraction()[0]
+        self._syncing = False
+
+class RecordLine(Label):
+    """记录列表中的一行"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.font_size = '12sp'
+        self.halign = 'left'
+        self.valign = 'middle'
+        self.color = (0.3, 0.3, 0.3, 1)
+        self.bind(size=self.setter('text_size'))
 
 class KeyboardSimulatorApp(App):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.keyboard_controller = MobileKeyboardController()
         self.stop_event = threading.Event()
-        self.simulation_thread = None
+        # 常驻的输入线程, 任务排队依次执行, 后端只创建一次; 以 ASYNC_ENGINE_ENV 启动时
+        # 默认改为在应用自身的 asyncio 事件循环中执行, 可以勾选「协程引擎」切换
+        self.async_loop = os.environ.get(ASYNC_ENGINE_ENV) == '1'
+        self.async_engine = self.async_loop
+        self.worker = self.create_worker(self.async_engine)
+        self.macro_cache = None
+        # 续打日志在应用数据目录中, build() 时创建
+        self.journal = None
+        self.active_jobs = []
+        self.progress_job = None
         self.execution_count = 0
-        self.records = []
+        # 内存中只保留最近的记录, 全部记录溢写到临时文件
+        self.records = RecordLog(spill=True)
+        self.channel_event = None
+        self.file_source = None
+        self.data_source = None
+        self.output_mirror = OutputMirror()
+        self.telemetry = None
+        self.records_view = None
+        # 大文档模式: 超长文本不放进输入框, 由只读的分窗预览显示
+        self.large_document = None
+        self.document_preview = None
+        # 运行期间 (低开销模式) 或最小化时暂停非必要的界面刷新
+        self.ui_budget = UIBudget()
+        # 粘贴模式下工作线程经界面线程读写剪贴板
+        self.clipboard = UIThreadClipboard(
+            KivyClipboard(), wake=lambda: Clock.schedule_once(lambda dt: self.clipboard.service()))
         
     def build(self):
+        self.journal = ResumeJournal(os.path.join(self.user_data_dir, 'journal'))
         # 设置窗口背景色
         Window.clearcolor = (0.95, 0.97, 0.98, 1)  # 浅灰蓝背景
         
@@ -75,7 +382,7 @@ class KeyboardSimulatorApp(App):
         
         # 文本输入框（使用ScrollView包装以支持滚动）
         scroll = ScrollView()
-        self.text_input = TextInput(
+        self.text_input = StatsTextInput(
             multiline=True,
             font_size='14sp',
             background_color=(1, 1, 1, 1),
@@ -84,8 +391,11 @@ class KeyboardSimulatorApp(App):
             size_hint_y=None
         )
         self.text_input.bind(minimum_height=self.text_input.setter('height'))
+        self.text_input.bind(on_large_paste=lambda instance, text: self.enter_large_mode(text))
         scroll.add_widget(self.text_input)
         input_layout.add_widget(scroll)
+        self.input_layout = input_layout
+        self.input_scroll = scroll
         
         # 文本统计
         self.stats_label = Label(
@@ -97,55 +407,15 @@ class KeyboardSimulatorApp(App):
             color=(0.5, 0.55, 0.6, 1)
         )
         self.stats_label.bind(size=self.stats_label.setter('text_size'))
-        self.text_input.bind(text=self.update_text_stats)
+        self.text_input.bind(stats_text=self.update_text_stats)
         input_layout.add_widget(self.stats_label)
         
         main_layout.add_widget(input_layout)
         
         # 参数控制区域
-        params_layout = GridLayout(cols=2, size_hint_y=None, height='200dp', spacing=10)
-        
-        # 开始延迟
-        params_layout.add_widget(Label(text='开始延迟:', font_size='14sp', halign='left'))
-        delay_layout = BoxLayout(orientation='horizontal', spacing=5)
-        self.delay_slider = Slider(min=0, max=20, value=3, step=0.1)
-        self.delay_label = Label(text='3.0秒', font_size='12sp', size_hint_x=None, width='60dp')
-        self.delay_slider.bind(value=self.update_delay_label)
-        delay_layout.add_widget(self.delay_slider)
-        delay_layout.add_widget(self.delay_label)
-        params_layout.add_widget(delay_layout)
-        
-        # 字符间隔
-        params_layout.add_widget(Label(text='字符间隔:', font_size='14sp', halign='left'))
-        interval_layout = BoxLayout(orientation='horizontal', spacing=5)
-        self.interval_slider = Slider(min=0.01, max=1, value=0.08, step=0.01)
-        self.interval_label = Label(text='0.08秒', font_size='12sp', size_hint_x=None, width='60dp')
-        self.interval_slider.bind(value=self.update_interval_label)
-        interval_layout.add_widget(self.interval_slider)
-        interval_layout.add_widget(self.interval_label)
-        params_layout.add_widget(interval_layout)
-        
-        # 重复次数
-        params_layout.add_widget(Label(text='重复次数:', font_size='14sp', halign='left'))
-        self.repetition_input = TextInput(
-            text='1',
-            font_size='14sp',
-            multiline=False,
-            input_filter='int',
-            size_hint_x=0.3
-        )
-        params_layout.add_widget(self.repetition_input)
-        
-        # 换行方式
-        params_layout.add_widget(Label(text='换行方式:', font_size='14sp', halign='left'))
-        self.newline_spinner = Spinner(
-            text='Enter',
-            values=['Enter', 'Shift+Enter', '双击空格', '制表符'],
-            font_size='14sp'
-        )
-        params_layout.add_widget(self.newline_spinner)
-        
-        main_layout.add_widget(params_layout)
+        # 控件在第一帧之后由 build_parameter_panel 填入
+        self.params_layout = GridLayout(cols=2, size_hint_y=None, height='300dp', spacing=10)
+        main_layout.add_widget(self.params_layout)
         
         # 选项区域
         options_layout = BoxLayout(orientation='horizontal', size_hint_y=None, height='40dp', spacing=20)
@@ -156,6 +426,23 @@ class KeyboardSimulatorApp(App):
         clear_layout.add_widget(Label(text='执行后清除文本', font_size='12sp'))
         options_layout.add_widget(clear_layout)
         
+        low_overhead_layout = BoxLayout(orientation='horizontal', size_hint_x=None, width='200dp')
+        self.low_overhead_checkbox = CheckBox(size_hint_x=None, width='30dp')
+        self.low_overhead_checkbox.bind(active=self.toggle_low_overhead)
+        low_overhead_layout.add_widget(self.low_overhead_checkbox)
+        low_overhead_layout.add_widget(Label(text='低开销运行', font_size='12sp'))
+        options_layout.add_widget(low_overhead_layout)
+        
+        async_engine_layout = BoxLayout(orientation='horizontal', size_hint_x=None, width='200dp')
+        # 没有在事件循环中启动时协程引擎不可用
+        self.async_engine_checkbox = CheckBox(size_hint_x=None, width='30dp',
+                                              active=self.async_engine,
+                                              disabled=not self.async_loop)
+        self.async_engine_checkbox.bind(active=self.toggle_async_engine)
+        async_engine_layout.add_widget(self.async_engine_checkbox)
+        async_engine_layout.add_widget(Label(text='协程引擎', font_size='12sp'))
+        options_layout.add_widget(async_engine_layout)
+        
         main_layout.add_widget(options_layout)
         
         # 按钮区域
@@ -165,7 +452,9 @@ class KeyboardSimulatorApp(App):
             text='开始输入',
             font_size='16sp',
             background_color=(0.2, 0.6, 0.86, 1),
-            color=(1, 1, 1, 1)
+            color=(1, 1, 1, 1),
+            # 参数面板构建完成后才可以开始
+            disabled=True
         )
         self.start_button.bind(on_press=self.start_simulation)
         
@@ -178,7 +467,45 @@ class KeyboardSimulatorApp(App):
         )
         self.stop_button.bind(on_press=self.stop_simulation)
         
+        self.resume_button = Button(
+            text='继续上次',
+            font_size='16sp',
+            background_color=(0.17, 0.24, 0.31, 1),
+            color=(1, 1, 1, 1),
+            disabled=True
+        )
+        self.resume_button.bind(on_press=self.resume_simulation)
+        
+        self.load_button = Button(
+            text='载入文件',
+            font_size='16sp',
+            background_color=(0.17, 0.24, 0.31, 1),
+            color=(1, 1, 1, 1)
+        )
+        self.load_button.bind(on_press=self.toggle_file_source)
+        
+        self.data_button = Button(
+            text='载入数据',
+            font_size='16sp',
+            background_color=(0.17, 0.24, 0.31, 1),
+            color=(1, 1, 1, 1)
+        )
+        self.data_button.bind(on_press=self.toggle_data_source)
+        
+        self.pause_button = Button(
+            text='暂停',
+            font_size='16sp',
+            background_color=(0.95, 0.61, 0.07, 1),
+            color=(1, 1, 1, 1),
+            disabled=True
+        )
+        self.pause_button.bind(on_press=self.toggle_pause)
+        
+        button_layout.add_widget(self.load_button)
+        button_layout.add_widget(self.data_button)
         button_layout.add_widget(self.start_button)
+        button_layout.add_widget(self.resume_button)
+        button_layout.add_widget(self.pause_button)
         button_layout.add_widget(self.stop_button)
         
         main_layout.add_widget(button_layout)
@@ -192,8 +519,46 @@ class KeyboardSimulatorApp(App):
         )
         main_layout.add_widget(self.progress_bar)
         
+        # 事件通道统计
+        self.channel_stats_label = Label(
+            text='',
+            font_size='10sp',
+            size_hint_y=None,
+            height='20dp',
+            halign='left',
+            color=(0.5, 0.55, 0.6, 1)
+        )
+        self.channel_stats_label.bind(size=self.channel_stats_label.setter('text_size'))
+        main_layout.add_widget(self.channel_stats_label)
+        
+        # 运行遥测摘要
+        self.telemetry_label = Label(
+            text='',
+            font_size='10sp',
+            size_hint_y=None,
+            height='20dp',
+            halign='left',
+            color=(0.5, 0.55, 0.6, 1)
+        )
+        self.telemetry_label.bind(size=self.telemetry_label.setter('text_size'))
+        main_layout.add_widget(self.telemetry_label)
+        
+        # 输出预览: 模拟输出先写入镜像缓冲, 每帧刷新一次
+        self.output_preview = TextInput(
+            text='',
+            hint_text='输出预览',
+            readonly=True,
+            font_size='12sp',
+            size_hint_y=None,
+            height='80dp',
+            background_color=(0.98, 0.98, 0.98, 1),
+            foreground_color=(0.17, 0.24, 0.31, 1)
+        )
+        main_layout.add_widget(self.output_preview)
+        
         # 输出记录区域
-        records_layout = BoxLayout(orientation='vertical', size_hint_y=0.3, spacing=5)
+        # 记录列表在第一帧之后由 build_records_panel 创建
+        self.records_layout = BoxLayout(orientation='vertical', size_hint_y=0.3, spacing=5)
         
         records_label = Label(
             text='执行记录:',
@@ -203,33 +568,188 @@ class KeyboardSimulatorApp(App):
             halign='left'
         )
         records_label.bind(size=records_label.setter('text_size'))
-        records_layout.add_widget(records_label)
-        
-        # 记录显示区域
-        records_scroll = ScrollView()
-        self.records_display = Label(
-            text='等待执行...',
-            font_size='12sp',
-            text_size=(None, None),
-            halign='left',
-            valign='top',
-            color=(0.3, 0.3, 0.3, 1)
-        )
-        records_scroll.add_widget(self.records_display)
-        records_layout.add_widget(records_scroll)
-        
-        main_layout.add_widget(records_layout)
+        self.records_layout.add_widget(records_label)
+        main_layout.add_widget(self.records_layout)
         
         # 设置键盘控制器的输出回调
         self.keyboard_controller.set_output_callback(self.on_simulated_output)
         
+        startup.timer.mark('build')
         return main_layout
     
-    def update_text_stats(self, instance, text):
-        """更新文本统计"""
-        char_count = len(text)
-        line_count = text.count('\n') + 1 if text else 1
-        self.stats_label.text = f'字符数: {char_count} | 行数: {line_count}'
+    def on_start(self):
+        # 窗口第一次交换缓冲区时即第一帧已显示
+        Window.bind(on_flip=self.on_first_frame)
+        Window.bind(on_minimize=lambda *args: self.set_minimized(True),
+                    on_restore=lambda *args: self.set_minimized(False))
+    
+    def on_first_frame(self, *args):
+        """第一帧显示之后构建延迟的面板并输出启动耗时报告"""
+        Window.unbind(on_flip=self.on_first_frame)
+        startup.timer.mark('first_frame')
+        Clock.schedule_once(self.build_deferred_panels, 0)
+    
+    def build_deferred_panels(self, dt):
+        self.build_parameter_panel()
+        self.build_records_panel()
+        self.start_button.disabled = False
+        self.resume_button.disabled = False
+        startup.timer.mark('panels')
+        startup.timer.report()
+    
+    def build_parameter_panel(self):
+        """构建参数控件"""
+        from kivy.uix.slider import Slider
+        from kivy.uix.spinner import Spinner
+        
+        params_layout = self.params_layout
+        
+        # 开始延迟
+        params_layout.add_widget(Label(text='开始延迟:', font_size='14sp', halign='left'))
+        delay_layout = BoxLayout(orientation='horizontal', spacing=5)
+        self.delay_slider = Slider(min=0, max=20, value=3, step=0.1)
+        self.delay_label = Label(text='3.0秒', font_size='12sp', size_hint_x=None, width='60dp')
+        self.delay_slider.bind(value=self.update_delay_label)
+        delay_layout.add_widget(self.delay_slider)
+        delay_layout.add_widget(self.delay_label)
+        params_layout.add_widget(delay_layout)
+        
+        # 字符间隔
+        params_layout.add_widget(Label(text='字符间隔:', font_size='14sp', halign='left'))
+        interval_layout = BoxLayout(orientation='horizontal', spacing=5)
+        self.interval_slider = Slider(min=0.01, max=1, value=0.08, step=0.01)
+        self.interval_label = Label(text='0.08秒', font_size='12sp', size_hint_x=None, width='60dp')
+        self.interval_slider.bind(value=self.update_interval_label)
+        interval_layout.add_widget(self.interval_slider)
+        interval_layout.add_widget(self.interval_label)
+        params_layout.add_widget(interval_layout)
+        
+        # 重复次数
+        params_layout.add_widget(Label(text='重复次数:', font_size='14sp', halign='left'))
+        self.repetition_input = TextInput(
+            text='1',
+            font_size='14sp',
+            multiline=False,
+            input_filter='int',
+            size_hint_x=0.3
+        )
+        params_layout.add_widget(self.repetition_input)
+        
+        # 换行方式
+        params_layout.add_widget(Label(text='换行方式:', font_size='14sp', halign='left'))
+        self.newline_spinner = Spinner(
+            text='Enter',
+            values=['Enter', 'Shift+Enter', '双击空格', '制表符'],
+            font_size='14sp'
+        )
+        params_layout.add_widget(self.newline_spinner)
+        
+        # 输入模式
+        params_layout.add_widget(Label(text='输入模式:', font_size='14sp', halign='left'))
+        mode_layout = BoxLayout(orientation='horizontal', spacing=5)
+        self.typing_mode_spinner = Spinner(
+            text='逐字',
+            values=['逐字', '突发', '宏脚本', '粘贴', '粘贴(逐字)'],
+            font_size='14sp'
+        )
+        self.typing_mode_spinner.bind(text=self.on_typing_mode)
+        self.burst_chunk_input = TextInput(
+            text=str(DEFAULT_BURST_CHUNK),
+            font_size='14sp',
+            multiline=False,
+            input_filter='int',
+            size_hint_x=0.4
+        )
+        mode_layout.add_widget(self.typing_mode_spinner)
+        mode_layout.add_widget(self.burst_chunk_input)
+        params_layout.add_widget(mode_layout)
+        
+        # 输入节奏
+        from keyboard_engine.delay_profiles import FIXED_INTERVAL, PROFILES
+        params_layout.add_widget(Label(text='输入节奏:', font_size='14sp', halign='left'))
+        self.timing_spinner = Spinner(
+            text=FIXED_INTERVAL,
+            values=[FIXED_INTERVAL] + list(PROFILES),
+            font_size='14sp'
+        )
+        params_layout.add_widget(self.timing_spinner)
+    
+    def build_records_panel(self):
+        """构建记录列表, 载入面板构建之前已产生的记录"""
+        from kivy.uix.recycleview import RecycleView
+        from kivy.uix.recycleboxlayout import RecycleBoxLayout
+        
+        # 记录显示区域: RecycleView 只为可见的几行创建控件
+        self.records_view = RecycleView(viewclass=RecordLine)
+        self.records_list = RecycleBoxLayout(
+            orientation='vertical',
+            default_size=(None, dp(20)),
+            default_size_hint=(1, None),
+            size_hint_y=None
+        )
+        self.records_list.bind(minimum_height=self.records_list.setter('height'))
+        self.records_view.add_widget(self.records_list)
+        self.reload_records_view()
+        self.records_layout.add_widget(self.records_view)
+    
+    def reload_records_view(self):
+        """从内存中的记录窗口重新载入记录列表并滚动到底部"""
+        recent = self.records.recent(self.records.capacity)
+        self.records_view.data = [{'text': record} for record in recent] or \
+            [{'text': '等待执行...'}]
+        self.records_view.scroll_y = 0
+    
+    def update_text_stats(self, instance, label):
+        """显示输入框的文本统计, 文件模式和大文档模式下标签留给文件或文档的信息"""
+        # 低开销运行时统计照常累加, 只是推迟到运行结束才显示
+        if self.file_source is None and self.large_document is None and not self.ui_budget.reduced:
+            self.stats_label.text = label
+    
+    def create_worker(self, use_async):
+        """创建执行任务的工作者; 协程引擎使用 async_run() 运行的事件循环, 不占用额外的线程"""
+        if not use_async:
+            return EngineWorker(lambda key: self.create_backend(), self.stop_event)
+        from keyboard_engine.async_engine import AsyncEngineWorker
+        return AsyncEngineWorker(lambda key: self.create_backend())
+    
+    def toggle_async_engine(self, instance, active):
+        """切换线程引擎和协程引擎, 只能在没有任务时切换"""
+        if self.async_engine == active:
+            return
+        if self.worker.busy:
+            # 恢复勾选状态时会再次触发本回调, 上面的判断使其直接返回
+            instance.active = not active
+            self.add_record('请在全部任务结束后再切换引擎')
+            return
+        self.worker.shutdown()
+        self.worker = self.create_worker(active)
+        self.async_engine = active
+        self.add_record(f"[{time.strftime('%H:%M:%S')}] 已切换到{'协程引擎' if active else '线程引擎'}")
+    
+    def toggle_low_overhead(self, instance, active):
+        """切换低开销运行模式, 运行中切换立即生效"""
+        self.ui_budget.low_overhead = active
+        self.apply_ui_budget()
+    
+    def set_minimized(self, minimized):
+        """窗口最小化时降低刷新频率, 还原后恢复"""
+        self.ui_budget.minimized = minimized
+        self.apply_ui_budget()
+    
+    def apply_ui_budget(self):
+        """按当前的刷新预算调整取出事件的频率, 恢复完整刷新时补上跳过的更新"""
+        if self.channel_event is not None:
+            self.channel_event.cancel()
+            self.channel_event = Clock.schedule_interval(self.drain_channel,
+                                                         self.ui_budget.frame_interval)
+        if self.ui_budget.reduced:
+            return
+        if self.file_source is None and self.large_document is None:
+            self.stats_label.text = self.text_input.stats_text
+        if self.records_view is not None:
+            self.reload_records_view()
+        if self.progress_job is not None:
+            self.update_run_labels(self.progress_job)
     
     def update_delay_label(self, instance, value):
         """更新延迟标签"""
@@ -239,13 +759,16 @@ class KeyboardSimulatorApp(App):
         """更新间隔标签"""
         self.interval_label.text = f'{value:.2f}秒'
     
-    def start_simulation(self, instance):
-        """开始模拟"""
-        text_content = self.text_input.text.strip()
-        if not text_content:
-            self.add_record('错误: 请输入要模拟的内容')
-            return
-        
+    def on_typing_mode(self, spinner, mode):
+        """切换到粘贴模式或从粘贴模式切回时, 块大小换成对应模式的默认值"""
+        paste = mode in ('粘贴', '粘贴(逐字)')
+        if paste and self.burst_chunk_input.text == str(DEFAULT_BURST_CHUNK):
+            self.burst_chunk_input.text = str(DEFAULT_PASTE_CHUNK)
+        elif not paste and self.burst_chunk_input.text == str(DEFAULT_PASTE_CHUNK):
+            self.burst_chunk_input.text = str(DEFAULT_BURST_CHUNK)
+    
+    def start_simulation(self, instance, resume=None):
+        """开始模拟; resume 为续打日志中的 ResumeState 时从其检查点继续"""
         try:
             repetitions = int(self.repetition_input.text)
             if repetitions < 1:
@@ -254,120 +777,489 @@ class KeyboardSimulatorApp(App):
             self.add_record('错误: 重复次数必须是正整数')
             return
         
-        # 更新UI状态
-        self.start_button.disabled = True
-        self.stop_button.disabled = False
-        self.stop_event.clear()
-        
-        # 计算总进度
-        total_chars = repetitions * len(text_content)
-        self.progress_bar.max = total_chars
-        self.progress_bar.value = 0
+        burst_chunk = 0
+        if self.typing_mode_spinner.text in ('突发', '粘贴', '粘贴(逐字)'):
+            try:
+                burst_chunk = int(self.burst_chunk_input.text)
+                if burst_chunk < 1:
+                    raise ValueError
+            except ValueError:
+                self.add_record('错误: 块大小必须是正整数')
+                return
         
-        # 启动模拟线程
-        self.simulation_thread = threading.Thread(
-            target=self.simulation_worker,
-            args=(text_content, repetitions),
-            daemon=True
-        )
-        self.simulation_thread.start()
-    
-    def simulation_worker(self, text_content, repetitions):
-        """模拟工作线程"""
-        delay = self.delay_slider.value
         interval = self.interval_slider.value
         newline_mode = self.newline_spinner.text
-        
-        try:
-            # 开始延迟
-            for i in range(int(delay), 0, -1):
-                if self.stop_event.is_set():
+        resumable = True
+        if self.typing_mode_spinner.text == '宏脚本':
+            # 宏脚本: 文件或输入框的内容按宏语法编译, 语法错误在开始前提示
+            from keyboard_engine.macro import MacroCache, compile_macro
+            if self.macro_cache is None:
+                # 编译后的宏按内容哈希缓存在应用数据目录中
+                self.macro_cache = MacroCache(os.path.join(self.user_data_dir, 'macros'))
+            try:
+                if self.file_source is not None:
+                    with open(self.file_source.path, 'r', encoding='utf-8') as f:
+                        text_content = f.read()
+                else:
+                    text_content = self.input_text().strip()
+                if not text_content:
+                    self.add_record('错误: 请输入要模拟的内容')
                     return
-                Clock.schedule_once(lambda dt: self.add_record(f'倒计时: {i}秒'), 0)
-                time.sleep(1)
-            
-            if self.stop_event.is_set():
+                plan = compile_macro(text_content, interval, newline_mode,
+                                     cache=self.macro_cache)
+            except (OSError, ValueError) as e:
+                self.add_record(f'宏脚本错误: {str(e)}')
+                return
+            total_steps = plan.total_steps
+        elif self.typing_mode_spinner.text in ('粘贴', '粘贴(逐字)'):
+            # 粘贴模式: 文件或输入框的内容按块经剪贴板粘贴, 换行随文本一起粘贴;
+            # 无法确认目标是否接收了粘贴, 忽略粘贴的目标需手动选「粘贴(逐字)」逐个字符输入
+            try:
+                if self.file_source is not None:
+                    with open(self.file_source.path, 'r', encoding='utf-8') as f:
+                        text_content = f.read()
+                else:
+                    text_content = self.input_text().strip()
+            except OSError as e:
+                self.add_record(f'错误: 无法读取文件: {str(e)}')
+                return
+            if not text_content:
+                self.add_record('错误: 请输入要模拟的内容')
+                return
+            paste_plan = compile_paste_plan(text_content, burst_chunk, interval,
+                                            self.typing_mode_spinner.text == '粘贴(逐字)')
+            # 进度按块计算: 块数作为权重分摊到每个字符上
+            segment = ((paste_plan, len(paste_plan)),)
+            plan = lambda: segment
+            total_steps = len(paste_plan)
+        elif self.data_source is not None:
+            # 数据模式: 输入框内容作为模板, 每行数据渲染一次, 进度按行数计算
+            text_content = self.input_text().strip()
+            if not text_content:
+                self.add_record('错误: 请在输入框中填写模板')
+                return
+            try:
+                source = self.data_source.with_template(text_content)
+            except ValueError as e:
+                self.add_record(f'模板错误: {str(e)}')
+                return
+            plan = lambda: source.segments(newline_mode, interval, burst_chunk)
+            total_steps = source.rows
+            # 含 {timestamp} 的模板每次渲染的文本不同, 续打的位置对不上, 不记录日志
+            resumable = source.reproducible
+        elif self.file_source is not None:
+            # 文件模式: 运行时按块流式读取和编译, 进度按字节偏移计算
+            source = self.file_source
+            plan = lambda: source.segments(newline_mode, interval, burst_chunk)
+            total_steps = source.size
+        else:
+            text_content = self.input_text().strip()
+            if not text_content:
+                self.add_record('错误: 请输入要模拟的内容')
                 return
             
-            Clock.schedule_once(lambda dt: self.add_record('开始执行模拟输入...'), 0)
-            
-            # 开始输入
-            for rep in range(repetitions):
-                if self.stop_event.is_set():
-                    break
-                
-                for char in text_content:
-                    if self.stop_event.is_set():
-                        break
-                    
-                    if char == '\n':
-                        self.handle_newline(newline_mode)
-                    else:
-                        self.keyboard_controller.type_text(char)
-                    
-                    # 更新进度
-                    Clock.schedule_once(lambda dt: self.update_progress(), 0)
-                    time.sleep(interval)
-                
-                if self.stop_event.is_set():
-                    break
-                
-                # 记录执行结果
-                self.execution_count += 1
-                timestamp = time.strftime('%H:%M:%S')
-                record = f'[{timestamp}] 第{self.execution_count}次执行完成'
-                Clock.schedule_once(lambda dt, r=record: self.add_record(r), 0)
-            
+            # 文本和换行方式只编译一次, 所有重复执行共用同一个按键计划
+            plan = compile_plan(text_content, newline_mode, interval, burst_chunk)
+            total_steps = plan.total_steps
+        
+        from keyboard_engine.telemetry import RunTelemetry
+        
+        # 更新UI状态; 运行中仍可继续添加任务, 新任务排在队尾
+        self.stop_button.disabled = False
+        self.pause_button.disabled = False
+        
+        if self.file_source is not None:
+            label = self.file_source.describe()
+        elif self.data_source is not None:
+            label = self.data_source.describe()
+        else:
+            label = text_content[:12]
+        
+        from keyboard_engine.delay_profiles import FIXED_INTERVAL, HumanTiming, wpm_from_interval
+        timing = None
+        if self.timing_spinner.text != FIXED_INTERVAL:
+            # 类人节奏: 平均速率与字符间隔一致, 全部等待时间在开始前按随机种子生成
+            timing = HumanTiming(self.timing_spinner.text, wpm_from_interval(interval))
+            if resume is not None and resume.timing is not None:
+                # 继续时沿用上次的种子和生成实现, 等待时间与上次相同
+                try:
+                    timing.restore(resume.timing)
+                except ValueError as e:
+                    self.add_record(f'错误: {str(e)}')
+                    return
+        
+        params = {
+            'mode': self.typing_mode_spinner.text,
+            'newline_mode': newline_mode,
+            'interval': interval,
+            'chunk': burst_chunk,
+            'repetitions': repetitions,
+            'delay': self.delay_slider.value,
+            'timing': self.timing_spinner.text,
+        }
+        
+        # 每个任务使用独立的事件通道, 由界面线程按固定帧率取出
+        job = Job(plan, repetitions, self.delay_slider.value, interval,
+                  channel=UIEventChannel(),
+                  announce=True,
+                  telemetry=RunTelemetry(),
+                  backend_key='default',
+                  label=label,
+                  total_units=total_steps,
+                  start=resume.checkpoint if resume is not None else None,
+                  timing=timing,
+                  journal=self.journal_recorder(params, timing) if resumable else None)
+        if self.worker.busy:
+            self.add_record(f'已加入队列: {job.describe()}')
+        self.worker.submit(job)
+        self.active_jobs.append(job)
+        if self.channel_event is None:
+            self.channel_event = Clock.schedule_interval(self.drain_channel,
+                                                         self.ui_budget.frame_interval)
+        if not self.ui_budget.running:
+            self.ui_budget.begin_run()
+            self.apply_ui_budget()
+    
+    def journal_recorder(self, params, timing):
+        """为任务创建续打日志写入器; 文件模式只记录文件, 其余模式记录输入框的文本"""
+        files = {}
+        if self.file_source is not None:
+            files['file'] = self.file_source.path
+        if self.data_source is not None:
+            files['data'] = self.data_source.path
+        text = None if self.file_source is not None else self.input_text().strip()
+        try:
+            return self.journal.recorder(params, text, files, timing)
+        except OSError:
+            return None
+    
+    def resume_simulation(self, instance):
+        """恢复上次没有完成的任务的文本和参数, 从最后落盘的位置继续"""
+        try:
+            state = self.journal.load()
+        except ValueError as e:
+            self.journal.clear()
+            self.add_record(f'无法继续: {str(e)}, 已丢弃上次的续打日志')
+            return
+        if state is None:
+            self.add_record('没有可以继续的任务')
+            return
+        
+        if self.file_source is not None:
+            self.exit_file_mode()
+        if self.data_source is not None:
+            self.exit_data_mode()
+        if 'data' in state.files:
+            self.enter_data_mode(state.files['data'])
+            if self.data_source is None:
+                return
+        if 'file' in state.files:
+            self.enter_file_mode(state.files['file'])
+            if self.file_source is None:
+                return
+        if state.text is not None:
+            self.set_input_text(state.text)
+        
+        params = state.params
+        self.typing_mode_spinner.text = params['mode']
+        self.newline_spinner.text = params['newline_mode']
+        self.interval_slider.value = params['interval']
+        self.delay_slider.value = params['delay']
+        self.repetition_input.text = str(params['repetitions'])
+        if params['chunk']:
+            self.burst_chunk_input.text = str(params['chunk'])
+        self.timing_spinner.text = params['timing']
+        
+        repetition, offset = state.checkpoint
+        # 之前已经完成的执行次数计入总数
+        self.execution_count = max(self.execution_count, repetition)
+        self.add_record(f'继续上次的任务: 从第{repetition + 1}次执行的第{offset}步开始')
+        self.start_simulation(instance, resume=state)
+    
+    def toggle_file_source(self, instance):
+        """进入或退出文件模式; 文件模式下文本不载入输入框, 运行时流式读取"""
+        if self.file_source is not None:
+            self.exit_file_mode()
+            return
+        if self.data_source is not None:
+            self.exit_data_mode()
+        try:
+            from plyer import filechooser
+            filechooser.open_file(on_selection=self.on_file_selection)
         except Exception as e:
-            Clock.schedule_once(lambda dt: self.add_record(f'错误: {str(e)}'), 0)
-        finally:
-            # 清理工作
+            self.add_record(f'错误: 无法打开文件选择器: {str(e)}')
+    
+    def on_file_selection(self, selection):
+        """文件选择回调, 可能在其它线程中调用"""
+        if selection:
+            path = selection[0]
+            Clock.schedule_once(lambda dt: self.enter_file_mode(path), 0)
+    
+    def enter_file_mode(self, path):
+        """进入文件模式"""
+        from keyboard_engine.text_source import FileTextSource
+        try:
+            self.file_source = FileTextSource(path)
+        except Exception as e:
+            self.add_record(f'错误: 无法读取文件: {str(e)}')
+            return
+        if self.large_document is not None:
+            self.exit_large_mode()
+        self.text_input.text = ''
+        self.text_input.readonly = True
+        self.text_input.hint_text = f'[文件模式] {path}'
+        self.stats_label.text = f'文件: {self.file_source.describe()}'
+        self.load_button.text = '退出文件模式'
+    
+    def exit_file_mode(self):
+        """退出文件模式并恢复可编辑的输入框"""
+        self.file_source = None
+        self.text_input.readonly = False
+        self.text_input.hint_text = ''
+        self.text_input.text = ''
+        self.load_button.text = '载入文件'
+        self.stats_label.text = self.text_input.stats.label()
+    
+    def input_text(self):
+        """输入的全部文本; 大文档模式下为预览中的文档"""
+        if self.large_document is not None:
+            return self.large_document.index.text
+        return self.text_input.text
+    
+    def set_input_text(self, text):
+        """替换输入的文本, 超长时改用大文档预览"""
+        from keyboard_engine.large_document import LARGE_TEXT_THRESHOLD
+        if len(text) > LARGE_TEXT_THRESHOLD:
+            self.enter_large_mode(text)
+            return
+        if self.large_document is not None:
+            self.exit_large_mode()
+        self.text_input.text = text
+    
+    def enter_large_mode(self, text):
+        """用只读的分窗预览代替输入框显示 text; 行首索引只在这里建立一次"""
+        from keyboard_engine.large_document import DocumentView, LineIndex
+        if self.document_preview is None:
+            self.document_preview = DocumentPreview(self.exit_large_mode)
+        if self.large_document is None:
+            # 预览放在输入框原来的位置 (统计标签之上)
+            index = self.input_layout.children.index(self.input_scroll)
+            self.input_layout.remove_widget(self.input_scroll)
+            self.input_layout.add_widget(self.document_preview, index=index)
+        self.large_document = DocumentView(LineIndex(text))
+        self.text_input.text = ''
+        self.document_preview.show(self.large_document)
+        stats = TextStats()
+        stats.reset(text)
+        self.stats_label.text = stats.label()
+        self.add_record(f"[{time.strftime('%H:%M:%S')}] 文本较长 ({len(text)}字符), "
+                        "已改为只读的大文档预览")
+    
+    def exit_large_mode(self):
+        """关闭大文档并恢复空白的输入框"""
+        if self.large_document is None:
+            return
+        self.large_document = None
+        self.document_preview.view = None
+        index = self.input_layout.children.index(self.document_preview)
+        self.input_layout.remove_widget(self.document_preview)
+        self.input_layout.add_widget(self.input_scroll, index=index)
+        self.stats_label.text = self.text_input.stats.label()
+    
+    def toggle_data_source(self, instance):
+        """进入或退出数据模式; 数据模式下输入框的内容作为模板, 每行数据填充一次"""
+        if self.data_source is not None:
+            self.exit_data_mode()
+            return
+        try:
+            from plyer import filechooser
+            filechooser.open_file(on_selection=self.on_data_selection,
+                                  filters=[['数据文件', '*.csv', '*.jsonl', '*.ndjson']])
+        except Exception as e:
+            self.add_record(f'错误: 无法打开文件选择器: {str(e)}')
+    
+    def on_data_selection(self, selection):
+        """数据文件选择回调, 可能在其它线程中调用"""
+        if selection:
+            path = selection[0]
+            Clock.schedule_once(lambda dt: self.enter_data_mode(path), 0)
+    
+    def enter_data_mode(self, path):
+        """进入数据模式"""
+        from keyboard_engine.templating import TemplateSource
+        try:
+            data_source = TemplateSource('', path)
+        except Exception as e:
+            self.add_record(f'错误: 无法读取数据文件: {str(e)}')
+            return
+        if self.file_source is not None:
+            self.exit_file_mode()
+        self.data_source = data_source
+        self.text_input.hint_text = '模板, 可用 {row.字段}、{i}、{timestamp}'
+        self.data_button.text = '退出数据模式'
+        self.add_record(f'已载入数据: {data_source.describe()}')
+    
+    def exit_data_mode(self):
+        """退出数据模式, 输入框恢复为普通文本"""
+        self.data_source = None
+        self.text_input.hint_text = ''
+        self.data_button.text = '载入数据'
+    
+    def create_backend(self):
+        """桌面Linux上安装了pynput时发送真实按键, 其余平台输出到界面"""
+        if platform == 'linux' and pynput_available():
+            backend = PynputBackend()
+            backend.set_clipboard(self.clipboard)
+            return backend
+        return self.keyboard_controller
+    
+    def drain_channel(self, dt):
+        """每帧取出一次各任务的聚合事件并应用到界面"""
+        current = self.worker.current
+        if current is not None and current is not self.progress_job:
+            # 工作线程开始了下一个任务, 进度条和输出预览切换到该任务
+            self.progress_job = current
+            self.telemetry = current.telemetry
+            self.progress_bar.max = current.repetitions * current.total_units
+            self.progress_bar.value = 0
+            self.output_mirror.clear()
+            self.output_preview.text = ''
+            self.pause_button.text = '继续' if self.worker.engine.paused else '暂停'
+        
+        preview = self.output_mirror.flush()
+        if preview is not None:
+            self.output_preview.text = preview
+            self.output_preview.cursor = self.output_preview.get_cursor_from_index(len(preview))
+        
+        job = self.progress_job
+        for active in list(self.active_jobs):
+            update = active.channel.drain()
+            if update is None:
+                continue
+            if update.progress and active is job:
+                self.progress_bar.value += update.progress
+            self.execution_count += update.executions
+            records = update.records + update.errors
+            if records:
+                self.add_records(records)
+            if update.finished:
+                self.active_jobs.remove(active)
+        
+        if job is not None and not self.ui_budget.reduced:
+            self.update_run_labels(job)
+        
+        if not self.active_jobs:
+            # 队列中的任务全部结束后的清理, 恢复完整刷新并记录界面线程的开销
+            if job is not None:
+                self.update_run_labels(job)
+            self.ui_budget.end_run()
             if self.clear_checkbox.active:
-                Clock.schedule_once(lambda dt: setattr(self.text_input, 'text', ''), 0)
-            
-            Clock.schedule_once(lambda dt: self.reset_ui_state(), 0)
-    
-    def handle_newline(self, mode):
-        """处理换行"""
-        if mode == 'Enter':
-            self.keyboard_controller.press_enter()
-        elif mode == 'Shift+Enter':
-            self.keyboard_controller.type_text('\n')
-        elif mode == '双击空格':
-            self.keyboard_controller.type_text('  ')
-        elif mode == '制表符':
-            self.keyboard_controller.type_text('\t')
-    
-    def update_progress(self):
-        """更新进度条"""
-        self.progress_bar.value += 1
+                if self.file_source is not None:
+                    self.exit_file_mode()
+                elif self.large_document is not None:
+                    self.exit_large_mode()
+                else:
+                    self.text_input.text = ''
+            self.progress_job = None
+            self.reset_ui_state()
+            self.channel_event.cancel()
+            self.channel_event = None
+            self.apply_ui_budget()
+            self.add_record(f"[{time.strftime('%H:%M:%S')}] {self.ui_budget.summary()}")
+    
+    def update_run_labels(self, job):
+        """刷新遥测和事件通道统计标签"""
+        self.telemetry_label.text = self.telemetry.summary(self.progress_bar.value,
+                                                           self.progress_bar.max)
+        self.channel_stats_label.text = job.channel.stats_text()
     
     def stop_simulation(self, instance):
-        """停止模拟"""
-        self.stop_event.set()
+        """停止模拟; 等工作线程确认不再发送按键之后才记录已停止"""
+        running = self.worker.current is not None
+        # 停止正在执行的任务并清空队列
+        self.worker.cancel_all()
+        if self.async_engine:
+            # 任务在本线程的事件循环中执行, 不能在这里阻塞等待, 确认停止后再记录
+            import asyncio
+            asyncio.get_running_loop().create_task(self.record_stopped(running))
+            return
+        self.worker.wait_idle(1.0)
+        self.reset_ui_state()
+        self.add_record(self.stopped_record(running))
+    
+    async def record_stopped(self, running):
+        """协程引擎: 等任务在事件循环中结束后再记录已停止"""
+        await self.worker.idle(1.0)
         self.reset_ui_state()
-        self.add_record('模拟已停止')
+        self.add_record(self.stopped_record(running))
+    
+    def stopped_record(self, running):
+        """停止后的记录, 带上停止延迟和停止位置"""
+        record = '模拟已停止'
+        engine = self.worker.engine
+        if running and engine.stop_latency is not None:
+            record += (f' (停止延迟 {engine.stop_latency * 1000:.2f}ms, '
+                       f'{engine.describe_checkpoint()})')
+        return record
+    
+    def toggle_pause(self, instance):
+        """暂停或继续当前任务, 继续时从暂停的字符位置接着输入"""
+        if self.worker.current is None:
+            return
+        if self.worker.engine.paused:
+            self.worker.resume()
+            self.pause_button.text = '暂停'
+            self.add_record(f"[{time.strftime('%H:%M:%S')}] 继续执行")
+        else:
+            # 工作线程停在暂停点时会把精确位置写入执行记录
+            self.worker.pause()
+            self.pause_button.text = '继续'
     
     def reset_ui_state(self):
         """重置UI状态"""
-        self.start_button.disabled = False
         self.stop_button.disabled = True
+        self.pause_button.disabled = True
+        self.pause_button.text = '暂停'
         self.progress_bar.value = 0
     
     def add_record(self, record):
         """添加记录"""
-        self.records.append(record)
-        # 只显示最近的10条记录
-        recent_records = self.records[-10:]
-        self.records_display.text = '\n'.join(recent_records)
-        self.records_display.text_size = (self.records_display.parent.width, None)
+        self.add_records([record])
+    
+    def add_records(self, records):
+        """批量添加记录, 列表数据与内存中的记录窗口保持相同长度"""
+        view = self.records_view
+        if view is None or self.ui_budget.reduced:
+            # 记录列表还没有创建 (创建时从记录中载入), 或低开销运行中 (结束后重新载入)
+            self.records.extend(records)
+            return
+        data = view.data
+        # 停在底部 (或内容还没有超出视图) 时跟随最新记录
+        follow = view.scroll_y <= 0.01 or self.records_list.height <= view.height
+        if not self.records:
+            del data[:]  # 去掉占位提示
+        self.records.extend(records)
+        data.extend({'text': record} for record in records)
+        overflow = len(data) - self.records.capacity
+        if overflow > 0:
+            del data[:overflow]
+        if follow:
+            view.scroll_y = 0
     
     def on_simulated_output(self, text):
-        """处理模拟输出（在移动端显示在记录区域）"""
-        if text == '\n':
-            self.add_record('执行: [回车]')
-        else:
-            self.add_record(f'输入: {text}')
+        """处理模拟输出（在移动端显示在输出预览）, 在工作线程中调用, 只写入镜像缓冲"""
+        self.output_mirror.write(text)
+    
+    def on_stop(self):
+        """退出时停止模拟并删除记录的溢写文件"""
+        self.worker.shutdown()
+        self.records.close()
 
 if __name__ == '__main__':
-    KeyboardSimulatorApp().run()
\ No newline at end of file
+    app = KeyboardSimulatorApp()
+    if app.async_loop:
+        # 在 asyncio 事件循环中运行界面, 协程引擎的任务与界面共用这个循环
+        import asyncio
+        asyncio.run(app.async_run(async_lib='asyncio'))
+    else:
+        app.run()
\ No newline at end of file
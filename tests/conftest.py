@@ -0,0 +1,5 @@
+"""测试共用的设置: 让测试直接导入仓库根目录下的 keyboard_engine"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,301 @@
+"""协程引擎与线程引擎执行同一套回放逻辑, 输出、统计和停止位置一致"""
+import asyncio
+import heapq
+import itertools
+import time
+
+import pytest
+
+from keyboard_engine.async_engine import AsyncEngineWorker, AsyncTypingEngine, TkLoopPump
+from keyboard_engine.backends import RecordingBackend
+from keyboard_engine.engine import Checkpoint, TypingEngine
+from keyboard_engine.keystroke_plan import compile_plan
+from keyboard_engine.macro import compile_macro
+from keyboard_engine.resume_journal import ResumeJournal
+from keyboard_engine.ui_channel import UIEventChannel
+from keyboard_engine.worker import Job
+
+MACRO = 'ab{enter}c{ctrl+a}d{wait 0.02}ef'
+
+
+class TimedBackend(RecordingBackend):
+    """记录每个动作的时刻"""
+
+    def __init__(self):
+        super().__init__()
+        self.times = []
+        self.closed = False
+
+    def type_text(self, text):
+        super().type_text(text)
+        self.times.append(time.perf_counter())
+
+    def tap(self, key):
+        super().tap(key)
+        self.times.append(time.perf_counter())
+
+    def combo(self, modifiers, key):
+        super().combo(modifiers, key)
+        self.times.append(time.perf_counter())
+
+    def close(self):
+        self.closed = True
+
+
+class StoppingBackend(RecordingBackend):
+    """输出 limit 个动作后请求停止"""
+
+    def __init__(self, limit):
+        super().__init__()
+        self.limit = limit
+        self.engine = None
+
+    def type_text(self, text):
+        super().type_text(text)
+        if len(self.events) >= self.limit:
+            self.engine.stop()
+
+
+def run_sync(plan, repetitions=1, backend=None, **options):
+    backend = backend if backend is not None else RecordingBackend()
+    engine = TypingEngine(backend)
+    backend.engine = engine
+    return engine, engine.run(plan, repetitions, **options)
+
+
+def run_async(plan, repetitions=1, backend=None, **options):
+    backend = backend if backend is not None else RecordingBackend()
+    engine = AsyncTypingEngine(backend)
+    backend.engine = engine
+    return engine, asyncio.run(engine.run(plan, repetitions, **options))
+
+
+@pytest.mark.parametrize('burst_chunk', [0, 3])
+def test_same_calls_and_stats(burst_chunk):
+    plan = compile_macro(MACRO, 0.0, 'Enter', burst_chunk)
+    sync_engine, sync_result = run_sync(plan, 2, backend=TimedBackend())
+    async_engine, async_result = run_async(plan, 2, backend=TimedBackend())
+    events = sync_engine.backend.events
+    assert ('tap', 'enter') in events and ('combo', ('ctrl',), 'a') in events
+    assert async_engine.backend.events == events
+    for key in ('ticks', 'units', 'completed', 'stopped', 'checkpoint'):
+        assert async_result[key] == sync_result[key]
+    assert async_result['requested_time'] == pytest.approx(sync_result['requested_time'])
+    assert sync_result['requested_time'] == pytest.approx(0.04)
+
+
+def test_both_engines_honour_waits():
+    plan = compile_macro(MACRO, 0.0)
+    for run in (run_sync, run_async):
+        engine, _ = run(plan, backend=TimedBackend())
+        backend = engine.backend
+        index = backend.events.index(('text', 'e'))
+        # {wait 0.02} 位于 d 和 e 之间, 其余动作之间没有间隔
+        assert backend.times[index] - backend.times[index - 1] >= 0.019
+        assert backend.times[index - 1] - backend.times[0] < 0.015
+
+
+def test_resume_from_checkpoint_matches():
+    plan = compile_macro(MACRO, 0.0)
+    start = Checkpoint(1, 4)
+    sync_engine, _ = run_sync(plan, 2, start=start)
+    async_engine, _ = run_async(plan, 2, start=start)
+    assert async_engine.backend.events == sync_engine.backend.events
+
+
+def test_stop_at_same_position():
+    plan = compile_plan('x' * 20, 'Enter', 0.001)
+    sync_engine, sync_result = run_sync(plan, backend=StoppingBackend(5))
+    async_engine, async_result = run_async(plan, backend=StoppingBackend(5))
+    assert async_result['stopped'] and sync_result['stopped']
+    assert async_result['checkpoint'] == sync_result['checkpoint']
+    assert len(async_engine.backend.events) == 5
+    assert async_result['stop_latency'] is not None
+
+
+def test_pause_holds_and_resume_continues():
+    plan = compile_plan('x' * 10, 'Enter', 0.002)
+    engine = AsyncTypingEngine(RecordingBackend())
+
+    async def main():
+        task = asyncio.ensure_future(engine.run(plan))
+        await asyncio.sleep(0.006)
+        engine.pause()
+        await asyncio.sleep(0.01)
+        typed = len(engine.backend.events)
+        await asyncio.sleep(0.03)
+        assert len(engine.backend.events) == typed
+        engine.resume()
+        return await task
+
+    result = asyncio.run(main())
+    assert not result['stopped']
+    assert len(engine.backend.events) == 10
+    assert result['paused_time'] >= 0.03
+
+
+def test_stop_before_start_outputs_nothing():
+    plan = compile_plan('abc', 'Enter', 0.0)
+    engine = AsyncTypingEngine(RecordingBackend())
+    engine.stop()
+    result = asyncio.run(engine.run(plan, delay=1.0))
+    assert result['stopped']
+    assert engine.backend.events == []
+
+
+def test_worker_runs_jobs_in_order_with_journal(tmp_path):
+    loop = asyncio.new_event_loop()
+    backend = RecordingBackend()
+    wakes = []
+    worker = AsyncEngineWorker(lambda key: backend, loop, wake=lambda: wakes.append(1))
+    journal = ResumeJournal(str(tmp_path))
+    try:
+        for text in ('first', 'second'):
+            plan = compile_plan(text, 'Enter', 0.0)
+            recorder = journal.recorder({'text': text}, text=text)
+            worker.submit(Job(plan, backend_key='recording', journal=recorder))
+        assert wakes
+        assert worker.next_wake() is not None
+        assert worker.wait_idle(5.0)
+    finally:
+        worker.shutdown()
+        loop.close()
+    assert backend.text() == 'firstsecond'
+    assert worker.executions == 2
+    # 两个任务依次写同一个日志, 最后一个完整结束
+    assert journal.load() is None
+
+
+def test_worker_wait_idle_refuses_inside_running_loop():
+    async def main():
+        worker = AsyncEngineWorker(lambda key: RecordingBackend())
+        worker.submit(Job(compile_plan('abc', 'Enter', 0.01), backend_key='recording'))
+        with pytest.raises(RuntimeError):
+            worker.wait_idle(1.0)
+        await asyncio.sleep(0.015)
+        assert worker.current is not None
+        worker.cancel_all()
+        assert await worker.idle(1.0)
+        assert worker.engine.stop_latency is not None
+
+    asyncio.run(main())
+
+
+def test_jobs_with_own_backends_run_concurrently(tmp_path):
+    journal = ResumeJournal(str(tmp_path))
+    channels = [UIEventChannel(), UIEventChannel()]
+    backends = [TimedBackend(), TimedBackend()]
+
+    async def main():
+        worker = AsyncEngineWorker(lambda key: RecordingBackend())
+        jobs = [worker.submit(Job(compile_plan(text * 10, 'Enter', 0.01), backend=backend,
+                                  channel=channel, journal=journal.recorder({}, text=text)))
+                for text, backend, channel in zip('ab', backends, channels)]
+        assert [job.state for job in jobs] == ['running', 'running']
+        assert await worker.idle(5.0)
+        return jobs
+
+    started = time.perf_counter()
+    jobs = asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    assert [backend.text() for backend in backends] == ['a' * 10, 'b' * 10]
+    assert all(job.state == 'done' for job in jobs)
+    # 两个流交错输出, 总耗时约为一个流的耗时
+    assert backends[1].times[0] < backends[0].times[-1]
+    assert elapsed < 0.18
+    # 只有先开始的任务写续打日志, 另一个在执行记录中说明
+    records = [channel.drain().records for channel in channels]
+    assert not any('续打日志' in record for record in records[0])
+    assert any('无法写入续打日志' in record for record in records[1])
+    assert journal.active is None and backends[0].closed and backends[1].closed
+
+
+def test_cancel_stops_the_running_task_and_releases_resources(tmp_path):
+    journal = ResumeJournal(str(tmp_path))
+    backend = TimedBackend()
+
+    async def main():
+        worker = AsyncEngineWorker(lambda key: RecordingBackend())
+        job = worker.submit(Job(compile_plan('x' * 10, 'Enter', 0.5), backend=backend,
+                                journal=journal.recorder({}, text='x' * 10)))
+        while not backend.events:
+            await asyncio.sleep(0.005)
+        worker.cancel(job.id)
+        assert await worker.idle(1.0)
+        return job
+
+    job = asyncio.run(main())
+    assert job.state == 'cancelled'
+    assert job.result['stopped']
+    # 取消打断了0.5秒的等待, 停止延迟由取消的路径记录
+    assert job.result['stop_latency'] is not None and job.result['stop_latency'] < 0.1
+    assert backend.text() == 'x' and backend.closed
+    assert journal.active is None
+    assert journal.load().checkpoint == Checkpoint(0, 1)
+
+
+def test_cancel_from_outside_the_worker_ends_the_run():
+    plan = compile_plan('x' * 10, 'Enter', 0.5)
+    engine = AsyncTypingEngine(RecordingBackend())
+
+    async def main():
+        task = asyncio.ensure_future(engine.run(plan))
+        await asyncio.sleep(0.05)
+        # 例如关闭事件循环时取消所有任务
+        task.cancel()
+        return await task
+
+    result = asyncio.run(main())
+    assert result['stopped'] and result['stop_latency'] is not None
+    assert result['checkpoint'] == {'repetition': 0, 'offset': 1}
+
+
+class FakeWidget:
+    """只实现 after 和 after_cancel 的Tk控件, mainloop 按时间顺序执行回调"""
+
+    def __init__(self):
+        self.timers = []
+        self.ids = itertools.count()
+        self.cancelled = set()
+        self.pumps = 0
+
+    def after(self, ms, callback):
+        timer_id = next(self.ids)
+        heapq.heappush(self.timers, (time.perf_counter() + ms / 1000, timer_id, callback))
+        return timer_id
+
+    def after_cancel(self, timer_id):
+        self.cancelled.add(timer_id)
+
+    def mainloop(self, done):
+        while self.timers and not done():
+            when, timer_id, callback = heapq.heappop(self.timers)
+            if timer_id in self.cancelled:
+                continue
+            time.sleep(max(0.0, when - time.perf_counter()))
+            callback()
+
+
+def test_pump_wakes_per_tick_and_sleeps_while_idle():
+    widget = FakeWidget()
+    pump = TkLoopPump(widget)
+    backend = RecordingBackend()
+    worker = AsyncEngineWorker(lambda key: backend, pump.loop, wake=pump.wake)
+    pump.next_wake = worker.next_wake
+    original = pump._pump
+
+    def counted():
+        widget.pumps += 1
+        original()
+    pump._pump = counted
+    try:
+        worker.submit(Job(compile_plan('x' * 20, 'Enter', 0.01), backend_key='recording'))
+        widget.mainloop(lambda: not worker.busy)
+        assert backend.text() == 'x' * 20
+        # 约每个节拍两次 (定时器到期、任务恢复), 而不是每毫秒一次
+        assert widget.pumps <= 3 * 20 + 5
+        # 空闲后不再安排推进
+        assert all(timer_id in widget.cancelled for _, timer_id, _ in widget.timers)
+    finally:
+        worker.shutdown()
+        pump.close()
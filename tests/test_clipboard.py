@@ -0,0 +1,152 @@
+"""剪贴板粘贴: 恢复原有内容、写入失败时逐字输入和跨线程访问"""
+import threading
+
+from keyboard_engine.clipboard import (ClipboardError, ClipboardPaster, ClipboardProvider,
+                                       UIThreadClipboard)
+
+
+class MemoryClipboard(ClipboardProvider):
+    """内存中的剪贴板; frozen 时写入不生效, 模拟被其他程序占用"""
+
+    def __init__(self, text=None, frozen=False):
+        self.text = text
+        self.frozen = frozen
+        self.writes = []
+
+    def get_text(self):
+        return self.text
+
+    def set_text(self, text):
+        self.writes.append(text)
+        if not self.frozen:
+            self.text = text
+
+
+def make_paster(clipboard):
+    pasted, typed = [], []
+    paster = ClipboardPaster(clipboard, lambda: pasted.append(clipboard.get_text()),
+                             typed.append)
+    return paster, pasted, typed
+
+
+def test_chunks_are_pasted_and_counted():
+    clipboard = MemoryClipboard('原有内容')
+    paster, pasted, typed = make_paster(clipboard)
+    for chunk in ('abc', 'de\n', 'f'):
+        paster.paste(chunk)
+    assert pasted == ['abc', 'de\n', 'f'] and typed == []
+    stats = paster.stats()
+    assert (stats['chunks'], stats['chars'], stats['fallback_chars']) == (3, 7, 0)
+    assert stats['error'] is None
+    assert paster.summary().startswith('粘贴输入 3块 7字符')
+
+
+def test_restore_puts_back_the_original_text_once():
+    clipboard = MemoryClipboard('原有内容')
+    paster, _, _ = make_paster(clipboard)
+    paster.paste('abc')
+    paster.restore()
+    assert clipboard.text == '原有内容'
+    writes = len(clipboard.writes)
+    paster.restore()
+    assert len(clipboard.writes) == writes
+
+
+def test_restore_clears_non_text_clipboard_and_skips_unused_one():
+    clipboard = MemoryClipboard(None)
+    paster, _, _ = make_paster(clipboard)
+    paster.restore()
+    # 没有粘贴过就不动剪贴板
+    assert clipboard.writes == []
+    paster.paste('abc')
+    paster.restore()
+    assert clipboard.text == ''
+
+
+def test_failed_read_back_falls_back_to_typing():
+    clipboard = MemoryClipboard('原有内容', frozen=True)
+    paster, pasted, typed = make_paster(clipboard)
+    paster.paste('abc')
+    paster.paste('de')
+    # 读回不一致时不发送粘贴, 这一块和之后的块都改为逐字输入
+    assert pasted == [] and typed == ['abc', 'de']
+    assert len(clipboard.writes) == 1
+    stats = paster.stats()
+    assert (stats['chunks'], stats['chars'], stats['fallback_chars']) == (0, 0, 5)
+    assert stats['error'] == '剪贴板内容没有更新'
+    assert '逐字输入 5字符' in paster.summary()
+
+
+def test_ui_thread_clipboard_runs_requests_on_the_ui_thread():
+    provider = MemoryClipboard('x')
+    seen = []
+    original = provider.set_text
+
+    def set_text(text):
+        seen.append(threading.current_thread())
+        original(text)
+    provider.set_text = set_text
+    woken = threading.Event()
+    clipboard = UIThreadClipboard(provider, wake=woken.set)
+    results = []
+    worker = threading.Thread(target=lambda: (clipboard.set_text('y'),
+                                              results.append(clipboard.get_text())))
+    worker.start()
+    while worker.is_alive():
+        if woken.wait(0.01):
+            woken.clear()
+            clipboard.service()
+    worker.join()
+    assert results == ['y']
+    assert seen == [threading.current_thread()]
+
+
+def test_ui_thread_clipboard_times_out_and_drops_the_request():
+    provider = MemoryClipboard('x')
+    clipboard = UIThreadClipboard(provider, timeout=0.02)
+    errors = []
+
+    def write():
+        try:
+            clipboard.set_text('late')
+        except ClipboardError as e:
+            errors.append(e)
+    worker = threading.Thread(target=write)
+    worker.start()
+    worker.join()
+    assert len(errors) == 1
+    # 超时的请求之后不再执行, 不会覆盖剪贴板
+    clipboard.service()
+    assert provider.text == 'x' and provider.writes == []
+
+
+def test_ui_thread_clipboard_reports_provider_errors():
+    class Broken(MemoryClipboard):
+        def get_text(self):
+            raise RuntimeError('clipboard locked')
+
+    clipboard = UIThreadClipboard(Broken(), wake=lambda: None)
+    errors = []
+
+    def read():
+        try:
+            clipboard.get_text()
+        except ClipboardError as e:
+            errors.append(str(e))
+    worker = threading.Thread(target=read)
+    worker.start()
+    while worker.is_alive():
+        clipboard.service()
+        worker.join(0.005)
+    assert errors == ['clipboard locked']
+
+
+def test_paster_with_unavailable_ui_thread_types_everything():
+    clipboard = UIThreadClipboard(MemoryClipboard('x'), timeout=0.01)
+    pasted, typed = [], []
+    paster = ClipboardPaster(clipboard, lambda: pasted.append(1), typed.append)
+    thread = threading.Thread(target=lambda: [paster.paste(chunk) for chunk in ('ab', 'c')])
+    thread.start()
+    thread.join()
+    assert pasted == [] and typed == ['ab', 'c']
+    assert paster.stats()['fallback_chars'] == 3
@@ -0,0 +1,127 @@
+"""类人节奏: 每次重复的等待时间总和与目标速率一致"""
+import math
+
+import pytest
+
+from keyboard_engine.delay_profiles import (PROFILES, HumanTiming, KIND_WAIT, tick_layout,
+                                            wpm_from_interval)
+from keyboard_engine.keystroke_plan import compile_plan
+from keyboard_engine.macro import compile_macro
+
+TEXT = 'Hello, world! 这是一段测试文本。\nSecond line: with punctuation; and spaces.'
+
+
+def budget(plan, timing):
+    """计划一次重复的目标总等待时间 (不含宏中的固定等待)"""
+    kinds, units, waits = tick_layout(plan)
+    return sum(units) * timing.unit_time
+
+
+def non_wait_sum(row, plan):
+    kinds, _, _ = tick_layout(plan)
+    return math.fsum(delay for kind, delay in zip(kinds, row) if kind != KIND_WAIT)
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+@pytest.mark.parametrize('profile', list(PROFILES))
+def test_each_repetition_sums_to_the_budget(profile, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    plan = compile_plan(TEXT, 'Enter', 0.05)
+    timing = HumanTiming(profile, wpm_from_interval(0.05), seed=7, use_numpy=use_numpy)
+    schedule = timing.schedule(plan, 5)
+    assert schedule.ticks == len(tick_layout(plan)[0])
+    for rep in range(5):
+        row = schedule.row(rep)
+        assert len(row) == schedule.ticks
+        assert all(delay >= 0 for delay in row)
+        assert non_wait_sum(row, plan) == pytest.approx(budget(plan, timing), rel=1e-9)
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_burst_chunks_weigh_by_their_units(use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    plan = compile_plan(TEXT, 'Enter', 0.05, burst_chunk=8)
+    timing = HumanTiming('自然', 600, seed=3, use_numpy=use_numpy)
+    row = timing.schedule(plan).row(0)
+    assert non_wait_sum(row, plan) == pytest.approx(plan.total_steps * timing.unit_time)
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_macro_waits_keep_their_length(use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    plan = compile_macro('abc{wait 1.5}def{enter}', 0.05)
+    timing = HumanTiming('突发停顿', 200, seed=11, use_numpy=use_numpy)
+    row = timing.schedule(plan).row(0)
+    kinds, _, _ = tick_layout(plan)
+    assert [delay for kind, delay in zip(kinds, row) if kind == KIND_WAIT] == [1.5]
+    assert non_wait_sum(row, plan) == pytest.approx(budget(plan, timing))
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_same_seed_reproduces_the_run(use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    plan = compile_plan(TEXT, 'Enter', 0.05)
+    first = HumanTiming('自然', 300, seed=42, use_numpy=use_numpy).schedule(plan, 3)
+    second = HumanTiming('自然', 300, seed=42, use_numpy=use_numpy).schedule(plan, 3)
+    assert [first.row(i) for i in range(3)] == [second.row(i) for i in range(3)]
+    other = HumanTiming('自然', 300, seed=43, use_numpy=use_numpy).schedule(plan, 1)
+    assert other.row(0) != first.row(0)
+
+
+def test_segment_key_changes_the_schedule():
+    plan = compile_plan(TEXT, 'Enter', 0.05)
+    timing = HumanTiming('自然', 300, seed=1, use_numpy=False)
+    assert timing.schedule(plan, 1, (0, 0)).row(0) != timing.schedule(plan, 1, (0, 1)).row(0)
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_schedule_blocks_cover_every_repetition(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    from keyboard_engine import delay_profiles
+    monkeypatch.setattr(delay_profiles, 'MAX_SCHEDULE_ENTRIES', 64)
+    plan = compile_plan('abcdefghij', 'Enter', 0.05)
+    timing = HumanTiming('稳定', 300, seed=5, use_numpy=use_numpy)
+    schedule = timing.schedule(plan, 20)
+    rows = [schedule.row(rep) for rep in range(20)]
+    assert all(len(row) == 10 for row in rows)
+    for row in rows:
+        assert math.fsum(row) == pytest.approx(10 * timing.unit_time)
+
+
+def test_invalid_profile_and_rate():
+    with pytest.raises(ValueError):
+        HumanTiming('不存在', 100)
+    with pytest.raises(ValueError):
+        HumanTiming('自然', 0)
+
+
+@pytest.mark.parametrize('use_numpy', [False, True])
+def test_rows_are_float_buffers_not_lists(use_numpy):
+    if use_numpy:
+        pytest.importorskip('numpy')
+    plan = compile_plan(TEXT, 'Enter', 0.05)
+    row = HumanTiming('自然', 300, seed=2, use_numpy=use_numpy).schedule(plan, 2).row(1)
+    assert isinstance(row, memoryview) and row.format == 'd'
+    # 热循环按下标读到的是 Python float
+    assert type(row[0]) is float
+
+
+def test_restore_uses_the_recorded_generator(monkeypatch):
+    plan = compile_plan(TEXT, 'Enter', 0.05)
+    first = HumanTiming('自然', 300, seed=9, use_numpy=False)
+    data = first.to_dict()
+    resumed = HumanTiming('自然', 300)
+    resumed.restore(data)
+    assert resumed.seed == 9 and resumed.numpy is None
+    assert list(resumed.schedule(plan).row(0)) == list(first.schedule(plan).row(0))
+
+    from keyboard_engine import delay_profiles
+    monkeypatch.setattr(delay_profiles, '_numpy', lambda: None)
+    without_numpy = HumanTiming('自然', 300)
+    with pytest.raises(ValueError):
+        without_numpy.restore(dict(data, numpy=True))
@@ -0,0 +1,76 @@
+"""线程引擎的暂停位置、停止延迟和停止信号的清除时机"""
+import threading
+import time
+
+from keyboard_engine.backends import RecordingBackend
+from keyboard_engine.engine import TypingEngine
+from keyboard_engine.keystroke_plan import compile_plan
+from keyboard_engine.worker import EngineWorker, Job
+
+
+def test_pause_keeps_exact_position_and_resume_continues():
+    plan = compile_plan('x' * 40, 'Enter', 0.002)
+    engine = TypingEngine(RecordingBackend())
+    results = []
+    thread = threading.Thread(target=lambda: results.append(engine.run(plan)))
+    thread.start()
+    time.sleep(0.02)
+    engine.pause()
+    time.sleep(0.01)
+    typed = len(engine.backend.events)
+    checkpoint = engine.checkpoint()
+    time.sleep(0.03)
+    # 暂停中不再输出, 检查点就是已输出的步数
+    assert len(engine.backend.events) == typed
+    assert checkpoint == (0, typed)
+    assert 0 < typed < 40
+    engine.resume()
+    thread.join(5.0)
+    result = results[0]
+    assert not result['stopped']
+    assert engine.backend.text() == 'x' * 40
+    assert result['paused_time'] >= 0.03
+
+
+def test_stop_records_latency_and_position():
+    plan = compile_plan('x' * 40, 'Enter', 0.5)
+    engine = TypingEngine(RecordingBackend())
+    results = []
+    thread = threading.Thread(target=lambda: results.append(engine.run(plan)))
+    thread.start()
+    time.sleep(0.05)
+    engine.stop()
+    thread.join(5.0)
+    result = results[0]
+    assert result['stopped']
+    # 停止打断了0.5秒的等待
+    assert result['stop_latency'] is not None and result['stop_latency'] < 0.25
+    assert result['checkpoint'] == {'repetition': 0, 'offset': 1}
+    assert engine.backend.text() == 'x'
+
+
+def test_stop_before_run_is_not_cleared_by_run():
+    plan = compile_plan('abc', 'Enter', 0.0)
+    engine = TypingEngine(RecordingBackend())
+    engine.reset()
+    # 工作线程取出任务之后、运行开始之前到达的取消
+    engine.stop()
+    result = engine.run(plan)
+    assert result['stopped']
+    assert result['stop_latency'] is not None
+    assert engine.backend.events == []
+
+
+def test_worker_takes_job_with_cleared_stop_state():
+    backend = RecordingBackend()
+    worker = EngineWorker(lambda key: backend)
+    worker.engine.stop()
+    try:
+        job = worker.submit(Job(compile_plan('abc', 'Enter', 0.0), backend_key='recording'))
+        assert worker.wait_idle(5.0)
+    finally:
+        worker.shutdown()
+    assert job.state == 'done'
+    assert not job.result['stopped']
+    assert job.result['stop_latency'] is None
+    assert backend.text() == 'abc'
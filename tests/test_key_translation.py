@@ -0,0 +1,96 @@
+"""字符翻译缓存和非ASCII文本的批量输入"""
+from keyboard_engine import key_translation
+from keyboard_engine.key_translation import KeyTranslator, split_runs, unicode_sender
+
+
+class CountingTranslate:
+    """记录每次真正翻译的字符"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, char):
+        self.calls.append(char)
+        return ((char, True), (char, False))
+
+
+def test_cache_hits_exclude_warming():
+    translate = CountingTranslate()
+    translator = KeyTranslator(translate, capacity=8)
+    translator.warm('abc')
+    for char in 'abcab':
+        translator.events(char)
+    translator.events('d')
+    assert translate.calls == ['a', 'b', 'c', 'd']
+    stats = translator.stats()
+    assert stats['warmed'] == 3 and stats['size'] == 4
+    assert (stats['hits'], stats['misses']) == (5, 1)
+    assert stats['hit_rate'] == 5 / 6
+
+
+def test_least_recently_used_char_is_evicted():
+    translate = CountingTranslate()
+    translator = KeyTranslator(translate, capacity=2)
+    # 预热不超过容量
+    translator.warm('abc')
+    assert translate.calls == ['a', 'b']
+    translator.events('a')
+    translator.events('c')
+    # 容量为2: 最近用过 a, 因此淘汰 b
+    translator.events('a')
+    translator.events('b')
+    assert translate.calls == ['a', 'b', 'c', 'b']
+    assert translator.stats()['size'] == 2
+
+
+def test_split_runs():
+    assert split_runs('ab中文c€\nd') == ['ab', '中文', 'c', '€', '\nd']
+    assert split_runs('') == []
+
+
+def test_non_ascii_runs_are_sent_in_batches():
+    sent, played = [], []
+    translator = KeyTranslator(CountingTranslate(), send_unicode=sent.append)
+    translator.type_text('ab中文c€d', played.extend)
+    translator.type_text('字', played.extend)
+    translator.type_text('x', played.extend)
+    assert sent == ['中文', '€', '字']
+    assert [char for char, pressed in played if pressed] == ['a', 'b', 'c', 'd', 'x']
+    assert (translator.batched_chars, translator.batch_calls) == (4, 3)
+    assert '批量输入 4字/3次' in translator.summary()
+
+
+def test_without_sender_every_char_is_played():
+    played = []
+    translator = KeyTranslator(CountingTranslate())
+    translator.type_text('a中b', played.extend)
+    assert played == [('a', True), ('a', False), ('中', True), ('中', False),
+                      ('b', True), ('b', False)]
+    assert translator.batch_calls == 0
+    assert '批量输入' not in translator.summary()
+
+
+def test_rejected_batch_falls_back_for_good():
+    calls, played = [], []
+
+    def refuse(text):
+        calls.append(text)
+        raise OSError('access denied')
+    translator = KeyTranslator(CountingTranslate(), send_unicode=refuse)
+    translator.type_text('中文a', played.extend)
+    translator.type_text('字', played.extend)
+    # 被拒绝的一段改为逐字符输入, 之后不再尝试批量发送
+    assert calls == ['中文']
+    assert [char for char, pressed in played if pressed] == ['中', '文', 'a', '字']
+    assert translator.send_unicode is None and translator.batch_calls == 0
+
+
+def test_unicode_sender_falls_back_off_windows(monkeypatch):
+    monkeypatch.setattr(key_translation.sys, 'platform', 'linux')
+    assert unicode_sender() is None
+
+    def unavailable():
+        raise AttributeError('windll')
+    monkeypatch.setattr(key_translation.sys, 'platform', 'win32')
+    monkeypatch.setattr(key_translation, '_windows_unicode_sender', unavailable)
+    assert unicode_sender() is None
@@ -0,0 +1,106 @@
+"""按键计划编译器"""
+import pytest
+
+from keyboard_engine.backends import RecordingBackend
+from keyboard_engine.engine import TypingEngine
+from keyboard_engine.keystroke_plan import (DEFAULT_PASTE_CHUNK, MIN_PASTE_INTERVAL, OP_CHUNK,
+                                            OP_COMBO, OP_PASTE, OP_TAP, OP_TEXT, KeystrokePlan,
+                                            compile_paste_plan, compile_plan)
+
+
+def test_lines_become_text_and_newline_taps():
+    plan = compile_plan('ab\ncd', 'Enter', 0.05)
+    assert list(plan) == [(OP_TEXT, 'ab', 0.05), (OP_TAP, 'enter', 0.05), (OP_TEXT, 'cd', 0.05)]
+    assert plan.total_steps == 5
+
+
+def test_empty_lines_keep_their_newlines():
+    plan = compile_plan('a\n\nb', 'Enter', 0.0)
+    assert [op for op, _, _ in plan] == [OP_TEXT, OP_TAP, OP_TAP, OP_TEXT]
+    assert plan.total_steps == 4
+
+
+@pytest.mark.parametrize('mode, actions', [
+    ('Shift+Enter', [(OP_COMBO, (('shift',), 'enter'))]),
+    ('Home x2', [(OP_TAP, 'enter'), (OP_TAP, 'home'), (OP_TAP, 'home')]),
+    ('制表符', [(OP_TAP, 'tab')]),
+    ('双击空格', [(OP_TEXT, 'a  b')]),
+])
+def test_newline_modes(mode, actions):
+    plan = compile_plan('a\nb', mode, 0.0)
+    ops = [(op, operand) for op, operand, _ in plan]
+    if mode == '双击空格':
+        # 换行展开为空格时与前后文本合并为一段
+        assert ops == actions
+    else:
+        assert ops == [(OP_TEXT, 'a')] + actions + [(OP_TEXT, 'b')]
+
+
+def test_unknown_newline_mode():
+    with pytest.raises(ValueError):
+        compile_plan('a\nb', '回车两次')
+
+
+def test_burst_mode_splits_text_into_chunks():
+    plan = compile_plan('abcdefg', 'Enter', 0.1, burst_chunk=3)
+    assert list(plan) == [(OP_CHUNK, 'abc', 0.1), (OP_CHUNK, 'def', 0.1), (OP_CHUNK, 'g', 0.1)]
+    assert plan.total_steps == 7
+
+
+def test_negative_burst_chunk():
+    with pytest.raises(ValueError):
+        compile_plan('abc', burst_chunk=-1)
+
+
+def test_operands_are_interned():
+    plan = compile_plan('ab\nab\nab', 'Enter', 0.0)
+    assert len(plan) == 5
+    assert len(plan.operands) == 2
+
+
+def test_steps_match_replayed_units():
+    text = '第一行\n\tsecond line\n\n最后'
+    plan = compile_plan(text, 'Shift+Tab x10', 0.0)
+    units = sum(len(operand) if op == OP_TEXT else 1 for op, operand, _ in plan)
+    assert plan.total_steps == units
+
+
+def test_dumps_and_loads_round_trip():
+    plan = compile_plan('hello\nworld', 'Home x2', 0.02, burst_chunk=2)
+    copy = KeystrokePlan.loads(plan.dumps())
+    assert list(copy) == list(plan)
+    assert copy.total_steps == plan.total_steps
+    assert copy.interval == plan.interval and copy.burst_chunk == plan.burst_chunk
+
+
+def test_loads_rejects_mismatched_arrays():
+    data = list(compile_plan('abc').dumps())
+    data[4] += b'\0'
+    with pytest.raises(ValueError):
+        KeystrokePlan.loads(tuple(data))
+
+
+def test_paste_plan_chunks_and_minimum_interval():
+    text = 'x' * (DEFAULT_PASTE_CHUNK * 2 + 1)
+    plan = compile_paste_plan(text, DEFAULT_PASTE_CHUNK, 0.0)
+    assert [op for op, _, _ in plan] == [OP_PASTE] * 3
+    assert all(delay == MIN_PASTE_INTERVAL for _, _, delay in plan)
+    assert ''.join(operand for _, operand, _ in plan) == text
+    assert plan.total_steps == len(text)
+
+
+def test_paste_plan_can_type_instead_per_character():
+    plan = compile_paste_plan('a\nbcd', 2, 0.01, type_instead=True)
+    # 每块一个文本动作, 回放时每个字符一个节拍, 不经过剪贴板
+    assert list(plan) == [(OP_TEXT, 'a\n', 0.01), (OP_TEXT, 'bc', 0.01), (OP_TEXT, 'd', 0.01)]
+    assert plan.total_steps == 5
+    backend = RecordingBackend()
+    result = TypingEngine(backend).run(plan)
+    assert backend.events == [('text', char) for char in 'a\nbcd']
+    assert result['ticks'] == 5
+    assert result['requested_time'] == pytest.approx(0.05)
+
+
+def test_paste_chunk_must_be_positive():
+    with pytest.raises(ValueError):
+        compile_paste_plan('abc', 0)
@@ -0,0 +1,55 @@
+"""大文档的行索引和预览窗口"""
+from keyboard_engine.large_document import DocumentView, LineIndex
+
+TEXT = 'alpha\r\nbeta\n\ngamma alpha\nlast'
+
+
+def test_line_index():
+    index = LineIndex(TEXT)
+    assert index.line_count == 5
+    assert [index.line(n) for n in range(5)] == ['alpha', 'beta', '', 'gamma alpha', 'last']
+    assert index.line(3, limit=3) == 'gam'
+    assert index.line_of(0) == 0 and index.line_of(len(TEXT) - 1) == 4
+    assert index.line_of(index.starts[3]) == 3
+
+
+def test_scrolling_is_clamped():
+    view = DocumentView(LineIndex('\n'.join(map(str, range(100)))), rows=10)
+    view.scroll(-5)
+    assert view.top == 0
+    view.page(20)
+    assert view.top == view.last_top == 90
+    view.moveto(0.5)
+    assert view.top == 50
+    assert view.fraction() == (0.5, 0.6)
+
+
+def test_goto_reveals_and_marks_the_line():
+    view = DocumentView(LineIndex('\n'.join(f'line {n}' for n in range(1000))), rows=30)
+    assert view.goto(500) == 500
+    assert view.top <= 499 < view.top + 30
+    assert view.goto(99999) == 1000
+    assert view.goto(-3) == 1
+
+
+def test_find_moves_forward_backward_and_wraps():
+    view = DocumentView(LineIndex(TEXT), rows=2)
+    assert view.find('alpha') == 1
+    assert view.find('alpha') == 4 and not view.wrapped
+    assert view.find('alpha') == 1 and view.wrapped
+    assert view.find('alpha', backward=True) == 4 and view.wrapped
+    assert view.find('missing') is None
+    assert view.find('') is None
+
+
+def test_render_gutter_truncation_and_highlight():
+    index = LineIndex('short\n' + 'x' * 50 + 'needle')
+    view = DocumentView(index, rows=5, max_columns=20)
+    lines = view.render()
+    assert lines[0] == '1  short'
+    assert lines[1] == '2  ' + 'x' * 20 + '…'
+    # 超出显示宽度的结果不高亮
+    assert view.find('needle') == 2
+    assert view.highlight() is None
+    view.find('short')
+    assert view.highlight() == (0, 3, 8)
@@ -0,0 +1,106 @@
+"""宏脚本的语法、展开和缓存"""
+import pytest
+
+from keyboard_engine.keystroke_plan import OP_COMBO, OP_TAP, OP_TEXT, OP_WAIT
+from keyboard_engine.macro import (MAX_MACRO_ACTIONS, MacroCache, MacroError, compile_macro,
+                                   parse_macro)
+
+
+def ops(plan):
+    return [(op, operand) for op, operand, _ in plan]
+
+
+def test_text_keys_and_combos():
+    plan = compile_macro('hi{enter}{ctrl+a}{tab 2}{a}', 0.0)
+    assert ops(plan) == [(OP_TEXT, 'hi'), (OP_TAP, 'enter'), (OP_COMBO, (('ctrl',), 'a')),
+                         (OP_TAP, 'tab'), (OP_TAP, 'tab'), (OP_TAP, 'a')]
+    assert plan.total_steps == 7
+
+
+def test_aliases_and_escaped_braces():
+    plan = compile_macro('{{x}}{Return}{ESC}{+}', 0.0)
+    assert ops(plan) == [(OP_TEXT, '{x}'), (OP_TAP, 'enter'), (OP_TAP, 'esc'), (OP_TAP, '+')]
+
+
+def test_wait_and_speed_scoping():
+    plan = compile_macro('a{speed 0.5}b{repeat 2}{speed 0.1}c{/repeat}d{speed}e{wait 2}', 0.05)
+    assert list(plan) == [(OP_TEXT, 'a', 0.05), (OP_TEXT, 'b', 0.5), (OP_TEXT, 'cc', 0.1),
+                          (OP_TEXT, 'd', 0.5), (OP_TEXT, 'e', 0.05), (OP_WAIT, None, 2.0)]
+
+
+def test_nested_repeat_expands():
+    plan = compile_macro('{repeat 2}x{repeat 3}y{/repeat}{/repeat}', 0.0)
+    assert ops(plan) == [(OP_TEXT, 'xyyyxyyy')]
+
+
+def test_newlines_follow_newline_mode():
+    plan = compile_macro('a\nb', 0.0, 'Shift+Enter')
+    assert ops(plan) == [(OP_TEXT, 'a'), (OP_COMBO, (('shift',), 'enter')), (OP_TEXT, 'b')]
+
+
+@pytest.mark.parametrize('source, message, line, column', [
+    ('ab}', "多余的 '}'", 1, 3),
+    ('a\n{enter', "缺少 '}'", 2, 1),
+    ('{}', '空指令', 1, 1),
+    ('x{wait}', 'wait 需要一个非负的秒数', 1, 2),
+    ('{wait -1}', 'wait 需要一个非负的秒数', 1, 1),
+    ('{speed fast}', 'speed 需要一个非负的秒数', 1, 1),
+    ('{repeat 0}a{/repeat}', 'repeat 需要一个正整数', 1, 1),
+    ('a{/repeat}', '多余的 {/repeat}', 1, 2),
+    ('\n\n  {repeat 2}a', '缺少 {/repeat}', 3, 3),
+    ('{tab x}', '按键次数必须是正整数', 1, 1),
+    ('{tab 1 2}', '指令参数过多', 1, 1),
+    ('{ctrl+nokey}', '未知的按键: nokey', 1, 1),
+])
+def test_grammar_errors_report_position(source, message, line, column):
+    with pytest.raises(MacroError) as info:
+        parse_macro(source)
+    assert message in str(info.value)
+    assert (info.value.line, info.value.column) == (line, column)
+
+
+def test_macro_error_is_value_error():
+    with pytest.raises(ValueError):
+        compile_macro('{nokey}')
+
+
+def test_oversized_expansion_is_rejected():
+    with pytest.raises(MacroError):
+        compile_macro('{repeat %d}ab{/repeat}' % (MAX_MACRO_ACTIONS // 2 + 1))
+
+
+def test_cache_hits_in_memory_and_on_disk(tmp_path):
+    source = 'abc{enter}{repeat 2}d{/repeat}'
+    cache = MacroCache(str(tmp_path))
+    first = cache.compile(source, 0.01)
+    assert cache.compile(source, 0.01) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    # 参数不同时是另一个条目
+    cache.compile(source, 0.02)
+    assert cache.misses == 2
+
+    fresh = MacroCache(str(tmp_path))
+    loaded = fresh.compile(source, 0.01)
+    assert (fresh.hits, fresh.misses) == (1, 0)
+    assert list(loaded) == list(first)
+    assert loaded.total_steps == first.total_steps
+
+
+def test_corrupt_cache_file_is_recompiled(tmp_path):
+    cache = MacroCache(str(tmp_path))
+    plan = cache.compile('abc', 0.0)
+    key = cache.key('abc', 0.0, 'Enter', 0)
+    (tmp_path / (key + '.plan')).write_bytes(b'not a plan')
+    fresh = MacroCache(str(tmp_path))
+    assert list(fresh.compile('abc', 0.0)) == list(plan)
+    assert fresh.misses == 1
+
+
+def test_cache_capacity_evicts_least_recent():
+    cache = MacroCache(capacity=2)
+    for source in ('a', 'b', 'a', 'c'):
+        cache.compile(source, 0.0)
+    cache.compile('a', 0.0)
+    assert cache.hits == 2
+    cache.compile('b', 0.0)
+    assert cache.misses == 4
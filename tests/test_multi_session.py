@@ -0,0 +1,77 @@
+"""多会话运行: 进程池与协程两种执行方式、中断后的汇总和伪终端后端"""
+import os
+import sys
+from concurrent.futures import Future
+
+import pytest
+
+from keyboard_engine.backends import PtyBackend
+from keyboard_engine.delay_profiles import HumanTiming
+from keyboard_engine.keystroke_plan import compile_plan
+from keyboard_engine.multi_session import _stopped_results, run_sessions, run_sessions_async
+
+TEXT = 'first line\nsecond line'
+
+
+@pytest.mark.parametrize('runner', ['processes', 'async'])
+def test_two_sessions_write_their_own_files(tmp_path, runner):
+    plan = compile_plan(TEXT, 'Enter', 0.001)
+    output = str(tmp_path / 'session{n}.txt')
+    if runner == 'processes':
+        summary = run_sessions(plan, 2, 'file', processes=2, repetitions=2, output=output)
+    else:
+        summary = run_sessions_async(plan, 2, 'file', repetitions=2, output=output)
+    for number in (1, 2):
+        with open(str(tmp_path / f'session{number}.txt'), encoding='utf-8') as f:
+            assert f.read() == TEXT * 2
+    total = summary['total']
+    assert [result['session'] for result in summary['sessions']] == [0, 1]
+    assert total['sessions'] == 2 and total['completed']
+    assert total['chars'] == 2 * 2 * plan.total_steps
+    assert total['processes'] == (2 if runner == 'processes' else 1)
+
+
+@pytest.mark.parametrize('runner', ['processes', 'async'])
+def test_sessions_get_distinct_reproducible_timing(tmp_path, runner):
+    plan = compile_plan('abc def', 'Enter', 0.001)
+    timing = HumanTiming('自然', 6000, seed=5)
+    run = run_sessions if runner == 'processes' else run_sessions_async
+    options = {'processes': 2} if runner == 'processes' else {}
+    first = run(plan, 2, 'null', timing=timing, **options)
+    second = run(plan, 2, 'null', timing=timing, **options)
+    seeds = [result['timing']['seed'] for result in first['sessions']]
+    # 各会话的种子依次加上会话序号, 两次运行相同
+    assert seeds == [5, 6]
+    assert seeds == [result['timing']['seed'] for result in second['sessions']]
+
+
+def test_stopped_results_skip_cancelled_and_failed_sessions():
+    done, failed, cancelled = Future(), Future(), Future()
+    done.set_result({'session': 0})
+    failed.set_exception(OSError('broken pipe'))
+    assert cancelled.cancel()
+    assert _stopped_results([done, failed, cancelled]) == [{'session': 0}]
+
+
+@pytest.mark.skipif(not hasattr(os, 'openpty'), reason='需要伪终端')
+def test_pty_backend_feeds_the_child_terminal(tmp_path):
+    log = str(tmp_path / 'pty.log')
+    script = ('import sys\n'
+              'for line in sys.stdin:\n'
+              '    print("got", repr(line), flush=True)\n')
+    backend = PtyBackend([sys.executable, '-c', script], log=log)
+    backend.type_text('héllo')
+    backend.tap('enter')
+    backend.type_text('x')
+    backend.combo(('ctrl',), 'u')
+    backend.type_text('bye')
+    backend.combo(('shift',), 'enter')
+    backend.close()
+    assert backend.returncode == 0
+    assert backend.received > 0
+    with open(log, 'rb') as f:
+        output = f.read().decode('utf-8')
+    # 回车按终端发送 \r, Ctrl+U 清除了未提交的 x, close() 发送EOF结束子进程
+    assert "got 'héllo\\n'" in output
+    assert "got 'bye\\n'" in output
+    assert "got 'x" not in output
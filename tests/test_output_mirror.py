@@ -0,0 +1,38 @@
+"""输出镜像: 待取走的文本和预览都只保留末尾 max_preview 个字符"""
+from keyboard_engine.output_mirror import OutputMirror
+
+
+def test_flush_returns_new_preview_once():
+    mirror = OutputMirror(max_preview=10)
+    mirror.write('abc')
+    mirror.write('def')
+    assert mirror.flush() == 'abcdef'
+    assert mirror.flush() is None
+    mirror.write('ghijkl')
+    assert mirror.flush() == 'cdefghijkl'
+    assert mirror.preview == 'cdefghijkl'
+    assert mirror.total == 12 and mirror.flushes == 2
+
+
+def test_pending_text_is_trimmed_while_writing():
+    mirror = OutputMirror(max_preview=5)
+    for _ in range(1000):
+        mirror.write('xy')
+    # 界面没有刷新时, 待取走的文本也不会超过预览长度
+    assert mirror._pending_chars == 5
+    assert sum(len(text) for text in mirror._pending) == 5
+    assert len(mirror._pending) <= 3
+    mirror.write('0123456789')
+    assert list(mirror._pending) == ['56789']
+    assert mirror.flush() == '56789'
+    assert mirror.total == 2010
+
+
+def test_clear_drops_pending_and_preview():
+    mirror = OutputMirror(max_preview=5)
+    mirror.write('abc')
+    mirror.flush()
+    mirror.write('def')
+    mirror.clear()
+    assert mirror.flush() is None
+    assert mirror.preview == '' and mirror.total == 0
@@ -0,0 +1,69 @@
+"""执行记录的环形缓冲区和溢写文件"""
+import os
+
+import pytest
+
+from keyboard_engine.record_log import RecordLog
+
+
+def records(start, stop):
+    return [f'记录 {i}' for i in range(start, stop)]
+
+
+def test_only_the_last_capacity_records_stay_in_memory():
+    log = RecordLog(capacity=5)
+    log.extend(records(0, 12))
+    log.append('记录 12')
+    assert len(log) == 13 and log.first_index == 8
+    assert log.recent(3) == records(10, 13)
+    # 被挤出内存的编号不再可读, 窗口从最早的内存记录开始
+    assert log.window(0, 3) == records(8, 11)
+    assert log.window(10, 10) == records(10, 13)
+    assert not log.complete
+
+
+def test_save_without_spill_writes_what_is_in_memory(tmp_path):
+    log = RecordLog(capacity=3)
+    log.extend(records(0, 5))
+    path = tmp_path / 'log.txt'
+    log.save(str(path))
+    assert path.read_text(encoding='utf-8') == '\n'.join(records(2, 5))
+
+
+def test_spill_keeps_every_record_on_disk(tmp_path):
+    log = RecordLog(capacity=3, spill=True)
+    # 第一次写入之前不创建临时文件
+    assert log._spill is None and log.complete
+    for start in range(0, 100, 10):
+        log.extend(records(start, start + 10))
+    assert len(log._recent) == 3 and log.complete
+    path = tmp_path / 'all.txt'
+    log.save(str(path))
+    assert path.read_text(encoding='utf-8').splitlines() == records(0, 100)
+    # 保存之后继续追加的记录写在文件末尾
+    log.append('记录 100')
+    log.save(str(path))
+    assert path.read_text(encoding='utf-8').splitlines() == records(0, 101)
+    log.close()
+
+
+def test_temporary_spill_file_is_removed_on_close():
+    log = RecordLog(capacity=2, spill=True)
+    log.extend(records(0, 5))
+    spill = log._spill
+    descriptor = spill.fileno()
+    log.close()
+    assert spill.closed and log._spill is None
+    # 临时文件没有其他引用, 关闭后即被删除
+    with pytest.raises(OSError):
+        os.fstat(descriptor)
+    log.close()
+
+
+def test_spill_to_path_appends_and_survives_close(tmp_path):
+    path = tmp_path / 'spill.txt'
+    path.write_text('旧记录\n', encoding='utf-8')
+    log = RecordLog(capacity=2, spill=str(path))
+    log.extend(records(0, 4))
+    log.close()
+    assert path.read_text(encoding='utf-8').splitlines() == ['旧记录'] + records(0, 4)
@@ -0,0 +1,176 @@
+"""断点续打: 中断的运行从日志中的检查点继续, 输出恰好是剩余的部分"""
+import io
+import json
+
+import pytest
+
+from keyboard_engine.backends import StreamSinkBackend
+from keyboard_engine.engine import Checkpoint, TypingEngine
+from keyboard_engine.keystroke_plan import compile_plan
+from keyboard_engine.resume_journal import ResumeJournal
+
+TEXT = '第一行 first line\n第二行 second\n\n最后一行 end'
+
+
+class StoppingSink(StreamSinkBackend):
+    """输出到内存, 输出 limit 个字符 (按键算一个) 后请求停止, 模拟中途被打断"""
+
+    def __init__(self, limit=None):
+        super().__init__(io.StringIO())
+        self.limit = limit
+        self.engine = None
+        self.sent = 0
+
+    def _count(self, units):
+        self.sent += units
+        if self.limit is not None and self.sent >= self.limit:
+            self.engine.stop()
+
+    def type_text(self, text):
+        super().type_text(text)
+        self._count(len(text))
+
+    def tap(self, key):
+        super().tap(key)
+        self._count(1)
+
+    def output(self):
+        return self._stream.getvalue()
+
+
+def run(plan, repetitions, limit=None, start=None, recorder=None):
+    backend = StoppingSink(limit)
+    engine = TypingEngine(backend)
+    backend.engine = engine
+    if recorder is not None:
+        recorder.start(engine, start)
+    result = engine.run(plan, repetitions, start=start)
+    if recorder is not None:
+        recorder.stop(result)
+    return backend.output(), result
+
+
+@pytest.mark.parametrize('burst_chunk', [0, 4])
+@pytest.mark.parametrize('limit', [1, 7, 17, 30, 55, 70])
+def test_resume_outputs_exact_suffix(tmp_path, limit, burst_chunk):
+    plan = compile_plan(TEXT, 'Enter', 0.0, burst_chunk)
+    repetitions = 2
+    full, _ = run(plan, repetitions)
+    assert full == (TEXT + TEXT).replace('\r', '')
+
+    journal = ResumeJournal(str(tmp_path), interval=60)
+    params = {'newline_mode': 'Enter', 'burst_chunk': burst_chunk, 'repetitions': repetitions}
+    head, result = run(plan, repetitions, limit, recorder=journal.recorder(params, TEXT))
+    assert result['stopped']
+
+    state = journal.load()
+    assert state is not None and state.text == TEXT and state.params == params
+    assert state.checkpoint == Checkpoint(**result['checkpoint'])
+    tail, result = run(plan, repetitions, start=state.checkpoint,
+                       recorder=journal.recorder(params, TEXT))
+    assert not result['stopped']
+    assert head + tail == full
+    # 完成之后没有可以继续的运行
+    assert journal.load() is None
+
+
+def test_finished_run_leaves_nothing_to_resume(tmp_path):
+    journal = ResumeJournal(str(tmp_path))
+    run(compile_plan('abc'), 1, recorder=journal.recorder({}, 'abc'))
+    assert journal.load() is None
+
+
+def test_changed_text_or_file_is_refused(tmp_path):
+    journal = ResumeJournal(str(tmp_path))
+    data = tmp_path / 'input.txt'
+    data.write_text('hello', encoding='utf-8')
+    run(compile_plan('hello'), 1, limit=2,
+        recorder=journal.recorder({}, files={'file': str(data)}))
+    assert journal.load().files == {'file': str(data)}
+    data.write_text('hello!', encoding='utf-8')
+    with pytest.raises(ValueError):
+        journal.load()
+
+    run(compile_plan('abc'), 1, limit=1, recorder=journal.recorder({}, 'abc'))
+    (tmp_path / 'resume.txt').write_text('abd', encoding='utf-8')
+    with pytest.raises(ValueError):
+        journal.load()
+
+
+def test_corrupt_journal_raises_value_error(tmp_path):
+    journal = ResumeJournal(str(tmp_path))
+    (tmp_path / 'resume.jsonl').write_text(json.dumps({'event': 'start'}) + '\n',
+                                           encoding='utf-8')
+    with pytest.raises(ValueError):
+        journal.load()
+    journal.clear()
+    assert journal.load() is None
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    journal = ResumeJournal(str(tmp_path))
+    run(compile_plan('abcdef'), 1, limit=3, recorder=journal.recorder({}, 'abcdef'))
+    with open(journal.path, 'a', encoding='utf-8') as f:
+        f.write('{"event": "progress", "repet')
+    assert journal.load().checkpoint == Checkpoint(0, 3)
+
+
+def test_unchanged_text_is_not_rewritten(tmp_path):
+    journal = ResumeJournal(str(tmp_path))
+    run(compile_plan('abc'), 1, limit=1, recorder=journal.recorder({'n': 1}, 'abc'))
+    text_file = tmp_path / 'resume.txt'
+    # 改写一次, 之后的修改时间用来判断是否被再次写入
+    text_file.write_text('abc', encoding='utf-8')
+    marker = text_file.stat().st_mtime_ns
+    run(compile_plan('abc'), 1, limit=1, recorder=journal.recorder({'n': 2}, 'abc'))
+    assert text_file.stat().st_mtime_ns == marker
+    run(compile_plan('xyz'), 1, limit=1, recorder=journal.recorder({'n': 2}, 'xyz'))
+    assert text_file.read_text(encoding='utf-8') == 'xyz'
+
+
+def test_second_recorder_is_refused_while_one_is_active(tmp_path):
+    journal = ResumeJournal(str(tmp_path))
+    first = journal.recorder({'n': 1}, 'abc')
+    first.start(TypingEngine(StoppingSink()))
+    with pytest.raises(OSError):
+        journal.recorder({'n': 2}, 'xyz').start(TypingEngine(StoppingSink()))
+    first.stop()
+    assert journal.active is None
+    assert journal.load().text == 'abc'
+
+
+def test_checkpoint_is_new_start_until_the_run_begins(tmp_path):
+    plan = compile_plan('abcdef')
+    engine = TypingEngine(StoppingSink())
+    engine.run(plan, 1)
+    assert engine.checkpoint() == Checkpoint(0, 6)
+    # 工作线程取出下一个任务后, 日志立即读到的是新任务的起点
+    engine.reset(Checkpoint(1, 2))
+    assert engine.checkpoint() == Checkpoint(1, 2)
+    journal = ResumeJournal(str(tmp_path))
+    recorder = journal.recorder({}, 'abcdef')
+    recorder.start(engine, Checkpoint(1, 2))
+    recorder._record_progress()
+    recorder.stop()
+    assert journal.load().checkpoint == Checkpoint(1, 2)
+
+
+def test_checkpoint_during_countdown_is_the_start():
+    engine = TypingEngine(StoppingSink())
+    seen = []
+
+    class Channel:
+        def post_record(self, text):
+            if text.startswith('倒计时'):
+                seen.append(engine.checkpoint())
+                engine.stop()
+
+        def post_progress(self, units):
+            pass
+
+    # 从 (0, 3) 继续: 倒计时中读到的位置仍是起点
+    result = engine.run(compile_plan('abcdef'), 1, delay=1.0, channel=Channel(),
+                        announce=True, start=Checkpoint(0, 3))
+    assert seen == [Checkpoint(0, 3)]
+    assert result['stopped']
+    assert result['checkpoint'] == {'repetition': 0, 'offset': 3}
@@ -0,0 +1,105 @@
+"""运行遥测: 对数直方图的分桶边界和分位数, 以及包装后端调用的记录"""
+import math
+
+import pytest
+
+from keyboard_engine.telemetry import LogHistogram, RunTelemetry
+
+
+class FakeClock:
+    """手动推进的时钟"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def index_of(value):
+    """value 落入的桶 (默认范围和分桶)"""
+    histogram = LogHistogram()
+    histogram.add(value)
+    return histogram.counts.index(1)
+
+
+@pytest.mark.parametrize('value', [2e-6, 1e-5, 3.3e-4, 1e-3, 0.0125, 0.5, 7.0, 99.0])
+def test_value_falls_inside_its_bucket(value):
+    histogram = LogHistogram()
+    low, high = histogram.bounds(index_of(value))
+    assert low <= value * (1 + 1e-12) and value < high
+    # 每个数量级20个桶, 相邻边界相差 10**(1/20) 倍
+    assert high / low == pytest.approx(10 ** (1 / 20))
+
+
+def test_decade_boundaries_start_a_new_bucket():
+    histogram = LogHistogram()
+    assert index_of(1e-6 * 1.0001) == 0
+    assert index_of(1e-3) == 60
+    assert index_of(1e-3 * 0.9999) == 59
+    assert index_of(1.0) == 120
+    assert histogram.bounds(60)[0] == pytest.approx(1e-3)
+    assert len(histogram.counts) == 160
+
+
+def test_out_of_range_values_go_to_the_end_buckets():
+    histogram = LogHistogram()
+    for value in (0.0, 1e-9, 1e-6, 1e3):
+        histogram.add(value)
+    assert histogram.counts[0] == 3 and histogram.counts[-1] == 1
+    assert histogram.min == 0.0 and histogram.max == 1e3
+    assert histogram.count == 4 and histogram.mean == pytest.approx(250.0)
+
+
+def test_quantiles_are_within_one_bucket_of_the_true_value():
+    histogram = LogHistogram()
+    values = [0.001 * (i + 1) for i in range(1000)]
+    for value in values:
+        histogram.add(value)
+    ratio = 10 ** (1 / 20)
+    for q in (0.5, 0.9, 0.99):
+        exact = values[int(math.ceil(q * len(values))) - 1]
+        estimate = histogram.quantile(q)
+        assert exact / ratio <= estimate <= exact * ratio
+    # 估计值限制在实际的最小值和最大值之间
+    assert 0.001 <= histogram.quantile(0.0) <= 0.001 * ratio
+    assert 1.0 / ratio <= histogram.quantile(1.0) <= 1.0
+
+
+def test_single_value_and_empty_histograms():
+    histogram = LogHistogram()
+    assert histogram.quantile(0.5) == 0.0 and histogram.mean == 0.0
+    histogram.add(0.02)
+    assert histogram.quantile(0.5) == 0.02 and histogram.quantile(0.99) == 0.02
+    data = histogram.to_dict()
+    assert data['count'] == 1 and len(data['buckets']) == 1
+    low, high, count = data['buckets'][0]
+    assert low <= 0.02 < high and count == 1
+
+
+def test_instrument_records_latency_spacing_and_jitter():
+    clock = FakeClock()
+    telemetry = RunTelemetry(clock)
+    calls = []
+
+    def backend_call(text):
+        calls.append(text)
+        clock.now += 0.001
+
+    typed = telemetry.instrument(backend_call)
+    tick = telemetry.instrument_tick(lambda interval, units: True, 0.05)
+    telemetry.begin()
+    for text in 'abc':
+        typed(text)
+        tick()
+        clock.now += 0.06
+    assert calls == ['a', 'b', 'c']
+    assert telemetry.latency.count == 3
+    assert telemetry.latency.quantile(0.5) == pytest.approx(0.001)
+    # 相邻调用间隔 0.061, 请求 0.05, 抖动 0.011
+    assert telemetry.spacing.count == 2
+    assert telemetry.spacing.min == pytest.approx(0.061)
+    assert telemetry.jitter.max == pytest.approx(0.011)
+    telemetry.end_repetition(3)
+    assert telemetry.repetitions[-1]['units'] == 3
+    assert telemetry.eta(3, 6) == pytest.approx(telemetry.elapsed())
@@ -0,0 +1,79 @@
+"""数据模板的解析、渲染和逐行片段"""
+import pytest
+
+from keyboard_engine.templating import Template, TemplateSource, count_rows
+
+
+def test_render_fields_index_and_braces():
+    template = Template('{{{i}}} {row.name}: {row.info.city}')
+    assert template.render({'name': '张三', 'info': {'city': '北京'}}, 3) == '{3} 张三: 北京'
+
+
+def test_render_converts_values():
+    template = Template('{row.a}|{row.b}|{row.c}')
+    assert template.render({'a': None, 'b': 1.5, 'c': [1, '二']}, 1) == '|1.5|[1, "二"]'
+
+
+def test_missing_field_names_the_row():
+    with pytest.raises(ValueError, match='第2行缺少字段: x.y'):
+        Template('{row.x.y}').render({'x': {}}, 2)
+
+
+@pytest.mark.parametrize('source, message', [
+    ('a}b', "第1行: 多余的 '}'"),
+    ('a\n{b', "第2行: 多余的 '{'"),
+    ('{row.}', '未知的占位符'),
+    ('{name}', '未知的占位符 {name}'),
+])
+def test_template_errors(source, message):
+    with pytest.raises(ValueError, match=message):
+        Template(source)
+
+
+def test_timestamp_makes_template_not_reproducible():
+    assert Template('{row.a} {i}').reproducible
+    assert not Template('{row.a} {timestamp}').reproducible
+
+
+def test_csv_rows_render_with_separator(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('name,note\n甲,"多行\n备注"\n\n乙,x\n', encoding='utf-8')
+    assert count_rows(str(path)) == 2
+    source = TemplateSource('{i}.{row.name}', str(path))
+    assert source.rows == 2
+    assert list(source) == ['1.甲', '\n2.乙']
+    assert source.reproducible
+
+
+def test_csv_header_is_checked(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('name\n甲\n', encoding='utf-8')
+    with pytest.raises(ValueError, match='phone'):
+        TemplateSource('{row.phone}', str(path))
+
+
+def test_jsonl_rows_and_invalid_lines(tmp_path):
+    path = tmp_path / 'data.jsonl'
+    path.write_text('{"a": 1}\n\n{"a": 2}\n[3]\n', encoding='utf-8')
+    assert count_rows(str(path)) == 3
+    source = TemplateSource('{row.a}', str(path))
+    with pytest.raises(ValueError, match='第4行不是JSON对象'):
+        list(source)
+
+
+def test_segments_carry_progress_of_empty_rows(tmp_path):
+    path = tmp_path / 'data.jsonl'
+    path.write_text('{"a": "x"}\n{"a": ""}\n{"a": "y"}\n', encoding='utf-8')
+    source = TemplateSource('{row.a}', str(path), separator='')
+    segments = list(source.segments('Enter', 0.0))
+    assert [weight for _, weight in segments] == [1, 2]
+    assert sum(weight for _, weight in segments) == source.rows
+
+
+def test_with_template_keeps_row_count(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('a\n1\n2\n', encoding='utf-8')
+    source = TemplateSource('{row.a}', str(path))
+    other = source.with_template('<{row.a}>')
+    assert other.rows == 2 and list(other) == ['<1>', '\n<2>']
+    assert list(source) == ['1', '\n2']
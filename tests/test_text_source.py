@@ -0,0 +1,37 @@
+"""大文件的流式文本来源"""
+from keyboard_engine.text_source import FileTextSource, format_size
+
+
+def test_chunks_decode_across_boundaries(tmp_path):
+    text = '甲乙丙\r\n第二行\r\nend'
+    path = tmp_path / 'input.txt'
+    path.write_bytes(text.encode('utf-8'))
+    # 每次只读2个字节: 多字节字符和 \r\n 都会被切开
+    source = FileTextSource(str(path), chunk_size=2)
+    chunks = list(source)
+    assert ''.join(chunk for chunk, _, _ in chunks) == text.replace('\r\n', '\n')
+    assert chunks[0][1] == 0 and chunks[-1][2] == source.size
+    for (_, _, end), (_, start, _) in zip(chunks, chunks[1:]):
+        assert end == start
+
+
+def test_segments_account_for_every_byte(tmp_path):
+    path = tmp_path / 'input.txt'
+    path.write_bytes('中文内容\nabc\n'.encode('utf-8') * 50)
+    source = FileTextSource(str(path), chunk_size=5)
+    segments = list(source.segments('Enter', 0.0))
+    assert sum(weight for _, weight in segments) == source.size
+    assert all(len(plan) for plan, _ in segments)
+
+
+def test_other_encodings(tmp_path):
+    path = tmp_path / 'input.txt'
+    path.write_bytes('编码测试'.encode('gbk'))
+    source = FileTextSource(str(path), encoding='gbk', chunk_size=3)
+    assert ''.join(chunk for chunk, _, _ in source) == '编码测试'
+
+
+def test_format_size():
+    assert format_size(512) == '512B'
+    assert format_size(2048) == '2.0KB'
+    assert format_size(5 * 1024 * 1024) == '5.0MB'
@@ -0,0 +1,148 @@
+"""节拍调度: 绝对截止时间不累积漂移, 暂停顺延之后的截止时间, 停止立即唤醒等待"""
+import threading
+import time
+
+import pytest
+
+from keyboard_engine.timing import DeadlineScheduler, PauseGate
+
+
+class FakeClock:
+    """手动推进的时钟"""
+
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_deadlines_do_not_accumulate_drift():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(0.1, clock=clock)
+    start = scheduler.start()
+    for i in range(1, 1001):
+        # 每次动作耗时不同, 等待总是到截止时间为止, 而不是再睡一个完整间隔
+        clock.now += 0.01 + (i % 7) * 0.01
+        deadline = scheduler.advance()
+        assert deadline == pytest.approx(start + i * 0.1, abs=1e-9)
+        clock.now = deadline
+    scheduler.finish()
+    stats = scheduler.stats()
+    assert stats['ticks'] == 1000 and stats['late_ticks'] == 0
+    assert stats['drift'] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_late_ticks_catch_up_then_resync():
+    clock = FakeClock()
+    scheduler = DeadlineScheduler(0.1, clock=clock, max_lag=0.5)
+    start = scheduler.start()
+    clock.now += 0.25
+    # 落后不超过 max_lag 时不等待, 之后的截止时间仍按原节奏追赶
+    assert scheduler.advance() is None
+    assert scheduler.advance() is None
+    assert scheduler.advance() == pytest.approx(start + 0.3)
+    clock.now = start + 2.0
+    # 落后超过 max_lag 时放弃追赶, 以当前时刻重新对齐
+    assert scheduler.advance() is None
+    assert scheduler.resyncs == 1 and scheduler.late_ticks == 3
+    assert scheduler.advance() == pytest.approx(clock.now + 0.1)
+
+
+def test_pause_shifts_later_deadlines():
+    clock = FakeClock()
+    gate = PauseGate()
+
+    def held():
+        # 暂停了5秒后继续
+        clock.now += 5.0
+        gate.resume()
+    gate.on_hold = held
+    scheduler = DeadlineScheduler(0.1, clock=clock, gate=gate)
+    start = scheduler.start()
+    deadline = scheduler.advance()
+    clock.now = deadline
+    gate.pause()
+    assert scheduler.wait(deadline)
+    # 到期前暂停: 当前的截止时间和之后的都顺延暂停的时长
+    assert scheduler.paused_time == pytest.approx(5.0)
+    assert scheduler.deadline == pytest.approx(start + 5.1)
+    clock.now = start + 5.1
+    assert scheduler.advance() == pytest.approx(start + 5.2)
+    clock.now = start + 5.2
+    scheduler.finish()
+    stats = scheduler.stats()
+    assert stats['elapsed'] == pytest.approx(0.2)
+    assert stats['drift'] == pytest.approx(0.0, abs=1e-9)
+
+
+def test_pause_during_advance_returns_current_deadline():
+    clock = FakeClock()
+    gate = PauseGate()
+    scheduler = DeadlineScheduler(0.1, clock=clock, gate=gate)
+    start = scheduler.start()
+    gate.pause()
+    clock.now += 3.0
+    # 暂停中即使已经落后也不计为延迟节拍, 等待时先在暂停处阻塞
+    assert scheduler.advance() == pytest.approx(start + 0.1)
+    assert scheduler.late_ticks == 0
+
+
+@pytest.mark.parametrize('with_gate', [True, False])
+def test_stop_wakes_a_sleeping_wait(with_gate):
+    # 时钟不走, 不被唤醒时会一直等下去
+    clock = FakeClock()
+    stop = threading.Event()
+    gate = PauseGate() if with_gate else None
+    scheduler = DeadlineScheduler(1.0, stop, clock=clock, gate=gate)
+    scheduler.start()
+    deadline = scheduler.advance()
+    results = []
+    sleeper = threading.Thread(target=lambda: results.append(scheduler.wait(deadline)))
+    sleeper.start()
+    time.sleep(0.05)
+    assert sleeper.is_alive()
+    woken = time.perf_counter()
+    stop.set()
+    if gate is not None:
+        gate.interrupt()
+    sleeper.join(2.0)
+    assert not sleeper.is_alive()
+    assert results == [False]
+    assert time.perf_counter() - woken < 0.5
+
+
+def test_interrupt_releases_a_paused_wait():
+    stop = threading.Event()
+    gate = PauseGate()
+    scheduler = DeadlineScheduler(0.01, stop, gate=gate)
+    scheduler.start()
+    deadline = scheduler.advance()
+    gate.pause()
+    results = []
+    sleeper = threading.Thread(target=lambda: results.append(scheduler.wait(deadline)))
+    sleeper.start()
+    time.sleep(0.05)
+    assert sleeper.is_alive()
+    # 停止时解除暂停, 等待立即以停止结束
+    stop.set()
+    gate.interrupt()
+    sleeper.join(2.0)
+    assert results == [False]
+    assert scheduler.paused_time >= 0.05
+
+
+def test_countdown_reports_each_second_and_stops():
+    clock = FakeClock()
+    stop = threading.Event()
+    scheduler = DeadlineScheduler(0.1, stop, clock=clock)
+    seconds = []
+    steps = scheduler.countdown_steps(3, seconds.append)
+    end = clock.now + 3
+    assert next(steps) == pytest.approx(end - 2)
+    clock.now = end - 2
+    assert steps.send(True) == pytest.approx(end - 1)
+    with pytest.raises(StopIteration) as stopped:
+        steps.send(False)
+    assert stopped.value.value is False
+    assert seconds == [3, 2]
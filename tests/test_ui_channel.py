@@ -0,0 +1,80 @@
+"""工作线程到界面线程的事件通道: 每帧合并增量, 结束标志只报告一次"""
+import threading
+
+from keyboard_engine.ui_channel import UIEventChannel
+
+
+def test_empty_channel_drains_none():
+    channel = UIEventChannel()
+    assert channel.drain() is None
+    assert channel.stats()['drains'] == 0
+
+
+def test_progress_and_executions_are_coalesced_per_frame():
+    channel = UIEventChannel()
+    for _ in range(100):
+        channel.post_progress()
+    channel.post_progress(5)
+    channel.post_record('第一条')
+    channel.post_execution('执行完成')
+    channel.post_execution()
+    channel.post_error('出错了')
+    assert channel.depth() == 105
+    update = channel.drain()
+    assert update.progress == 105
+    assert update.records == ['第一条', '执行完成']
+    assert update.executions == 2
+    assert update.errors == ['出错了']
+    assert not update.finished
+    stats = channel.stats()
+    # 105次投递在界面上只需要 进度1 + 记录2 + 执行1 + 错误1 次更新
+    assert stats['posted'] == 105 and stats['coalesced'] == 100
+    assert stats['depth'] == 0 and stats['max_depth'] == 105
+    assert channel.drain() is None
+
+
+def test_finished_is_reported_once_with_the_last_frame():
+    channel = UIEventChannel()
+    channel.post_progress(3)
+    channel.post_finished()
+    update = channel.drain()
+    assert update.finished and update.progress == 3
+    assert channel.drain() is None
+    channel.post_progress()
+    # 结束标志不会留到之后的帧
+    assert not channel.drain().finished
+
+
+def test_backlog_drops_oldest_records():
+    channel = UIEventChannel(max_pending_records=3)
+    for i in range(5):
+        channel.post_record(i)
+    update = channel.drain()
+    assert update.records == [2, 3, 4]
+    stats = channel.stats()
+    # 丢弃的记录不计为合并
+    assert stats['dropped'] == 2 and stats['coalesced'] == 0
+    assert '丢弃: 2' in channel.stats_text()
+
+
+def test_concurrent_posts_are_all_counted():
+    channel = UIEventChannel()
+
+    def post():
+        for _ in range(10000):
+            channel.post_progress()
+    threads = [threading.Thread(target=post) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    total = 0
+    while any(thread.is_alive() for thread in threads):
+        update = channel.drain()
+        if update is not None:
+            total += update.progress
+    for thread in threads:
+        thread.join()
+    update = channel.drain()
+    if update is not None:
+        total += update.progress
+    assert total == 40000
+    assert channel.stats()['posted'] == 40000
@@ -0,0 +1,144 @@
+"""工作线程的任务队列: 执行顺序、取消、调整顺序和关闭"""
+import threading
+import time
+
+import pytest
+
+from keyboard_engine.backends import RecordingBackend
+from keyboard_engine.keystroke_plan import compile_plan
+from keyboard_engine.ui_channel import UIEventChannel
+from keyboard_engine.worker import EngineWorker, Job
+
+
+class BlockingBackend(RecordingBackend):
+    """第一个动作阻塞到 release 被设置, 让任务停在执行中"""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.closed = False
+
+    def type_text(self, text):
+        self.entered.set()
+        self.release.wait(5.0)
+        super().type_text(text)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def worker():
+    backend = RecordingBackend()
+    worker = EngineWorker(lambda key: backend)
+    yield worker
+    worker.shutdown()
+
+
+def submit(worker, text, interval=0.0, **options):
+    options.setdefault('backend_key', 'recording')
+    return worker.submit(Job(compile_plan(text, 'Enter', interval), label=text, **options))
+
+
+def hold_first(worker):
+    """提交一个停在执行中的任务, 返回任务和它的后端"""
+    backend = BlockingBackend()
+    job = submit(worker, 'x', backend=backend)
+    assert backend.entered.wait(5.0)
+    return job, backend
+
+
+def test_jobs_run_in_submission_order(worker):
+    jobs = [submit(worker, text) for text in ('one', 'two', 'three')]
+    assert worker.wait_idle(5.0)
+    assert worker.backend_factory('recording').text() == 'onetwothree'
+    assert [job.state for job in jobs] == ['done'] * 3
+    assert worker.executions == 3
+
+
+def test_busy_and_current_follow_the_running_job(worker):
+    assert not worker.busy and worker.current is None
+    job, backend = hold_first(worker)
+    queued = submit(worker, 'y')
+    assert worker.busy and worker.current is job
+    assert job.state == 'running' and queued.state == 'pending'
+    assert worker.pending() == [queued]
+    backend.release.set()
+    assert worker.wait_idle(5.0)
+    assert not worker.busy and worker.current is None
+    assert worker.pending() == []
+    assert job.state == 'done' and queued.state == 'done'
+
+
+def test_cancel_queued_job_leaves_running_job_alone(worker):
+    job, backend = hold_first(worker)
+    channel = UIEventChannel()
+    own = BlockingBackend()
+    queued = submit(worker, 'y', channel=channel, backend=own)
+    assert worker.cancel(queued.id)
+    # 还没开始的任务直接丢弃: 关闭独占的后端并通知界面结束
+    assert queued.state == 'cancelled' and own.closed
+    assert channel.drain().finished
+    assert worker.current is job and job.state == 'running'
+    assert not worker.cancel(queued.id)
+    backend.release.set()
+    assert worker.wait_idle(5.0)
+    assert job.state == 'done' and not job.result['stopped']
+    assert own.events == []
+
+
+def test_cancel_running_job_stops_it_and_starts_the_next(worker):
+    slow = submit(worker, 'x' * 20, interval=0.5)
+    queued = submit(worker, 'next')
+    while worker.backend_factory('recording').events == []:
+        time.sleep(0.005)
+    assert worker.cancel(slow.id)
+    assert worker.wait_idle(5.0)
+    assert slow.state == 'cancelled' and slow.result['stopped']
+    assert slow.result['stop_latency'] < 0.25
+    assert queued.state == 'done' and not queued.result['stopped']
+    assert worker.backend_factory('recording').text() == 'xnext'
+
+
+def test_move_reorders_pending_jobs_only(worker):
+    job, backend = hold_first(worker)
+    a, b, c = (submit(worker, text) for text in 'abc')
+    assert worker.move(c.id, -2)
+    assert worker.pending() == [c, a, b]
+    # 已在边界或不在队列中 (正在执行) 的任务不移动
+    assert not worker.move(c.id, -1)
+    assert not worker.move(job.id, 1)
+    assert worker.move(c.id, 10)
+    assert worker.pending() == [a, b, c]
+    backend.release.set()
+    assert worker.wait_idle(5.0)
+    assert worker.backend_factory('recording').text() == 'abc'
+
+
+def test_cancel_all_and_shutdown():
+    shared = RecordingBackend()
+    shared.closed = False
+
+    def close():
+        shared.closed = True
+    shared.close = close
+    worker = EngineWorker(lambda key: shared)
+    job, backend = hold_first(worker)
+    queued = [submit(worker, text) for text in 'ab']
+    worker.cancel_all()
+    assert [item.state for item in queued] == ['cancelled', 'cancelled']
+    assert job.state == 'cancelled'
+    backend.release.set()
+    assert worker.wait_idle(5.0)
+    assert job.result['stopped'] and backend.closed
+    assert shared.events == []
+
+    submit(worker, 'ok')
+    assert worker.wait_idle(5.0)
+    worker.shutdown()
+    # 关闭后结束线程、关闭缓存的后端, 不再接受任务
+    assert not worker._thread.is_alive()
+    assert shared.closed and shared.text() == 'ok'
+    with pytest.raises(RuntimeError):
+        submit(worker, 'late')